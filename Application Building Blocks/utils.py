@@ -85,11 +85,29 @@ def alpha_blend(image1=None, image2=None, alpha=0.1):
 
 # ******************************************************************************************************************** #
 
-# Normalize the vector to a min-max of [0, 1]
+# Normalize the vectors to a min-max of [0, 1] (Batched over all rows)
 def normalize(x):
-    for i in range(x.shape[0]):
-        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
-    return x
+    """
+        x : (N, ...) torch.Tensor or np.ndarray; each of the N rows is normalized in-place
+    """
+    if isinstance(x, np.ndarray):
+        dims = tuple(range(1, x.ndim))
+        mins = x.min(axis=dims, keepdims=True)
+        ranges = x.max(axis=dims, keepdims=True) - mins
+
+        # Constant rows are mapped to 0 instead of NaN
+        ranges[ranges == 0] = 1
+        x -= mins
+        x /= ranges
+        return x
+
+    dims = tuple(range(1, x.dim()))
+    mins = torch.amin(x, dim=dims, keepdim=True)
+    ranges = torch.amax(x, dim=dims, keepdim=True) - mins
+
+    # Constant rows are mapped to 0 instead of NaN
+    ranges[ranges == 0] = 1
+    return x.sub_(mins).div_(ranges)
 
 # ******************************************************************************************************************** #
 
@@ -164,11 +182,29 @@ def process(image, x1, y1, x2, y2):
 
 # ******************************************************************************************************************** #
 
-# Normalize the vector to a min-max of [0, 1]
+# Normalize the vectors to a min-max of [0, 1] (Batched over all rows)
 def normalize(x):
-    for i in range(x.shape[0]):
-        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
-    return x
+    """
+        x : (N, ...) torch.Tensor or np.ndarray; each of the N rows is normalized in-place
+    """
+    if isinstance(x, np.ndarray):
+        dims = tuple(range(1, x.ndim))
+        mins = x.min(axis=dims, keepdims=True)
+        ranges = x.max(axis=dims, keepdims=True) - mins
+
+        # Constant rows are mapped to 0 instead of NaN
+        ranges[ranges == 0] = 1
+        x -= mins
+        x /= ranges
+        return x
+
+    dims = tuple(range(1, x.dim()))
+    mins = torch.amin(x, dim=dims, keepdim=True)
+    ranges = torch.amax(x, dim=dims, keepdim=True) - mins
+
+    # Constant rows are mapped to 0 instead of NaN
+    ranges[ranges == 0] = 1
+    return x.sub_(mins).div_(ranges)
 
 # ******************************************************************************************************************** #
 
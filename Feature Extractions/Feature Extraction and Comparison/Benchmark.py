@@ -0,0 +1,216 @@
+"""
+    ORB Matching Benchmark (Previous Brute Force path vs Matching.ORBMatcher)
+    Deep Learning Benchmark (Previous dl_compare path vs Gallery.Gallery)
+"""
+
+import os
+import sys
+import cv2
+import torch
+import numpy as np
+from time import perf_counter
+
+import utils as u
+from Matching import ORBMatcher
+from Gallery import Gallery
+from Models import build_model
+
+# ******************************************************************************************************************** #
+
+# Previous implementation of the matching in ml_compare; kept as a reference
+def match_reference(BF, des1, des2, distance=32):
+    matches = BF.match(des1, des2)
+    matches = sorted(matches, key = lambda x:x.distance)
+    return [match for match in matches if match.distance < distance]
+
+
+# Frames at the webcam resolution; positives are random similarity transforms of the image, negatives are noise
+def make_frames(image, num_frames=100, seed=0):
+    rng = np.random.default_rng(seed)
+    image = cv2.resize(src=image, dsize=(u.CAM_WIDTH, u.CAM_HEIGHT), interpolation=cv2.INTER_AREA)
+    frames = []
+    for i in range(num_frames):
+        if i % 2 == 0:
+            M = cv2.getRotationMatrix2D((u.CAM_WIDTH / 2, u.CAM_HEIGHT / 2), rng.uniform(-15, 15), rng.uniform(0.8, 1.2))
+            M[:, 2] += rng.uniform(-30, 30, 2)
+            frames.append(cv2.warpAffine(image, M, (u.CAM_WIDTH, u.CAM_HEIGHT), borderMode=cv2.BORDER_REPLICATE))
+        else:
+            frames.append(cv2.GaussianBlur(rng.integers(0, 256, image.shape, dtype=np.uint8), (5, 5), 0))
+    return [u.clahe_equ(frame) for frame in frames]
+
+# ******************************************************************************************************************** #
+
+def benchmark(image=None, nfeatures=500, distance=32, ratio=0.75, num_frames=100):
+    """
+        image      : Reference image
+        nfeatures  : Number of features to initialize the ORB object with
+        distance   : Hamming Distance threshold
+        ratio      : Lowe's Ratio
+        num_frames : Number of frames (Half positives, half negatives)
+    """
+    frames = make_frames(image, num_frames)
+
+    orb = cv2.ORB_create(nfeatures=nfeatures)
+    BF = cv2.BFMatcher_create(normType=cv2.NORM_HAMMING, crossCheck=True)
+    _, des1 = orb.detectAndCompute(image, None)
+
+    # The first matcher writes the cache file if an earlier run has not, so the second one always reads it
+    matcher = ORBMatcher(image, nfeatures=nfeatures, distance=distance, ratio=ratio)
+    start_time = perf_counter()
+    ransac_matcher = ORBMatcher(image, nfeatures=nfeatures, distance=distance, ratio=ratio, ransac=True)
+    cached_setup_time = perf_counter() - start_time
+
+    # Computing the reference features (What every matcher did without the cache)
+    start_time = perf_counter()
+    matcher.detect(image)
+    setup_time = perf_counter() - start_time
+
+    paths = {"BF (crossCheck)" : lambda frame: len(match_reference(BF, des1, orb.detectAndCompute(frame, None)[1], distance)) > 5,
+             "Ratio"           : lambda frame: len(matcher.match(frame)[0]) > 5,
+             "Ratio + RANSAC"  : lambda frame: len(ransac_matcher.match(frame)[0]) > 5}
+
+    # Matching alone, on the descriptors of every frame computed beforehand
+    detections = [matcher.detect(frame) for frame in frames]
+    match_times = {}
+    start_time = perf_counter()
+    for _, des2 in detections:
+        match_reference(BF, des1, des2, distance)
+    match_times["BF (crossCheck)"] = perf_counter() - start_time
+    start_time = perf_counter()
+    for points, des2 in detections:
+        matcher.match_descriptors(points, des2)
+    match_times["Ratio"] = perf_counter() - start_time
+
+    u.breaker()
+    u.myprint("ORB Matching Benchmark : {} Frames at {}x{} | nfeatures : {}".format(num_frames, u.CAM_WIDTH, u.CAM_HEIGHT, nfeatures), "cyan")
+    u.myprint("Reference Features : {:.2f} ms (Computed) | {:.2f} ms (Cached)".format(setup_time * 1e3, cached_setup_time * 1e3), "cyan")
+    u.breaker()
+    for name, path in paths.items():
+        path(frames[0])
+        latencies, decisions = [], []
+        for frame in frames:
+            start_time = perf_counter()
+            decisions.append(path(frame))
+            latencies.append(perf_counter() - start_time)
+        latencies = np.array(latencies) * 1e3
+        decisions = np.array(decisions)
+
+        line = "{:<16} | Decision Latency : {:>6.2f} ms (p95 {:>6.2f} ms) | Positives Matched : {:>3}/{} | Negatives Matched : {:>3}/{}".format(
+               name, latencies.mean(), np.percentile(latencies, 95), decisions[0::2].sum(), len(decisions[0::2]), decisions[1::2].sum(), len(decisions[1::2]))
+        if name in match_times:
+            line += " | Matches/sec : {:>8.1f}".format(num_frames / match_times[name])
+        u.myprint(line, "green")
+    u.breaker()
+
+# ******************************************************************************************************************** #
+
+# Previous implementation of the comparison in dl_compare; kept as a reference
+def compare_reference(model, criterion, features_1, frame):
+    model.to(model.device)
+    with torch.no_grad():
+        features_2 = model(model.transform(frame).to(model.device).unsqueeze(dim=0))
+    return criterion(features_1, features_2).item()
+
+
+# Peak memory (in MB); device memory on a GPU, else the peak resident set size of the process (Not available on Windows)
+def peak_memory(device=None):
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    except ImportError:
+        return float("nan")
+
+
+# Run one comparison path on the frames; returns the per frame latencies (in ms), the peak memory once the model is
+# loaded and the peak memory after the frames (in MB)
+def run_dl_path(image=None, num_frames=None, gallery_size=None):
+    """
+        image        : Reference image
+        num_frames   : Number of frames
+        gallery_size : Number of reference images of the gallery (None : Previous dl_compare path)
+    """
+    frames = make_frames(image, num_frames)
+    model, criterion = build_model()
+
+    if gallery_size is None:
+        features_1 = model.get_features(u.preprocess(image))
+        path = lambda frame: compare_reference(model, criterion, features_1, frame)
+    else:
+        gallery = Gallery(model=model, images=[image], names=["Reference"])
+        gallery.features = gallery.features.repeat(gallery_size, 1)
+        path = lambda frame: gallery.compare(frame).max()
+
+    if model.device.type == "cuda":
+        torch.cuda.synchronize(model.device)
+        torch.cuda.reset_peak_memory_stats(model.device)
+    model_memory = peak_memory(model.device)
+
+    latencies = []
+    for frame in frames:
+        start_time = perf_counter()
+        path(frame)
+        if model.device.type == "cuda":
+            torch.cuda.synchronize(model.device)
+        latencies.append(perf_counter() - start_time)
+    return np.array(latencies[1:]) * 1e3, model_memory, peak_memory(model.device)
+
+
+def dl_benchmark(image=None, num_frames=50, gallery_sizes=(1, 100, 1000)):
+    """
+        image         : Reference image
+        num_frames    : Number of frames
+        gallery_sizes : Number of reference images of the gallery (Copies of the reference features)
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    paths = {"Previous (Full Frame)" : None}
+    for size in gallery_sizes:
+        paths["Gallery ({})".format(size)] = size
+
+    u.breaker()
+    u.myprint("Deep Learning Benchmark : {} Frames at {}x{} (Every path runs in a fresh process)".format(num_frames, u.CAM_WIDTH, u.CAM_HEIGHT), "cyan")
+    u.breaker()
+    for name, size in paths.items():
+        # The peak memory of a process never decreases, so every path gets its own process
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            latencies, model_memory, memory = pool.submit(run_dl_path, image, num_frames + 1, size).result()
+        u.myprint("{:<22} | Latency : {:>7.2f} ms (p95 {:>7.2f} ms) | Peak Memory : {:>8.1f} MB ({:>+7.1f} MB over the loaded model)".format(
+                  name, latencies.mean(), np.percentile(latencies, 95), memory, memory - model_memory), "green")
+    u.breaker()
+
+# ******************************************************************************************************************** #
+
+def main():
+    args_1 = "--filename"
+    args_2 = "--nfeatures"
+    args_3 = "--frames"
+    args_4 = "--dl"
+
+    # CLI Argument Handling
+    name, nfeatures, num_frames = "Snapshot_1.png", 500, 100
+    if args_1 in sys.argv:
+        name = sys.argv[sys.argv.index(args_1) + 1]
+    if args_2 in sys.argv:
+        nfeatures = int(sys.argv[sys.argv.index(args_2) + 1])
+    if args_3 in sys.argv:
+        num_frames = int(sys.argv[sys.argv.index(args_3) + 1])
+    do_dl = args_4 in sys.argv
+
+    image = cv2.imread(os.path.join(u.IMAGE_PATH, name), cv2.IMREAD_COLOR)
+    if image is None:
+        u.myprint("Usage : python Benchmark.py --filename Snapshot_1.png [--nfeatures 500] [--frames 100] [--dl]", "red")
+        return 1
+    if do_dl:
+        dl_benchmark(image=image, num_frames=num_frames)
+    else:
+        benchmark(image=image, nfeatures=nfeatures, num_frames=num_frames)
+
+# ******************************************************************************************************************** #
+
+if __name__ == "__main__":
+    sys.exit(main() or 0)
+
+# ******************************************************************************************************************** #
@@ -8,13 +8,17 @@ import numpy as np
 
 import utils as u
 from Models import build_model
+from Matching import ORBMatcher
+from Gallery import Gallery, build_gallery
 
 # Function that handles ORB Feature comparison between Video Feed and Image File.
-def ml_compare(image, nfeatures, distance=32):
+def ml_compare(image, nfeatures, distance=32, ratio=0.75, ransac=False):
     """
         image     : (np.ndarray) Image data to which comparison is to be made.
         nfeatures : (int) Number of features to initialize the ORB object with. 
         distance  : (float) Hamming Distance for Brute Force Matching. (Set via the command line)
+        ratio     : (float) Lowe's Ratio used to filter the matches. (Set via the command line)
+        ransac    : (bool) Flag that controls whether matches are verified with a RANSAC Homography. (Set via the command line)
     """
 
     # Initialize the capture object
@@ -26,14 +30,8 @@ def ml_compare(image, nfeatures, distance=32):
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, u.CAM_HEIGHT)
     cap.set(cv2.CAP_PROP_FPS, u.FPS)
 
-    # Setting up Brute Force matcher object
-    BF = cv2.BFMatcher_create(normType=cv2.NORM_HAMMING, crossCheck=True)
-
-    # Setting up ORB object
-    orb = cv2.ORB_create(nfeatures=nfeatures)
-
-    # Obtain the keypoints and descriptors for the image file
-    kp1, des1 = orb.detectAndCompute(image, None)
+    # Setting up the matcher; the keypoints and descriptors of the image file are read from the cache when available
+    matcher = ORBMatcher(image, nfeatures=nfeatures, distance=distance, ratio=ratio, ransac=ransac)
 
     # Read data from capture object
     while cap.isOpened():
@@ -42,13 +40,8 @@ def ml_compare(image, nfeatures, distance=32):
         # Preprocess frame with CLAHE (clipLimit:2, tileGridSize: (2, 2))
         frame = u.clahe_equ(frame)
 
-        # Obtain the keypoints and descriptors for the current frame
-        kp2, des2 = orb.detectAndCompute(frame, None)
-
-        # Perform Brute Force Matching (Modify this to use knnMatch)
-        matches = BF.match(des1, des2)
-        matches = sorted(matches, key = lambda x:x.distance)
-        matches = [match for match in matches if match.distance < distance]
+        # Match the descriptors of the current frame (Ratio Test, Distance Threshold and optional RANSAC)
+        matches, _ = matcher.match(frame)
 
         # Horizontally stack the image with the frame
         frame = np.hstack((image, frame))
@@ -77,10 +70,12 @@ def ml_compare(image, nfeatures, distance=32):
 # ******************************************************************************************************************** #
 
 # Function that handles Deep Learning Feature comparison between Video Feed and Image File.
-def dl_compare(image, similarity):
+def dl_compare(image, similarity, name=None, gallery=False):
     """
         image      : (np.ndarray) Image data to which comparison is to be made. 
         similarity : (float) Cosine Similarity Threshold [0, 1]. (Set via the command line)
+        name       : (str) Name of the image file.
+        gallery    : (bool) Flag that controls whether the frame is compared to every image in u.IMAGE_PATH instead. (Set via the command line)
     """
 
     # Initialize the capture object
@@ -92,11 +87,17 @@ def dl_compare(image, similarity):
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, u.CAM_HEIGHT)
     cap.set(cv2.CAP_PROP_FPS, u.FPS)
 
-    # Get the model and criterion used for comparison
-    model, criterion = build_model()
+    # Get the model used for comparison
+    model, _ = build_model()
 
-    # Obtain the features from the image file
-    features_1 = model.get_features(u.preprocess(image))
+    # Reference features (read from the cache when available); a single image is a gallery of one
+    if gallery:
+        references = build_gallery(model)
+    else:
+        references = Gallery(model=model, images=[image], names=[name])
+    if references is None:
+        cap.release()
+        return
 
     # Read data from capture object
     while cap.isOpened():
@@ -106,15 +107,14 @@ def dl_compare(image, similarity):
         frame = u.clahe_equ(frame)
         disp_frame = frame.copy()
 
-        # Obtain the features from the current frame
-        features_2 = model.get_features(frame)
-
-        # Compute the cosine similarity betwwen the Feature Vectors obtained        
-        cos_sim = criterion(features_1, features_2).item()
+        # Compute the cosine similarity between the features of the current frame and every reference image
+        cos_sims = references.compare(frame)
+        best = int(np.argmax(cos_sims))
+        cos_sim = cos_sims[best]
 
         # Display 'Match' or 'No Match' based on the cosine similarity threshold
         if cos_sim > similarity:
-            cv2.putText(img=disp_frame, text="Match", org=(25, 75), 
+            cv2.putText(img=disp_frame, text="Match" if len(references) == 1 else "Match : {}".format(references.names[best]), org=(25, 75), 
                         fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1,
                         color=(0, 255, 0), thickness=2)
         else:
@@ -0,0 +1,78 @@
+"""
+    Reference Image Gallery; compares the features of a frame against many reference images at once
+"""
+
+import os
+import cv2
+import torch
+import numpy as np
+
+import utils as u
+from Matching import image_hash
+
+# ******************************************************************************************************************** #
+
+# Features of a reference image; cached in u.CACHE_PATH, keyed by image hash, and only computed on a cache miss
+def reference_features(model, image):
+    """
+        model : Feature Extractor (Models.build_model)
+        image : (np.ndarray) Reference image (BGR)
+    """
+    path = os.path.join(u.CACHE_PATH, "VGG_{}.npy".format(image_hash(image)))
+    if os.path.exists(path):
+        return np.load(path)
+
+    features = model.get_features(u.preprocess(image)).cpu().numpy()[0]
+    np.save(path, features)
+    return features
+
+# ******************************************************************************************************************** #
+
+"""
+    - Reference features stored as one contiguous (G, D) L2 normalized matrix on the device of the model, with the name
+      of every reference image
+    - compare() returns the cosine similarity of a frame to every reference image in one matrix-vector product
+"""
+class Gallery(object):
+    def __init__(self, model=None, images=None, names=None):
+        """
+            model  : Feature Extractor (Models.build_model)
+            images : List of reference images (BGR)
+            names  : Names of the reference images
+        """
+        self.model = model
+        self.names = list(names)
+        features = np.stack([reference_features(model, image) for image in images])
+        self.features = torch.nn.functional.normalize(torch.as_tensor(features, device=model.device), dim=1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def compare(self, frame):
+        """
+            frame : (np.ndarray) Current frame (BGR); returns the (G, ) cosine similarities as a np.ndarray
+        """
+        features = self.model.get_features(u.preprocess(frame))
+        return (self.features @ torch.nn.functional.normalize(features, dim=1)[0]).cpu().numpy()
+
+# ******************************************************************************************************************** #
+
+# Gallery of every image in u.IMAGE_PATH; files that cannot be read are skipped (None if no image is left)
+def build_gallery(model=None):
+    names, images = [], []
+    for name in sorted(os.listdir(u.IMAGE_PATH)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        image = cv2.imread(os.path.join(u.IMAGE_PATH, name), cv2.IMREAD_COLOR)
+        if image is None:
+            u.myprint("Skipping {} (Could not be read)".format(name), "yellow")
+            continue
+        names.append(name)
+        images.append(image)
+
+    if len(images) == 0:
+        u.myprint("No reference images in {}".format(u.IMAGE_PATH), "red")
+        return None
+    return Gallery(model=model, images=images, names=names)
+
+# ******************************************************************************************************************** #
@@ -0,0 +1,106 @@
+"""
+    Script that handles ORB Feature Matching (Vectorized Hamming Distances, Ratio Test and RANSAC Verification)
+"""
+
+import os
+import cv2
+import hashlib
+import numpy as np
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+# Number of set bits of every byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8).reshape(-1, 1), axis=1).sum(axis=1).astype(np.uint16)
+
+
+# (N1, N2) Hamming Distances between two sets of packed binary descriptors ((N, 32) np.uint8 for ORB)
+def hamming_distances(des1, des2):
+    # Bytes are compared 8 at a time; np.bitwise_count (NumPy >= 2.0) counts the bits of every word directly
+    if des1.shape[1] % 8 == 0 and hasattr(np, "bitwise_count"):
+        x = np.ascontiguousarray(des1).view(np.uint64)[:, None, :] ^ np.ascontiguousarray(des2).view(np.uint64)[None, :, :]
+        return np.bitwise_count(x).sum(axis=2, dtype=np.uint16)
+    return POPCOUNT[des1[:, None, :] ^ des2[None, :, :]].sum(axis=2, dtype=np.uint16)
+
+
+# Cache key of an image; identical image data gives identical keys across sessions
+def image_hash(image):
+    return hashlib.sha1(np.ascontiguousarray(image).tobytes() + repr(image.shape).encode()).hexdigest()
+
+# ******************************************************************************************************************** #
+
+"""
+    - Matches the ORB features of every frame against those of a reference image
+    - The reference keypoints/descriptors are computed once and cached on disk (u.CACHE_PATH), keyed by image hash
+    - Matching is one (N1, N2) Hamming Distance matrix per frame; the two nearest neighbours of every reference
+      descriptor come from np.partition and are filtered with Lowe's ratio test and the distance threshold
+    - Optionally, the matches are verified with a RANSAC homography and only the inliers are kept
+"""
+class ORBMatcher(object):
+    def __init__(self, image=None, nfeatures=500, distance=32, ratio=0.75, ransac=False, reprojection_threshold=5.0):
+        """
+            image                  : Reference image
+            nfeatures              : Number of features to initialize the ORB object with
+            distance               : Maximum Hamming Distance of a match
+            ratio                  : Lowe's ratio; best distance must be below ratio * second best distance
+            ransac                 : Flag that controls whether matches are verified with a RANSAC homography
+            reprojection_threshold : Maximum reprojection error (in pixels) of a RANSAC inlier
+        """
+        self.orb = cv2.ORB_create(nfeatures=nfeatures)
+        self.distance = distance
+        self.ratio = ratio
+        self.ransac = ransac
+        self.reprojection_threshold = reprojection_threshold
+
+        path = os.path.join(u.CACHE_PATH, "ORB_{}_{}.npz".format(image_hash(image), nfeatures))
+        if os.path.exists(path):
+            data = np.load(path)
+            self.points, self.descriptors = data["points"], data["descriptors"]
+        else:
+            self.points, self.descriptors = self.detect(image)
+            np.savez(path, points=self.points, descriptors=self.descriptors)
+
+    # (N, 2) keypoint locations and (N, 32) descriptors of an image
+    def detect(self, image):
+        kps, des = self.orb.detectAndCompute(image, None)
+        if des is None:
+            return np.zeros((0, 2), dtype=np.float32), np.zeros((0, 32), dtype=np.uint8)
+        return np.array([kp.pt for kp in kps], dtype=np.float32).reshape(-1, 2), des
+
+    def match(self, frame):
+        """
+            frame : Current frame; returns (M, 2) (reference index, frame index) matches and their (M, ) distances
+        """
+        return self.match_descriptors(*self.detect(frame))
+
+    def match_descriptors(self, points=None, descriptors=None):
+        """
+            points      : (N, 2) keypoint locations of the frame
+            descriptors : (N, 32) descriptors of the frame
+        """
+        if self.descriptors.shape[0] == 0 or descriptors.shape[0] < 2:
+            return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.uint16)
+
+        D = hamming_distances(self.descriptors, descriptors)
+
+        # Two nearest neighbours of every reference descriptor
+        nearest = np.argpartition(D, 1, axis=1)[:, :2]
+        d = np.take_along_axis(D, nearest, axis=1)
+        order = np.argsort(d, axis=1)
+        nearest, d = np.take_along_axis(nearest, order, axis=1), np.take_along_axis(d, order, axis=1)
+
+        keep = (d[:, 0] < self.ratio * d[:, 1]) & (d[:, 0] < self.distance)
+        matches = np.stack((np.flatnonzero(keep), nearest[keep, 0]), axis=1)
+        distances = d[keep, 0]
+
+        if self.ransac and matches.shape[0] >= 4:
+            _, mask = cv2.findHomography(self.points[matches[:, 0]], points[matches[:, 1]], cv2.RANSAC, self.reprojection_threshold)
+            if mask is None:
+                return matches[:0], distances[:0]
+            inliers = mask.ravel() == 1
+            matches, distances = matches[inliers], distances[inliers]
+
+        return matches, distances
+
+# ******************************************************************************************************************** #
@@ -1,17 +1,36 @@
 """
     Script that holds the Deep Learning Model. (Uses Pytorch)
 """
+import numpy as np
 import torch
 from torch import nn 
 from torchvision import models, transforms
 
 # ******************************************************************************************************************** #
 
-# Normalize the vector to a min-max of [0, 1]
+# Normalize the vectors to a min-max of [0, 1] (Batched over all rows)
 def normalize(x):
-    for i in range(x.shape[0]):
-        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
-    return x
+    """
+        x : (N, ...) torch.Tensor or np.ndarray; each of the N rows is normalized in-place
+    """
+    if isinstance(x, np.ndarray):
+        dims = tuple(range(1, x.ndim))
+        mins = x.min(axis=dims, keepdims=True)
+        ranges = x.max(axis=dims, keepdims=True) - mins
+
+        # Constant rows are mapped to 0 instead of NaN
+        ranges[ranges == 0] = 1
+        x -= mins
+        x /= ranges
+        return x
+
+    dims = tuple(range(1, x.dim()))
+    mins = torch.amin(x, dim=dims, keepdim=True)
+    ranges = torch.amax(x, dim=dims, keepdim=True) - mins
+
+    # Constant rows are mapped to 0 instead of NaN
+    ranges[ranges == 0] = 1
+    return x.sub_(mins).div_(ranges)
 
 # ******************************************************************************************************************** #
 
@@ -46,12 +65,9 @@ class Model(nn.Module):
         return self.model(x)
     
     
-    # Extract the features from an image passed as argument. 
+    # Extract the features from an image passed as argument (224x224; see utils.preprocess). 
     def get_features(self, image):
 
-        # load model onto the device
-        self.to(self.device)
-
         # Extract features
         # Always use torch.no_grad() or torch.set_grad_enabled(False) when performing inference (or during validation)
         with torch.no_grad():
@@ -64,6 +80,9 @@ class Model(nn.Module):
 
 def build_model():
     model = Model()
+
+    # Load model onto the device once
+    model.to(model.device)
     model.eval()
 
     return model, nn.CosineSimilarity()
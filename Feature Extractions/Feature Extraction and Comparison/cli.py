@@ -7,6 +7,9 @@
         5. --dl         : Flag that controls entry into Deep Learning mode (VGG26)
         6. --similarity : Cosine Similarity Threshold (Default: 0.85)
         7. --filename   : Name of the file to compare the Realtime Video feed to.
+        8. --ratio      : Lowe's Ratio used to filter ORB Matches (Default: 0.75)
+        9. --ransac     : Flag that controls whether ORB Matches are verified with a RANSAC Homography
+       10. --gallery    : Flag that compares the Realtime Video feed to every image in Images/ (Deep Learning mode)
 """
 
 import os
@@ -31,12 +34,20 @@ def app():
 
     args_7 = "--filename" 
 
+    args_8 = "--ratio"
+    args_9 = "--ransac"
+
+    args_10 = "--gallery"
+
     # Default CLI Argument Values
     do_capture, do_ml, do_dl = None, None, None
     name = "Snapshot_1.png"
     nfeatures = 500
     distance = 32
     similarity = 0.85
+    ratio = 0.75
+    ransac = False
+    gallery = False
 
     # CLI Argument Handling
     if args_1 in sys.argv:
@@ -56,6 +67,14 @@ def app():
 
     if args_7 in sys.argv:
         name = sys.argv[sys.argv.index(args_7) + 1]
+
+    if args_8 in sys.argv:
+        ratio = float(sys.argv[sys.argv.index(args_8) + 1])
+    if args_9 in sys.argv:
+        ransac = True
+
+    if args_10 in sys.argv:
+        gallery = True
     
     # Runs if --capture is specified
     if do_capture:
@@ -64,11 +83,11 @@ def app():
     # Runs if --ml is specified. Also needs --filename to be specified to work
     if do_ml:
         image = cv2.imread(os.path.join(u.IMAGE_PATH, name), cv2.IMREAD_COLOR)
-        ml_compare(image, nfeatures, distance)
+        ml_compare(image, nfeatures, distance, ratio, ransac)
     
     # Runs if --dl is specified. Also needs --filename to be specified to work
     if do_dl:
         image = cv2.imread(os.path.join(u.IMAGE_PATH, name), cv2.IMREAD_COLOR)
-        dl_compare(image, similarity)
+        dl_compare(image, similarity, name, gallery)
 
 # ******************************************************************************************************************** #
@@ -42,5 +42,11 @@ if not os.path.exists(IMAGE_PATH):
     os.makedirs(IMAGE_PATH)
 
 
+# Setting up self-aware Cache Directory (Reference features, keyed by image hash)
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "Cache")
+if not os.path.exists(CACHE_PATH):
+    os.makedirs(CACHE_PATH)
+
+
 # Webcam Feed Attributes
 CAM_WIDTH, CAM_HEIGHT, FPS, ID = 640, 360, 30, 0
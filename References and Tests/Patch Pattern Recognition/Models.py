@@ -2,17 +2,37 @@
     Script that holds the Deep Learning Model. (Uses Pytorch)
 """
 
+import numpy as np
 import torch
 from torch import nn
 from torchvision import models, transforms
+from torchvision.ops import roi_align
 
 # ******************************************************************************************************************** #
 
-# Normalize the vector to a min-max of [0, 1]
+# Normalize the vectors to a min-max of [0, 1] (Batched over all rows)
 def normalize(x):
-    for i in range(x.shape[0]):
-        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
-    return x
+    """
+        x : (N, ...) torch.Tensor or np.ndarray; each of the N rows is normalized in-place
+    """
+    if isinstance(x, np.ndarray):
+        dims = tuple(range(1, x.ndim))
+        mins = x.min(axis=dims, keepdims=True)
+        ranges = x.max(axis=dims, keepdims=True) - mins
+
+        # Constant rows are mapped to 0 instead of NaN
+        ranges[ranges == 0] = 1
+        x -= mins
+        x /= ranges
+        return x
+
+    dims = tuple(range(1, x.dim()))
+    mins = torch.amin(x, dim=dims, keepdim=True)
+    ranges = torch.amax(x, dim=dims, keepdim=True) - mins
+
+    # Constant rows are mapped to 0 instead of NaN
+    ranges[ranges == 0] = 1
+    return x.sub_(mins).div_(ranges)
 
 # ******************************************************************************************************************** #
 
@@ -41,6 +61,9 @@ class FeatureExtractor(nn.Module):
 
         # Flatten the output
         self.model.add_module("Flatten", nn.Flatten())
+
+        # Total stride of the convolutional trunk (self.model[0]); maps image coordinates to feature map coordinates
+        self.stride = 32
     
 
     def forward(self, x):
@@ -86,6 +109,26 @@ class FeatureExtractor(nn.Module):
         return normalize(features)
 
 
+    # Extract features of many boxes of one image with a single pass of the convolutional trunk
+    def get_dense_features(self, image, boxes):
+        """
+            image : (H, W, 3) RGB image
+            boxes : (N, 4) (x1, y1, x2, y2) boxes in image coordinates
+
+            Every box is pooled from the feature map to 512x2x2 with RoIAlign (In place of the Adaptive Average Pool),
+            so the descriptors have the same layout as get_features
+        """
+        with torch.no_grad():
+            feature_map = self.model[0](self.transform(image).to(self.device).unsqueeze(dim=0))
+
+            boxes = torch.as_tensor(boxes, dtype=torch.float32, device=self.device)
+            rois = torch.cat((torch.zeros(boxes.shape[0], 1, device=self.device), boxes), dim=1)
+            features = roi_align(feature_map, rois, output_size=(2, 2), spatial_scale=1 / self.stride, sampling_ratio=2, aligned=True)
+
+        # Return Normalized Features
+        return normalize(features.flatten(start_dim=1))
+
+
     # Function to return the cosine similarity between 2 Pytorch Tensors
     def get_cosine_similarity(self, features_1, features_2):
         return nn.CosineSimilarity()(features_1, features_2).item()
@@ -95,6 +138,7 @@ class FeatureExtractor(nn.Module):
 def build_model():
     model = FeatureExtractor()
     model.eval()
+    model.to(model.device)
 
     return model
 
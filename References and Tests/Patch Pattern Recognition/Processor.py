@@ -1,40 +1,48 @@
 import cv2
 import platform
-from torch.utils.data import Dataset
-from torch.utils.data import DataLoader as DL
+import numpy as np
 
 import utils as u
 from Models import build_model
+from TemplateBank import TemplateBank, build_template_bank
 
 # ******************************************************************************************************************** #
 
-# Dataset Template 
-class DS(Dataset):
-    def __init__(self, X=None, transform=None):
-        self.transform = transform
-        self.X = X
-
-    def __len__(self):
-        return len(self.X)
-    
-    def __getitem__(self, idx):
-        return self.transform(self.X[idx])
+# (N, 4) (x1, y1, x2, y2) boxes of the patches of a frame made of num_cols x num_rows patches of size (ph, pw); row-major
+def patch_boxes(num_cols, num_rows, ph, pw):
+    y, x = np.meshgrid(np.arange(num_cols) * ph, np.arange(num_rows) * pw, indexing="ij")
+    return np.stack((x, y, x + pw, y + ph), axis=-1).reshape(-1, 4)
 
 # ******************************************************************************************************************** #
 
-def process_patches_in_video(patch, similarity):
-    if patch is None:
-        u.myprint("\nError Reading Patch File", "red")
-        return
-    
+def process_patches_in_video(patch, similarity, templates=None, top_k=1):
+    """
+        patch      : Reference patch (Preprocessed); used when templates is None
+        similarity : Cosine Similarity Threshold
+        templates  : Part directory whose reference patches (Crop_N.png) are all searched at once (Optional)
+        top_k      : Number of best matching templates kept per patch
+    """
     # Get the model
     model = build_model()
 
-    # Infer the patch height and width from the patch
-    ph, pw, _ = patch.shape
+    if templates is not None:
+        bank = build_template_bank(model, templates)
+        if bank is None:
+            u.myprint("\nNo Reference Patches Found", "red")
+            return
+
+        # Size of the preprocessed reference patches (u.preprocess)
+        ph, pw = 224, 224
+    else:
+        if patch is None:
+            u.myprint("\nError Reading Patch File", "red")
+            return
+
+        # Infer the patch height and width from the patch
+        ph, pw, _ = patch.shape
 
-    # Extract the features from the patch
-    patch_features = model.get_features(patch)
+        # Extract the features from the patch (The same dense path as the frame; one box covering the entire patch)
+        bank = TemplateBank(features=model.get_dense_features(patch, [[0, 0, pw, ph]]).cpu().numpy(), names=["Reference"], device=model.device)
     
     # Setting up capture object
     if platform.system() != "Windows":
@@ -46,6 +54,8 @@ def process_patches_in_video(patch, similarity):
     cap.set(cv2.CAP_PROP_FPS, u.FPS)
 
     print("")
+    boxes, grid = None, None
+
     # Read data from the capture object
     while cap.isOpened():
         _, frame = cap.read()
@@ -61,35 +71,27 @@ def process_patches_in_video(patch, similarity):
         frame = cv2.resize(src=frame, dsize=(num_rows*pw, num_cols*ph), interpolation=cv2.INTER_AREA)
         disp_frame = frame.copy()
 
-        # patches: Holds the image data of the patches
-        # patches_idx: Holds the array indexes at which patch was made
-        patches = []
-        patches_ = []
-        patches_idx = []
-        for i in range(0, h, ph):
-            for j in range(0, w, pw):
-                patches_idx.append([i, ph+i, j, pw+j])
-                patches_.append(frame[i:ph+i, j:pw+j, :])
-                patches.append(u.preprocess(frame[i:ph+i, j:pw+j, :]))
-            
-        # Setup the Dataloader
-        data_setup = DS(X=patches, transform=model.transform)
-        data = DL(data_setup, batch_size=64, shuffle=False)
-        
-        # Get features of all the patches
-        features = model.get_batch_features(data)
-        
-        # Obtain the Cosine Similarity between the reference patch Feature Vector and all the patches within the frame
-        cos_sim = []
-        for feat in features:
-            cos_sim.append(model.get_cosine_similarity(patch_features, feat.reshape(1, -1)))
+        # Patch boxes only change with the frame size
+        if grid != (num_cols, num_rows):
+            boxes, grid = patch_boxes(num_cols, num_rows, ph, pw), (num_cols, num_rows)
+
+        # One backbone pass over the whole frame; every patch descriptor is pooled from the feature map
+        features = model.get_dense_features(cv2.cvtColor(src=frame, code=cv2.COLOR_BGR2RGB), boxes)
+
+        # Obtain the Cosine Similarity between all the patches within the frame and every reference patch (One GEMM; top-k per patch)
+        cos_sim, indices = bank.search(features, k=top_k)
+        # The IVF search returns index -1 (score -inf) when the probed lists hold fewer than k templates
+        matched = (indices[:, 0] >= 0) & (cos_sim[:, 0] > similarity)
         
         # Adjust color of the patch in accordance with its Cosine Similarity metric
-        for i in range(num_cols):
-            for j in range(num_rows):
-                disp_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, :] = patches_[i * num_rows + j]
-                if cos_sim[i * num_rows + j] > similarity:
-                    disp_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, 1] = 200
+        u.tile_frame(disp_frame, ph, pw)[matched.reshape(num_cols, num_rows), :, :, 1] = 200
+
+        # Name of the best matching reference patch
+        if len(bank) > 1:
+            for idx in np.flatnonzero(matched):
+                i, j = divmod(idx, num_rows)
+                cv2.putText(img=disp_frame, text=bank.names[indices[idx, 0]], org=(j*pw + 5, i*ph + 20),
+                            fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.5, color=(255, 255, 255), thickness=1)
 
         # Display the frame
         cv2.imshow("Pattern Processed Frame", disp_frame)
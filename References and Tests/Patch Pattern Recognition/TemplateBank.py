@@ -0,0 +1,151 @@
+"""
+    Reference Patch (Template) Bank; matches the patch descriptors of a frame against many reference patches at once
+"""
+
+import os
+import cv2
+import torch
+import numpy as np
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+# L2 normalize the rows of a (N, D) np.ndarray
+def l2_normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return x / norms
+
+
+# Merge (N, k) running top-k scores/indices with (N, m) candidate scores/indices; returns the new (N, k) top-k
+def merge_topk(scores, indices, candidate_scores, candidate_indices, k):
+    scores = np.concatenate((scores, candidate_scores), axis=1)
+    indices = np.concatenate((indices, candidate_indices), axis=1)
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+# ******************************************************************************************************************** #
+
+"""
+    - Approximate inverted file (IVF) index over the L2 normalized templates, in NumPy
+    - Templates are clustered with spherical k-means into num_lists lists; a query is only compared against the
+      templates of its nprobe closest lists, so the cost grows with T / num_lists * nprobe instead of T
+"""
+class IVFIndex(object):
+    def __init__(self, features=None, num_lists=None, nprobe=8, iterations=10, seed=0):
+        """
+            features   : (T, D) L2 normalized template features (np.float32)
+            num_lists  : Number of inverted lists (Default: sqrt(T))
+            nprobe     : Number of lists searched per query
+            iterations : Number of k-means iterations
+            seed       : Seed of the k-means initialization
+        """
+        self.features = features
+        self.num_lists = num_lists or max(1, int(np.sqrt(features.shape[0])))
+        self.nprobe = min(nprobe, self.num_lists)
+
+        rng = np.random.default_rng(seed)
+        self.centroids = features[rng.choice(features.shape[0], self.num_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(features @ self.centroids.T, axis=1)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignment, features)
+            empty = np.bincount(assignment, minlength=self.num_lists) == 0
+            sums[empty] = self.centroids[empty]
+            self.centroids = l2_normalize(sums).astype(np.float32)
+
+        assignment = np.argmax(features @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == l) for l in range(self.num_lists)]
+
+    def search(self, queries, k=1):
+        """
+            queries : (N, D) L2 normalized query features; returns (N, k) scores and (N, k) template indices
+        """
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.nprobe]
+
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+
+        # One GEMM per probed list over all the queries that probe it
+        for l in np.unique(probes):
+            members, rows = self.lists[l], np.flatnonzero((probes == l).any(axis=1))
+            if members.shape[0] == 0:
+                continue
+            candidate_scores = queries[rows] @ self.features[members].T
+            scores[rows], indices[rows] = merge_topk(scores[rows], indices[rows], candidate_scores,
+                                                     np.broadcast_to(members, candidate_scores.shape), k)
+        return scores, indices
+
+# ******************************************************************************************************************** #
+
+"""
+    - Reference patch features stored as one contiguous (T, D) L2 normalized matrix, with the name of every template
+    - search() matches all the patch descriptors of a frame against the whole bank in one GEMM and keeps the top-k
+    - Banks with at least u.IVF_MIN_TEMPLATES templates are searched through an IVFIndex instead (Approximate)
+"""
+class TemplateBank(object):
+    def __init__(self, features=None, names=None, device=None):
+        """
+            features : (T, D) template features
+            names    : Names of the templates
+            device   : Device on which the exact search runs
+        """
+        self.device = device
+        self.names = list(names)
+        self.features = l2_normalize(np.ascontiguousarray(features, dtype=np.float32))
+        self.features_t = torch.as_tensor(self.features, device=device)
+        self.index = IVFIndex(self.features) if len(self.names) >= u.IVF_MIN_TEMPLATES else None
+
+    def __len__(self):
+        return len(self.names)
+
+    def save(self, path):
+        np.savez(path, features=self.features, names=np.array(self.names))
+
+    @classmethod
+    def load(cls, path, device=None):
+        data = np.load(path)
+        return cls(features=data["features"], names=data["names"].tolist(), device=device)
+
+    def search(self, features, k=1):
+        """
+            features : (N, D) torch.Tensor of patch descriptors; returns (N, k) cosine similarities and (N, k) template indices
+        """
+        k = min(k, len(self))
+        if self.index is not None:
+            return self.index.search(l2_normalize(features.cpu().numpy()), k)
+
+        with torch.no_grad():
+            scores, indices = (torch.nn.functional.normalize(features, dim=1) @ self.features_t.T).topk(k, dim=1)
+        return scores.cpu().numpy(), indices.cpu().numpy()
+
+# ******************************************************************************************************************** #
+
+# Template Bank of all the reference patches (Crop_N.png) of a part; stored as Templates.npz in the part directory and
+# rebuilt only when the set of reference patches changes
+def build_template_bank(model=None, path=None):
+    """
+        model : Feature Extractor (Models.build_model)
+        path  : Directory of the part (u.IMAGE_PATH/Part_Name)
+    """
+    names = sorted(name for name in os.listdir(path) if name.startswith("Crop_") and name.endswith(".png"))
+    if len(names) == 0:
+        return None
+    bank_path = os.path.join(path, "Templates.npz")
+
+    if os.path.exists(bank_path):
+        bank = TemplateBank.load(bank_path, device=model.device)
+        if bank.names == names:
+            return bank
+
+    features = []
+    for name in names:
+        patch = u.preprocess(cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR))
+        features.append(model.get_dense_features(patch, [[0, 0, patch.shape[1], patch.shape[0]]]).cpu().numpy())
+
+    bank = TemplateBank(features=np.concatenate(features, axis=0), names=names, device=model.device)
+    bank.save(bank_path)
+    return bank
+
+# ******************************************************************************************************************** #
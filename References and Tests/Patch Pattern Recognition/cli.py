@@ -5,6 +5,7 @@
         3. --capture    : Flag that controls entry into capture mode
         4. --process    : Flag that controls entry into process mode
         5. --similarity : Cosine Similarity Threshold (Default: 0.8) 
+        6. --templates  : Search for all the reference patches of the part at once (Used only during --process; replaces --filename)
 """
 
 import os
@@ -23,9 +24,10 @@ def app():
     args_3 = "--capture"
     args_4 = "--process"
     args_5 = "--similarity"
+    args_6 = "--templates"
 
     # Default CLI Argument Values
-    do_capture, do_process = None, None
+    do_capture, do_process, use_templates = None, None, None
     similarity = 0.8
 
     # CLI Argument Handling
@@ -39,6 +41,8 @@ def app():
         do_process = True
     if args_5 in sys.argv:
         similarity = float(sys.argv[sys.argv.index(args_5) + 1])
+    if args_6 in sys.argv:
+        use_templates = True
     
     u.breaker()
     u.myprint("--- Application Start ---", color="green")
@@ -50,8 +54,11 @@ def app():
     # Runs if --process is specified
     if do_process:
         path = os.path.join(u.IMAGE_PATH, p_name)
-        patch = u.preprocess(cv2.imread(os.path.join(path, f_name), cv2.IMREAD_COLOR))
-        process_patches_in_video(patch, similarity)
+        if use_templates:
+            process_patches_in_video(None, similarity, templates=path)
+        else:
+            patch = u.preprocess(cv2.imread(os.path.join(path, f_name), cv2.IMREAD_COLOR))
+            process_patches_in_video(patch, similarity)
 
     u.myprint("\n--- Application End ---", color="green")
     u.breaker()
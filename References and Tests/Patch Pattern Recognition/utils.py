@@ -35,6 +35,13 @@ def preprocess(image, change_color_space=True):
     return image[cy - 112:cy + 112, cx - 112:cx + 112, :]
 
 
+# Zero-copy (num_cols, num_rows, ph, pw, 3) view of the patches of a frame whose size is a multiple of (ph, pw)
+# (The same strides numpy.lib.stride_tricks.as_strided would be given; writes to the view write to the frame)
+def tile_frame(frame, ph, pw):
+    h, w, c = frame.shape
+    return frame.reshape(h // ph, ph, w // pw, pw, c).swapaxes(1, 2)
+
+
 
 # Settiing up self-aware Image Directory
 IMAGE_PATH = os.path.join(os.getcwd(), "Images")
@@ -46,3 +53,6 @@ event_handler_path = None
 # Webcam Feed Attributes
 CAM_WIDTH, CAM_HEIGHT, FPS, ID, WAIT_DELAY = 640, 360, 30, 0, 1
 MIN_CROP_WIDTH, MIN_CROP_HEIGHT = 32, 32
+
+# Template Banks with at least this many templates are searched with the approximate (IVF) index
+IVF_MIN_TEMPLATES = 1024
@@ -0,0 +1,80 @@
+"""
+    Patch Tiling Benchmark (Previous per patch loop vs the tile_frame views)
+"""
+
+import sys
+import numpy as np
+from time import perf_counter
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+# Time a callable; returns the mean time per call (in microseconds)
+def timeit(fn=None, repeats=50):
+    fn()
+    start_time = perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (perf_counter() - start_time) / repeats * 1e6
+
+# ******************************************************************************************************************** #
+
+# Previous implementation of the patch copy in process_video_as_patches; kept as a reference
+def process_reference(frame, ph, pw, test=None):
+    h, w, _ = frame.shape
+    num_cols, num_rows = h // ph, w // pw
+
+    patches = []
+    for i in range(0, h, ph):
+        for j in range(0, w, pw):
+            patches.append([i, ph+i, j, pw+j])
+    patches = np.array(patches).reshape(num_cols, num_rows, 4)
+
+    new_frame = (np.ones((num_cols*ph, num_rows*pw, 3)) * 75).astype("uint8")
+    for i in range(num_cols):
+        for j in range(num_rows):
+            if test is None or (test == 1 and i % 2 == 0) or (test == 2 and j % 2 == 0) or (test == 3 and i % 2 == 0 and j % 2 == 0):
+                new_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, :] = frame[patches[i][j][0]:patches[i][j][1], patches[i][j][2]:patches[i][j][3], :]
+    return new_frame
+
+
+# Current implementation; new_frame and mask are built once per frame size
+def process_tiled(frame, new_frame, mask, ph, pw):
+    u.tile_frame(new_frame, ph, pw)[mask] = u.tile_frame(frame, ph, pw)[mask]
+    return new_frame
+
+# ******************************************************************************************************************** #
+
+def benchmark(sizes=((640, 360), (1920, 1080)), patch_sizes=(16, 48, 128), tests=(None, 1, 3), repeats=50):
+    """
+        sizes       : (Width, Height) of the frames
+        patch_sizes : Patch sizes (square patches)
+        tests       : Tests (None : all patches)
+        repeats     : Number of timed calls per setting
+    """
+    u.breaker()
+    u.myprint("Patch Tiling Benchmark", "cyan")
+    u.breaker()
+    for w, h in sizes:
+        for p in patch_sizes:
+            # Frames are resized to a multiple of the patch size before tiling (As in process_video_as_patches)
+            num_cols, num_rows = -(-h // p), -(-w // p)
+            frame = np.random.randint(0, 256, (num_cols * p, num_rows * p, 3), dtype=np.uint8)
+            for test in tests:
+                new_frame = np.full(frame.shape, 75, dtype=np.uint8)
+                mask = u.test_mask(num_cols, num_rows, test)
+                assert np.array_equal(process_reference(frame, p, p, test), process_tiled(frame, new_frame, mask, p, p))
+
+                t_loop = timeit(lambda: process_reference(frame, p, p, test), repeats)
+                t_tile = timeit(lambda: process_tiled(frame, new_frame, mask, p, p), repeats)
+                u.myprint("{:>4}x{:<4} | Patch : {:>3} | Test : {} | Patches : {:>5} | Loop : {:>10.1f} us | Tiled : {:>9.1f} us | Speedup : {:.1f}x".format(
+                          w, h, p, test, num_cols * num_rows, t_loop, t_tile, t_loop / t_tile), "green")
+    u.breaker()
+
+# ******************************************************************************************************************** #
+
+if __name__ == "__main__":
+    sys.exit(benchmark() or 0)
+
+# ******************************************************************************************************************** #
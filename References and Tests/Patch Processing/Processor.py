@@ -29,12 +29,14 @@ def process_video_as_patches(pw, ph, test=None):
 
     print("")
 
+    # Processed frame and test mask; only rebuilt when the frame size changes
+    new_frame, mask = None, None
+
     # Read data from capture object
     while cap.isOpened():
         _, frame = cap.read()
 
         h, w, _ = frame.shape
-        patches = []
 
         if h % ph == 0:num_cols = int(h/ph)
         else:num_cols = int(h/ph) + 1
@@ -42,33 +44,15 @@ def process_video_as_patches(pw, ph, test=None):
         if w % pw == 0:num_rows = int(w/pw)
         else:num_rows = int(w/pw) + 1
 
-        for i in range(0, h, ph):
-            for j in range(0, w, pw):
-                patches.append([i, ph+i, j, pw+j])
-        patches = np.array(patches).reshape(num_cols, num_rows, 4)
-
         frame = cv2.resize(src=frame, dsize=(num_rows*pw, num_cols*ph), interpolation=cv2.INTER_AREA)
-        new_frame = (np.ones((num_cols*ph, num_rows*pw, 3)) * 75).astype("uint8")
-
-        for i in range(num_cols):
-            for j in range(num_rows):
-                if test is None:
-                    new_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, :] = frame[patches[i][j][0]:patches[i][j][1], patches[i][j][2]:patches[i][j][3], :]
-
-                # Test 1
-                if test == 1:
-                    if i % 2 == 0:
-                        new_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, :] = frame[patches[i][j][0]:patches[i][j][1], patches[i][j][2]:patches[i][j][3], :]
-                
-                # Test 2
-                if test == 2:
-                    if j % 2 == 0:
-                        new_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, :] = frame[patches[i][j][0]:patches[i][j][1], patches[i][j][2]:patches[i][j][3], :]
-            
-                # Test 3
-                if test == 3:
-                        if i % 2 == 0 and j % 2 == 0:
-                            new_frame[i*ph:(i+1)*ph, j*pw:(j+1)*pw, :] = frame[patches[i][j][0]:patches[i][j][1], patches[i][j][2]:patches[i][j][3], :]
+
+        # Patches left out by the test are never written, so they keep the background value
+        if new_frame is None or new_frame.shape != frame.shape:
+            new_frame = np.full(frame.shape, 75, dtype=np.uint8)
+            mask = u.test_mask(num_cols, num_rows, test)
+
+        # Copy the selected patches through (num_cols, num_rows, ph, pw, 3) views of both frames
+        u.tile_frame(new_frame, ph, pw)[mask] = u.tile_frame(frame, ph, pw)[mask]
 
         # Stack Original and Patch Processed Frame
         frame = np.hstack((frame, new_frame))
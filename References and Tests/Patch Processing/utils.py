@@ -1,5 +1,6 @@
 import os
 import cv2
+import numpy as np
 from termcolor import colored
 
 
@@ -22,6 +23,28 @@ def clahe_equ(image):
     return image
 
 
+# Zero-copy (num_cols, num_rows, ph, pw, 3) view of the patches of a frame whose size is a multiple of (ph, pw)
+# (The same strides numpy.lib.stride_tricks.as_strided would be given; writes to the view write to the frame)
+def tile_frame(frame, ph, pw):
+    h, w, c = frame.shape
+    return frame.reshape(h // ph, ph, w // pw, pw, c).swapaxes(1, 2)
+
+
+# (num_cols, num_rows) boolean mask of the patches kept by a test
+#   None : All patches, 1 : Even patch rows, 2 : Even patch columns, 3 : Even patch rows and columns
+def test_mask(num_cols, num_rows, test=None):
+    i, j = np.arange(num_cols).reshape(-1, 1), np.arange(num_rows).reshape(1, -1)
+    if test is None:
+        return np.ones((num_cols, num_rows), dtype=bool)
+    if test == 1:
+        return np.broadcast_to(i % 2 == 0, (num_cols, num_rows))
+    if test == 2:
+        return np.broadcast_to(j % 2 == 0, (num_cols, num_rows))
+    if test == 3:
+        return (i % 2 == 0) & (j % 2 == 0)
+    return np.zeros((num_cols, num_rows), dtype=bool)
+
+
 # Webcam Feed Attributes
 CAM_WIDTH, CAM_HEIGHT, FPS, ID, WAIT_DELAY = 640, 360, 30, 0, 1
 MIN_CROP_WIDTH, MIN_CROP_HEIGHT = 10, 10
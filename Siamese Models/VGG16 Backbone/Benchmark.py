@@ -0,0 +1,503 @@
+"""
+    Micro-Benchmarks
+"""
+
+import os
+import sys
+import torch
+import numpy as np
+from time import perf_counter
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+# Time a callable; returns the mean time per call (in microseconds)
+def timeit(fn=None, setup=None, repeats=20):
+    """
+        fn      : Callable to be timed. Receives the output of setup as its only argument
+        setup   : Callable that returns a fresh input for every call (excluded from the timing)
+        repeats : Number of timed calls
+    """
+    fn(setup())
+    total = 0.0
+    for _ in range(repeats):
+        x = setup()
+        if u.DEVICE.type == "cuda":
+            torch.cuda.synchronize()
+        start_time = perf_counter()
+        fn(x)
+        if u.DEVICE.type == "cuda":
+            torch.cuda.synchronize()
+        total += perf_counter() - start_time
+    return (total / repeats) * 1e6
+
+# ******************************************************************************************************************** #
+
+# Per row normalization (Previous implementation of u.normalize; kept as a reference)
+def row_normalize(x):
+    for i in range(x.shape[0]):
+        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
+    return x
+
+
+def benchmark_normalize(sizes=(1, 64, 2500, 10000), repeats=20):
+    """
+        sizes   : Number of feature vectors (rows) to normalize
+        repeats : Number of timed calls per size
+    """
+    u.breaker()
+    u.myprint("Normalize Benchmark [N x {}] ({})".format(u.FEATURE_VECTOR_LENGTH, u.DEVICE), "cyan")
+    u.breaker()
+    for N in sizes:
+        setup = lambda: torch.rand(N, u.FEATURE_VECTOR_LENGTH, device=u.DEVICE)
+        t_loop = timeit(row_normalize, setup, repeats)
+        t_batch = timeit(u.normalize, setup, repeats)
+        t_numpy = timeit(u.normalize, lambda: np.random.rand(N, u.FEATURE_VECTOR_LENGTH).astype(np.float32), repeats)
+        u.myprint("N = {:<6} | Row Loop : {:>12.2f} us | Batched : {:>10.2f} us | Batched (NumPy) : {:>10.2f} us | Speedup : {:.1f}x".format(
+                  N, t_loop, t_batch, t_numpy, t_loop / t_batch), "green")
+
+# ******************************************************************************************************************** #
+
+# Augmented images/sec of the serial path (one imgaug call + FEDS) vs the AugmentDS dataloader workers
+def benchmark_augment(num_samples=480, batch_size=48, workers=(0, 1, 2, 4)):
+    """
+        num_samples : Number of augmented samples generated from a single image
+        batch_size  : Batch Size used by feature extracting dataloader
+        workers     : Number of augmentation workers to be benchmarked
+    """
+    from torch.utils.data import DataLoader as DL
+    from MakeData import get_augments
+    from DatasetTemplates import FEDS, AugmentDS
+
+    image = np.random.RandomState(u.SEED).randint(0, 256, size=(u.SIZE, u.SIZE, 3), dtype=np.uint8)
+    dataset_augment, _ = get_augments(u.SEED)
+
+    u.breaker()
+    u.myprint("Augmentation Benchmark [{} Samples, Batch Size {}]".format(num_samples, batch_size), "cyan")
+    u.breaker()
+
+    start_time = perf_counter()
+    images = np.array(dataset_augment(images=[image for _ in range(num_samples)]))
+    for X in DL(FEDS(X=images, transform=u.FEA_TRANSFORM), batch_size=batch_size, shuffle=False):
+        pass
+    t_serial = perf_counter() - start_time
+    u.myprint("Serial             : {:>8.1f} Images/sec".format(num_samples / t_serial), "green")
+
+    for num_workers in workers:
+        data = AugmentDS(images=[image], augments=[dataset_augment], augment_seeds=[u.SEED],
+                         num_samples=num_samples, batch_size=batch_size, transform=u.FEA_TRANSFORM)
+        start_time = perf_counter()
+        for X in DL(data, batch_size=None, shuffle=False, num_workers=num_workers):
+            pass
+        t_parallel = perf_counter() - start_time
+        u.myprint("AugmentDS [{} Workers] : {:>8.1f} Images/sec | Speedup : {:.1f}x".format(
+                  num_workers, num_samples / t_parallel, t_serial / t_parallel), "green")
+
+# ******************************************************************************************************************** #
+
+# Worker startup cost; one DataLoader per image (previous make_data) vs one DataLoader for all the images, with the
+# spawn start method (Default on Windows and macOS)
+def benchmark_loader(num_images=(1, 10, 50), num_samples=48, batch_size=48, num_workers=u.NUM_WORKERS):
+    """
+        num_images  : Number of images of the class
+        num_samples : Number of augmented samples per image
+        batch_size  : Batch Size used by feature extracting dataloader
+        num_workers : Number of augmentation workers
+    """
+    from torch.utils.data import DataLoader as DL
+    from MakeData import get_augments
+    from DatasetTemplates import AugmentDS
+
+    rng = np.random.RandomState(u.SEED)
+    dataset_augment, _ = get_augments(u.SEED)
+
+    u.breaker()
+    u.myprint("DataLoader Benchmark [spawn, {} Workers, {} Samples per Image]".format(num_workers, num_samples), "cyan")
+    u.breaker()
+    for N in num_images:
+        images = [rng.randint(0, 256, size=(u.SIZE, u.SIZE, 3), dtype=np.uint8) for _ in range(N)]
+        augments, augment_seeds = [dataset_augment] * N, list(range(N))
+
+        start_time = perf_counter()
+        for k in range(N):
+            data = AugmentDS(images=images[k:k + 1], augments=augments[k:k + 1], augment_seeds=augment_seeds[k:k + 1],
+                             num_samples=num_samples, batch_size=batch_size, transform=u.FEA_TRANSFORM)
+            for X in DL(data, batch_size=None, shuffle=False, num_workers=num_workers, multiprocessing_context="spawn"):
+                pass
+        t_per_image = perf_counter() - start_time
+
+        start_time = perf_counter()
+        data = AugmentDS(images=images, augments=augments, augment_seeds=augment_seeds,
+                         num_samples=num_samples, batch_size=batch_size, transform=u.FEA_TRANSFORM)
+        for X in DL(data, batch_size=None, shuffle=False, num_workers=num_workers, multiprocessing_context="spawn"):
+            pass
+        t_shared = perf_counter() - start_time
+
+        u.myprint("Images : {:<4} | Per Image Loaders : {:>8.2f} s ({:.2f} s/Image) | Shared Loader : {:>8.2f} s | Speedup : {:.1f}x".format(
+                  N, t_per_image, t_per_image / N, t_shared, t_per_image / t_shared), "green")
+
+# ******************************************************************************************************************** #
+
+# Regenerate the augmented samples behind a stored Positive_Features.npy (as written by MakeData.make_data)
+# and yield (stored features, features extracted by fea_extractor) pairs, one batch at a time
+def regenerate_features(part_name=None, fea_extractor=None, batch_size=48, max_samples=None):
+    import cv2
+    from torch.utils.data import DataLoader as DL
+    from MakeData import get_augments, image_hash
+    from DatasetTemplates import AugmentDS
+
+    base_path = os.path.join(u.DATASET_PATH, part_name)
+    names = sorted(os.listdir(os.path.join(base_path, "Positive")))
+    stored = np.load(os.path.join(base_path, "Positive_Features.npy"), mmap_mode="r")
+    num_samples_per_image = stored.shape[0] // len(names)
+    if max_samples is not None:
+        num_samples_per_image = min(num_samples_per_image, max(1, max_samples // len(names)))
+
+    for k, name in enumerate(names):
+        image = u.preprocess(cv2.imread(os.path.join(os.path.join(base_path, "Positive"), name), cv2.IMREAD_COLOR))
+        augment_seed = int(image_hash(image), 16) % 100
+        dataset_augment, _ = get_augments(augment_seed)
+
+        num_batches = (num_samples_per_image + batch_size - 1) // batch_size
+        data = AugmentDS(images=[image], augments=[dataset_augment], augment_seeds=[augment_seed],
+                         num_samples=num_batches * batch_size, batch_size=batch_size, transform=u.FEA_TRANSFORM)
+        for b, X in enumerate(DL(data, batch_size=None, shuffle=False, num_workers=u.NUM_WORKERS)):
+            start = k * stored.shape[0] // len(names) + b * batch_size
+            size = min(batch_size, num_samples_per_image - b * batch_size)
+            with torch.no_grad():
+                features = u.normalize(fea_extractor(X[:size].to(u.DEVICE)))
+            yield torch.from_numpy(np.array(stored[start:start + size])).to(u.DEVICE), features
+
+
+# Feature Extractor Inference Engine vs fp32; per-frame latency, batch throughput and feature accuracy delta
+def benchmark_engine(precision="bf16", channels_last=True, compile=False, batch_size=48, repeats=10):
+    """
+        precision     : Precision of the Inference Engine
+        channels_last : Flag that controls the memory format of the Inference Engine
+        compile       : Flag that controls whether the Inference Engine uses torch.compile
+        batch_size    : Batch Size used by feature extracting dataloader
+        repeats       : Number of timed calls
+    """
+    import Models
+
+    # Every engine configuration is a separate registry instance; the one used by the application is left untouched
+    configs = [("fp32", dict(precision="fp32", channels_last=False, compile=False)), (precision + (" + channels_last" if channels_last else "") + (" + compile" if compile else ""),
+                                  dict(precision=precision, channels_last=channels_last, compile=compile))]
+
+    u.breaker()
+    u.myprint("Feature Extractor Inference Engine Benchmark ({})".format(u.DEVICE), "cyan")
+    u.breaker()
+    for name, config in configs:
+        fea_extractor = Models.get_model(Models.FeatureExtractor.architecture, **config)
+        with torch.no_grad():
+            t_frame = timeit(fea_extractor, lambda: torch.rand(1, 3, u.SIZE, u.SIZE, device=u.DEVICE), repeats)
+            t_batch = timeit(fea_extractor, lambda: torch.rand(batch_size, 3, u.SIZE, u.SIZE, device=u.DEVICE), repeats)
+        u.myprint("{:<32} | Frame Latency : {:>8.2f} ms | Batch Throughput : {:>8.1f} Images/sec".format(
+                  name, t_frame / 1e3, batch_size / (t_batch / 1e6)), "green")
+
+        # Accuracy delta against the stored (fp32) features of a part
+        if part_name is not None:
+            max_diff, sum_diff, sum_cosine, count = 0.0, 0.0, 0.0, 0
+            for stored, features in regenerate_features(part_name, fea_extractor, batch_size, max_samples=10 * batch_size):
+                diff = torch.abs(stored - features)
+                max_diff = max(max_diff, diff.max().item())
+                sum_diff += diff.mean(dim=1).sum().item()
+                sum_cosine += torch.nn.functional.cosine_similarity(stored, features).sum().item()
+                count += stored.shape[0]
+            u.myprint("{:<32} | vs Positive_Features.npy [{} Samples] : Max Abs Diff : {:.5f} | Mean Abs Diff : {:.5f} | Mean Cosine : {:.6f}".format(
+                      "", count, max_diff, sum_diff / count, sum_cosine / count), "green")
+
+# ******************************************************************************************************************** #
+
+# Bounding box stage of the realtime loop on a recorded video; per frame detection vs detect every K frames + tracking
+def benchmark_tracking(detect_every=(5, 10, 30), max_frames=300):
+    """
+        detect_every : Detection intervals to be benchmarked
+        max_frames   : Maximum number of video frames used
+    """
+    import cv2
+    import Models
+    from Tracking import BoxTracker, box_iou
+
+    if video_file is None:
+        u.myprint("\nTracking Benchmark needs a recorded video (--video File.mp4)", "red")
+        return
+
+    cap = cv2.VideoCapture(video_file)
+    frames = []
+    while cap.isOpened() and len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(u.clahe_equ(frame))
+    cap.release()
+
+    u.breaker()
+    u.myprint("Tracking Benchmark [{} Frames] ({})".format(len(frames), u.DEVICE), "cyan")
+    u.breaker()
+
+    start_time = perf_counter()
+    reference = [u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, frame) for frame in frames]
+    t_reference = perf_counter() - start_time
+    u.myprint("Per Frame Detection  : {:>8.1f} FPS".format(len(frames) / t_reference), "green")
+
+    for K in detect_every:
+        tracker = BoxTracker(roi_extractor=Models.roi_extractor, detect_every=K)
+        start_time = perf_counter()
+        boxes = [tracker(frame) for frame in frames]
+        t_tracker = perf_counter() - start_time
+        ious = [box_iou(box_1, box_2) for box_1, box_2 in zip(reference, boxes) if box_1[0] is not None]
+        u.myprint("Detect Every {:<3} + Track : {:>8.1f} FPS | Speedup : {:.1f}x | Detector Runs : {:>4} | Mean IoU : {:.3f} | Min IoU : {:.3f}".format(
+                  K, len(frames) / t_tracker, t_reference / t_tracker, tracker.detections,
+                  np.mean(ious) if ious else 0.0, np.min(ious) if ious else 0.0), "green")
+
+# ******************************************************************************************************************** #
+
+# Per frame cost of the Anchor Scorer as the number of anchors grows; per anchor model calls vs one batched pass
+def benchmark_anchors(counts=(1, 10, 100, 500), repeats=20):
+    """
+        counts  : Number of anchors
+        repeats : Number of timed calls per count
+    """
+    import Models
+
+    model, _, _, _ = Models.build_siamese_model(embed=u.embed_layer_size)
+    model.to(u.DEVICE)
+    model.eval()
+
+    u.breaker()
+    u.myprint("Anchor Scorer Benchmark [Embed {}] ({})".format(u.embed_layer_size, u.DEVICE), "cyan")
+    u.breaker()
+    setup = lambda: u.normalize(torch.rand(1, u.FEATURE_VECTOR_LENGTH, device=u.DEVICE))
+    for A in counts:
+        anchors = u.normalize(torch.rand(A, u.FEATURE_VECTOR_LENGTH, device=u.DEVICE))
+        scorer = Models.AnchorScorer(model=model, anchors=anchors)
+        with torch.no_grad():
+            t_loop = timeit(lambda x: max(torch.sigmoid(model(x, anchors[i:i + 1])).item() for i in range(A)), setup, repeats)
+            t_batch = timeit(scorer, setup, repeats)
+        u.myprint("Anchors = {:<4} | Per Anchor Loop : {:>10.2f} us | Batched : {:>8.2f} us | Speedup : {:.1f}x".format(
+                  A, t_loop, t_batch, t_loop / t_batch), "green")
+
+# ******************************************************************************************************************** #
+
+# Cold-start time of a fresh process; importing the application vs loading the backbones through the registry
+def benchmark_startup(repeats=3):
+    """
+        repeats : Number of fresh processes started per stage
+    """
+    import subprocess
+
+    stages = [
+        ("Import (cli, gui)",          "import cli, gui"),
+        ("Import + Load Backbones",    "import Models; Models.roi_extractor; Models.fea_extractor"),
+    ]
+
+    u.breaker()
+    u.myprint("Startup Benchmark [Weights : {}]".format(u.WEIGHTS_PATH), "cyan")
+    u.breaker()
+
+    # Create the local weights files (if needed) so that every timed process loads them memory-mapped
+    subprocess.run([sys.executable, "-c", stages[-1][1]], check=True, capture_output=True)
+
+    for name, code in stages:
+        times = []
+        for _ in range(repeats):
+            start_time = perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+            times.append(perf_counter() - start_time)
+        u.myprint("{:<26} : {:>6.2f} s (Best of {} : {:.2f} s)".format(name, np.mean(times), repeats, np.min(times)), "green")
+
+# ******************************************************************************************************************** #
+
+# Previous implementation of u.clahe_equ (new CLAHE object per call, per channel copies; kept as a reference)
+def clahe_equ_reference(image):
+    import cv2
+
+    clahe = cv2.createCLAHE(clipLimit=2, tileGridSize=(2, 2))
+    for i in range(3):
+        image[:, :, i] = clahe.apply(image[:, :, i])
+    return image
+
+
+# Per frame preprocessing (CLAHE + Resize + Center Crop + ToTensor + Normalize); previous path vs fused path
+def benchmark_preprocess(repeats=200):
+    """
+        repeats : Number of timed frames
+    """
+    setup = lambda: np.random.RandomState(u.SEED).randint(0, 256, size=(u.CAM_HEIGHT, u.CAM_WIDTH, 3), dtype=np.uint8)
+    reference = lambda frame: u.FEA_TRANSFORM(u.preprocess(clahe_equ_reference(frame), change_color_space=False)).unsqueeze(dim=0)
+    fused = lambda frame: u.FRAME_TRANSFORM(u.clahe_equ(frame))
+
+    u.breaker()
+    u.myprint("Preprocessing Benchmark [{}x{} Frame]".format(u.CAM_WIDTH, u.CAM_HEIGHT), "cyan")
+    u.breaker()
+    t_reference = timeit(reference, setup, repeats)
+    t_fused = timeit(fused, setup, repeats)
+    max_diff = torch.abs(reference(setup()) - fused(setup())).max().item()
+    u.myprint("Previous : {:>8.1f} us | Fused : {:>8.1f} us | Speedup : {:.1f}x | Max Abs Diff : {:.2e}".format(
+              t_reference, t_fused, t_reference / t_fused, max_diff), "green")
+
+# ******************************************************************************************************************** #
+
+# Per frame scoring cost over several parts; one AnchorScorer per part vs the stacked MultiPartScorer
+def benchmark_parts(counts=(1, 4, 16, 64), num_anchors=8, repeats=20):
+    """
+        counts      : Number of parts
+        num_anchors : Number of anchors per part
+        repeats     : Number of timed calls per count
+    """
+    import Models
+
+    u.breaker()
+    u.myprint("Multi-Part Scorer Benchmark [{} Anchors per Part] ({})".format(num_anchors, u.DEVICE), "cyan")
+    u.breaker()
+    setup = lambda: u.normalize(torch.rand(1, u.FEATURE_VECTOR_LENGTH, device=u.DEVICE))
+    for P in counts:
+        scorers = []
+        for _ in range(P):
+            model, _, _, _ = Models.build_siamese_model(embed=u.embed_layer_size)
+            model.to(u.DEVICE)
+            model.eval()
+            scorers.append(Models.AnchorScorer(model=model, anchors=u.normalize(torch.rand(num_anchors, u.FEATURE_VECTOR_LENGTH, device=u.DEVICE))))
+        stacked = Models.MultiPartScorer(part_names=[str(i) for i in range(P)], models=[scorer.model for scorer in scorers],
+                                         anchors=[scorer.embeddings for scorer in scorers])
+        t_loop = timeit(lambda x: max(scorer(x)[0].item() for scorer in scorers), setup, repeats)
+        t_stacked = timeit(stacked, setup, repeats)
+        u.myprint("Parts = {:<3} | Per Part Loop : {:>10.2f} us | Stacked : {:>8.2f} us | Speedup : {:.1f}x".format(
+                  P, t_loop, t_stacked, t_loop / t_stacked), "green")
+
+# ******************************************************************************************************************** #
+
+# SiameseDS construction time as the number of anchors grows (Unequal Positive/Negative counts)
+def benchmark_dataset(counts=(1, 10, 100), num_positive=2000, num_negative=1500, repeats=5):
+    """
+        counts       : Number of anchors
+        num_positive : Number of Positive feature vectors
+        num_negative : Number of Negative feature vectors
+        repeats      : Number of timed constructions per count
+    """
+    from DatasetTemplates import SiameseDS
+
+    p_vector = np.random.rand(num_positive, u.FEATURE_VECTOR_LENGTH).astype(np.float32)
+    n_vector = np.random.rand(num_negative, u.FEATURE_VECTOR_LENGTH).astype(np.float32)
+
+    u.breaker()
+    u.myprint("SiameseDS Benchmark [{} Positive, {} Negative]".format(num_positive, num_negative), "cyan")
+    u.breaker()
+    for A in counts:
+        anchors = [np.random.rand(1, u.FEATURE_VECTOR_LENGTH).astype(np.float32) for _ in range(A)]
+        t_build = timeit(lambda anchors: SiameseDS(anchors=anchors, p_vector=p_vector, n_vector=n_vector), lambda: anchors, repeats)
+        u.myprint("Anchors = {:<4} | Construction : {:>10.2f} us | Pairs : {}".format(
+                  A, t_build, len(SiameseDS(anchors=anchors, p_vector=p_vector, n_vector=n_vector))), "green")
+
+# ******************************************************************************************************************** #
+
+# Training epochs/sec of the Siamese Network; DataLoader (per sample __getitem__) vs DataLoader (batched) vs TensorLoader
+def benchmark_train(num_anchors=5, num_samples=2000, batch_size=512, epochs=3):
+    """
+        num_anchors : Number of anchors
+        num_samples : Number of Positive (and Negative) feature vectors
+        batch_size  : Batch Size used during training
+        epochs      : Number of timed epochs per loader
+    """
+    import Models
+    from torch.utils.data import DataLoader as DL
+    from DatasetTemplates import SiameseDS, TensorLoader, batch_collate
+
+    anchors = [np.random.rand(1, u.FEATURE_VECTOR_LENGTH).astype(np.float32) for _ in range(num_anchors)]
+    p_vector = np.random.rand(num_samples, u.FEATURE_VECTOR_LENGTH).astype(np.float32)
+    n_vector = np.random.rand(num_samples, u.FEATURE_VECTOR_LENGTH).astype(np.float32)
+
+    model, _, lr, wd = Models.build_siamese_model(embed=u.embed_layer_size)
+    model.to(u.DEVICE)
+    optimizer = model.getOptimizer(lr=lr, wd=wd)
+    criterion = torch.nn.BCEWithLogitsLoss()
+
+    # DataLoader uses __getitems__ whenever a Dataset defines it (torch >= 2.0); this wrapper only exposes __getitem__,
+    # so the DataLoader fetches and collates one pair at a time (The path fit_ took before TensorLoader)
+    class PerSampleDS(torch.utils.data.Dataset):
+        def __init__(self, dataset=None):
+            self.dataset = dataset
+
+        def __len__(self):
+            return len(self.dataset)
+
+        def __getitem__(self, idx):
+            return self.dataset[idx]
+
+    def run_epoch(loader):
+        for X, y in loader:
+            X, y = X.to(u.DEVICE), y.to(u.DEVICE)
+            optimizer.zero_grad()
+            loss = criterion(model(X[:, 0, :], X[:, 1, :]), y)
+            loss.backward()
+            optimizer.step()
+        if u.DEVICE.type == "cuda":
+            torch.cuda.synchronize()
+
+    loaders = [
+        ("DataLoader (Per Sample)", lambda: DL(PerSampleDS(SiameseDS(anchors=anchors, p_vector=p_vector, n_vector=n_vector)), batch_size=batch_size, shuffle=True)),
+        ("DataLoader (Batched)",    lambda: DL(SiameseDS(anchors=anchors, p_vector=p_vector, n_vector=n_vector), batch_size=batch_size, shuffle=True, collate_fn=batch_collate)),
+        ("TensorLoader",            lambda: TensorLoader(SiameseDS(anchors=anchors, p_vector=p_vector, n_vector=n_vector), batch_size=batch_size, shuffle=True,
+                                                         generator=torch.manual_seed(u.SEED), device=u.DEVICE)),
+    ]
+
+    u.breaker()
+    u.myprint("Training Loader Benchmark [{} Pairs, Batch Size {}] ({})".format(num_anchors * 2 * num_samples, batch_size, u.DEVICE), "cyan")
+    u.breaker()
+    for name, build in loaders:
+        loader = build()
+        run_epoch(loader)
+        start_time = perf_counter()
+        for _ in range(epochs):
+            run_epoch(loader)
+        u.myprint("{:<24} : {:>8.2f} Epochs/sec".format(name, epochs / (perf_counter() - start_time)), "green")
+
+# ******************************************************************************************************************** #
+
+BENCHMARKS = {
+    "normalize"  : benchmark_normalize,
+    "augment"    : benchmark_augment,
+    "loader"     : benchmark_loader,
+    "engine"     : benchmark_engine,
+    "tracking"   : benchmark_tracking,
+    "anchors"    : benchmark_anchors,
+    "startup"    : benchmark_startup,
+    "preprocess" : benchmark_preprocess,
+    "parts"      : benchmark_parts,
+    "dataset"    : benchmark_dataset,
+    "train"      : benchmark_train,
+}
+
+# Part used by the benchmarks that compare against stored data (--part)
+part_name = None
+
+# Recorded video used by the tracking benchmark (--video)
+video_file = None
+
+
+def main():
+    global part_name, video_file
+
+    args_1 = "--part"
+    if args_1 in sys.argv:
+        part_name = sys.argv[sys.argv.index(args_1) + 1]
+        sys.argv = sys.argv[:sys.argv.index(args_1)] + sys.argv[sys.argv.index(args_1) + 2:]
+
+    args_2 = "--video"
+    if args_2 in sys.argv:
+        video_file = sys.argv[sys.argv.index(args_2) + 1]
+        sys.argv = sys.argv[:sys.argv.index(args_2)] + sys.argv[sys.argv.index(args_2) + 2:]
+
+    names = sys.argv[1:] if len(sys.argv) > 1 else BENCHMARKS.keys()
+    for name in names:
+        BENCHMARKS[name]()
+    u.breaker()
+
+# ******************************************************************************************************************** #
+
+if __name__ == "__main__":
+    sys.exit(main() or 0)
+
+# ******************************************************************************************************************** #
@@ -0,0 +1,158 @@
+"""
+    Asynchronous Frame Capture
+"""
+
+import cv2
+import platform
+import threading
+from time import time
+from collections import deque
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+# Setup a cv2.VideoCapture object for a device ID (camera) or a filename (video)
+def open_capture(source=None, width=u.CAM_WIDTH, height=u.CAM_HEIGHT, fps=u.FPS):
+    """
+        source : Device ID of the capture object or the path to a video file
+        width  : Width of the capture frame (Only applied to devices)
+        height : Height of the capture frame (Only applied to devices)
+        fps    : FPS of the capture object (Only applied to devices)
+    """
+    if isinstance(source, str):
+        return cv2.VideoCapture(source)
+
+    if platform.system() != "Windows":
+        cap = cv2.VideoCapture(source)
+    else:
+        cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    return cap
+
+# ******************************************************************************************************************** #
+
+"""
+    - Producer/Consumer capture stage
+    - A background thread owns the cv2.VideoCapture object and pushes (timestamp, frame) into a bounded ring buffer
+    - With drop=True (cameras) the oldest frames are discarded so that the consumer always sees the newest frame
+    - With drop=False (video files) the reader waits for the consumer so that no frame is skipped
+"""
+class FrameReader(object):
+    def __init__(self, source=None, width=u.CAM_WIDTH, height=u.CAM_HEIGHT, fps=u.FPS, maxlen=2, drop=True, loop=False):
+        """
+            source : Device ID of the capture object or the path to a video file
+            width  : Width of the capture frame
+            height : Height of the capture frame
+            fps    : FPS of the capture object
+            maxlen : Number of frames held in the ring buffer
+            drop   : Flag that controls whether the oldest frame is discarded when the buffer is full
+            loop   : Flag that controls whether a video file is restarted once it ends
+        """
+        self.source = source
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.drop = drop
+        self.loop = loop
+
+        self.cap = None
+        self.thread = None
+        self.buffer = deque(maxlen=maxlen)
+        self.condition = threading.Condition()
+        self.running = False
+
+        # Capture timestamp of the last frame returned by read()
+        self.timestamp = None
+
+    def start(self):
+        """
+            Initialize the capture object and start the reader thread
+        """
+        self.cap = open_capture(self.source, self.width, self.height, self.fps)
+        self.running = True
+        self.thread = threading.Thread(target=self.__reader__, daemon=True)
+        self.thread.start()
+        return self
+
+    def __reader__(self):
+        rewound = False
+        while self.running and self.cap.isOpened():
+            ret, frame = self.cap.read()
+            timestamp = time()
+
+            if not ret:
+                # A rewind that yields no frame (a file that opens but never decodes) ends the reader instead of spinning
+                if self.loop and not rewound:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    rewound = True
+                    continue
+                break
+            rewound = False
+
+            with self.condition:
+                while not self.drop and self.running and len(self.buffer) == self.buffer.maxlen:
+                    self.condition.wait()
+                self.buffer.append((timestamp, frame))
+                self.condition.notify_all()
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def isOpened(self):
+        """
+            True as long as frames are being produced or are still left in the buffer
+        """
+        with self.condition:
+            return self.running or len(self.buffer) > 0
+
+    def read(self, timeout=None):
+        """
+            - Blocks until a frame is available; returns (ret, frame) like cv2.VideoCapture.read()
+            - Returns (False, None) after timeout seconds without a frame (None blocks indefinitely; the GUI must pass a
+              finite timeout so that a stalled camera does not block the tkinter main thread)
+            - In drop mode, only the newest frame is returned and everything older is discarded
+        """
+        with self.condition:
+            while self.running and len(self.buffer) == 0:
+                if not self.condition.wait(timeout=timeout):
+                    return False, None
+            if len(self.buffer) == 0:
+                return False, None
+
+            if self.drop:
+                self.timestamp, frame = self.buffer.pop()
+                self.buffer.clear()
+            else:
+                self.timestamp, frame = self.buffer.popleft()
+            self.condition.notify_all()
+        return True, frame
+
+    def frame_age(self):
+        """
+            Age (in seconds) of the last frame returned by read()
+        """
+        if self.timestamp is None:
+            return 0.0
+        return time() - self.timestamp
+
+    def stop(self):
+        """
+            Stop the reader thread and release the capture object
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.cap is not None and self.cap.isOpened():
+            self.cap.release()
+        self.buffer.clear()
+
+    release = stop
+
+# ******************************************************************************************************************** #
@@ -0,0 +1,113 @@
+"""
+    Background Checkpoint Writer
+"""
+
+import io
+import os
+import json
+import queue
+import torch
+import threading
+
+# ******************************************************************************************************************** #
+
+# Copy of a (nested) state_dict on the CPU; the training loop keeps updating the originals
+def cpu_state(state=None):
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {k: cpu_state(v) for k, v in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(cpu_state(v) for v in state)
+    return state
+
+
+# Write data to path through a temporary file and a rename; readers see either the old or the new file, never a partial one
+def atomic_write(path=None, data=None):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+# ******************************************************************************************************************** #
+
+"""
+    - save() snapshots the model and optimizer state dicts to the CPU and returns; the files are written on a separate thread
+    - Every checkpoint is written to State_Epoch_<epoch>.pt and to State.pt (the file loaded by RTApp, the GUI and Inspect)
+    - Only the best num_best checkpoints (lowest validation loss) are kept; their metadata is listed in Checkpoints.json
+"""
+class CheckpointWriter(object):
+    def __init__(self, path=None, num_best=3, metadata=None):
+        """
+            path     : Checkpoint directory
+            num_best : Number of checkpoints kept on disk
+            metadata : Dictionary stored with every checkpoint (feature backbone, embedding size, ...)
+        """
+        self.path = path
+        self.num_best = num_best
+        self.metadata = metadata if metadata is not None else {}
+        self.best = []
+        self.error = None
+
+        # Checkpoints of an earlier training run of the part
+        for name in os.listdir(path):
+            if name.startswith("State_Epoch_"):
+                os.remove(os.path.join(path, name))
+
+        # Bounds the number of snapshots held in memory when the disk is slower than the epochs
+        self.queue = queue.Queue(maxsize=2)
+        self.thread = threading.Thread(target=self.__writer__, daemon=True)
+        self.thread.start()
+
+    def save(self, model=None, optimizer=None, epoch=None, valid_loss=None):
+        """
+            model      : Model whose state is saved
+            optimizer  : Optimizer whose state is saved
+            epoch      : Epoch of the checkpoint
+            valid_loss : Validation loss at that epoch
+        """
+        metadata = dict(self.metadata, epoch=epoch, valid_loss=float(valid_loss))
+        self.queue.put({"model_state_dict": cpu_state(model.state_dict()),
+                        "optim_state_dict": cpu_state(optimizer.state_dict()),
+                        "metadata": metadata})
+
+    def __writer__(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                break
+            try:
+                self.write(state)
+            except Exception as e:
+                self.error = e
+
+    def write(self, state=None):
+        buffer = io.BytesIO()
+        torch.save(state, buffer)
+
+        name = "State_Epoch_{}.pt".format(state["metadata"]["epoch"])
+        atomic_write(os.path.join(self.path, name), buffer.getbuffer())
+
+        self.best.append(dict(state["metadata"], file=name))
+        self.best.sort(key=lambda item: item["valid_loss"])
+        for item in self.best[self.num_best:]:
+            if os.path.exists(os.path.join(self.path, item["file"])):
+                os.remove(os.path.join(self.path, item["file"]))
+        self.best = self.best[:self.num_best]
+
+        if self.best[0]["file"] == name:
+            atomic_write(os.path.join(self.path, "State.pt"), buffer.getbuffer())
+        atomic_write(os.path.join(self.path, "Checkpoints.json"), json.dumps(self.best, indent=4).encode())
+
+    def close(self):
+        """
+            Wait for the pending checkpoints to be written
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+# ******************************************************************************************************************** #
@@ -27,7 +27,71 @@ class FEDS(Dataset):
 
 # ******************************************************************************************************************** #
 
-# Dataset Template used to generate data that can be passed to the Siamese Network
+"""
+    - Dataset Template used to augment images in the dataloader workers
+    - Each item is a full batch of augmented + transformed images of one image, so a DataLoader(batch_size=None, num_workers=N)
+      augments the next batches in parallel while the feature extractor runs on the current one
+    - Items are (image index, batch index) pairs across all the images, so one DataLoader (one set of workers) serves
+      every image of a make_data call instead of starting new workers per image
+    - The augmenter is reseeded per batch from (augment_seed, batch index); output does not depend on num_workers
+    - Only the listed batches are generated, so a partially extracted image can be resumed (Feature Cache)
+"""
+class AugmentDS(Dataset):
+    def __init__(self, images=None, augments=None, augment_seeds=None, num_samples=None, batch_size=None, transform=None, batches=None):
+        """
+            images        : Images to be augmented
+            augments      : imgaug augmentation pipeline of every image
+            augment_seeds : Base seed of the augmentation pipeline of every image
+            num_samples   : Number of augmented samples to generate per image
+            batch_size    : Number of augmented samples in each item
+            transform     : transformations to be applied to the augmented images
+            batches       : (Image index, Batch index) of every item, in order (Default: All the batches of every image)
+        """
+        self.images = images
+        self.augments = augments
+        self.augment_seeds = augment_seeds
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.transform = transform
+        if batches is None:
+            num_batches = (num_samples + batch_size - 1) // batch_size
+            batches = [(k, b) for k in range(len(images)) for b in range(num_batches)]
+        self.batches = batches
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, idx):
+        k, b = self.batches[idx]
+        size = min(self.batch_size, self.num_samples - b * self.batch_size)
+        self.augments[k].seed_(u.derive_seed(self.augment_seeds[k], b))
+        images = np.array(self.augments[k](images=[self.images[k] for _ in range(size)]))
+        return torch.stack([self.transform(image) for image in images])
+
+# ******************************************************************************************************************** #
+
+# Class-balanced sample indices; every sample of the class is used floor(size / num_samples) times and the remainder
+# is drawn at random (without replacement), so a smaller class is oversampled instead of the larger one being truncated.
+# Unlike plain sampling with replacement, every sample is guaranteed to appear and no sample appears more than once
+# above the others. Each class should pass its own seed so that the remainders are drawn from independent streams
+def balanced_indices(num_samples=None, size=None, seed=u.SEED):
+    """
+        num_samples : Number of samples in the class
+        size        : Number of indices to generate (>= num_samples)
+        seed        : Seed of the random remainder
+    """
+    remainder = np.random.RandomState(seed).choice(num_samples, size % num_samples, replace=False)
+    return np.concatenate((np.tile(np.arange(num_samples), size // num_samples), remainder))
+
+# ******************************************************************************************************************** #
+
+"""
+    - Dataset Template used to generate data that can be passed to the Siamese Network
+    - Anchors, Positive and Negative features are stored once (float32); (Anchor, Sample) pairs are generated from the index
+    - For every anchor, indices [0, M) are (Anchor, Positive) pairs and [M, 2M) are (Anchor, Negative) pairs
+    - M = max(#Positive, #Negative); the smaller class is oversampled with balanced_indices, so no sample is discarded
+    - Construction is a single index computation over M; it does not depend on the number of anchors
+"""
 class SiameseDS(Dataset):
     def __init__(self, anchors=None, p_vector=None, n_vector=None):
         """
@@ -35,78 +99,79 @@ class SiameseDS(Dataset):
             p_vector : (N, 2048) np.ndarray containing features of images in the Positive Class
             n_vector : (N, 2048) np.ndarray containing features of images in the Negative Class  
         """
+        self.num_pairs = max(p_vector.shape[0], n_vector.shape[0])
 
-        self.anchors = anchors
-        self.p_vector = p_vector
-        self.n_vector = n_vector
-
-        # Helper Arrays
-        self.fullX = np.zeros((1, 2, u.FEATURE_VECTOR_LENGTH))
-        self.fully = np.zeros((1, 1))
-
-        if self.p_vector.shape[0] != self.n_vector.shape[0]:
-            for anchor in self.anchors:
-                min_val = min(self.p_vector.shape[0], self.n_vector.shape[0])
-                self.anchor = np.array([anchor for _ in range(min_val)])
-
-                # Generate (Anchor, Positive) and (Anchor, Negative) Pairs
-                # anchor Shape   ---> (N, 1, 2048)
-                # p_vector Shape ---> (N, 2048) expanded to (N, 1, 2048)
-                # n_vector Shape ---> (N, 2048) expanded to (N, 1, 2048)
-                # Concatenate Anchor with Positive/Negative along dimension 1
-                self.pX = np.concatenate((self.anchor, np.expand_dims(self.p_vector[:min_val], axis=1)), axis=1)
-                self.nX = np.concatenate((self.anchor, np.expand_dims(self.n_vector[:min_val], axis=1)), axis=1)
-
-                # Generate Labels 
-                self.py = np.ones((self.pX.shape[0], 1))
-                self.ny = np.zeros((self.nX.shape[0], 1))
-
-                # Concatenate (Anchor, Positive) and (Anchor, Negative)
-                self.X = np.concatenate((self.pX, self.nX), axis=0)
-                self.y = np.concatenate((self.py, self.ny), axis=0)
-
-                # Concatenate with helpers
-                self.fullX = np.concatenate((self.fullX, self.X), axis=0)
-                self.fully = np.concatenate((self.fully, self.y), axis=0)
-
-            # Clean Up; remove the first element
-            self.fullX = self.fullX[1:]
-            self.fully = self.fully[1:]
-        else:
-            for anchor in self.anchors:
-                self.anchor = np.array([anchor for _ in range(self.p_vector.shape[0])])
-
-                # Generate (Anchor, Positive) and (Anchor, Negative) Pairs
-                # anchor Shape   ---> (N, 1, 2048)
-                # p_vector Shape ---> (N, 2048) expanded to (N, 1, 2048)
-                # n_vector Shape ---> (N, 2048) expanded to (N, 1, 2048)
-                # Concatenate Anchor with Positive/Negative along dimension 1
-                self.pX = np.concatenate((self.anchor, np.expand_dims(self.p_vector, axis=1)), axis=1)
-                self.nX = np.concatenate((self.anchor, np.expand_dims(self.n_vector, axis=1)), axis=1)
-                
-                # Generate Labels 
-                self.py = np.ones((self.pX.shape[0], 1))
-                self.ny = np.zeros((self.nX.shape[0], 1))
-
-                # Concatenate (Anchor, Positive) and (Anchor, Negative)
-                self.X = np.concatenate((self.pX, self.nX), axis=0)
-                self.y = np.concatenate((self.py, self.ny), axis=0)
-
-                # Concatenate with helpers
-                self.fullX = np.concatenate((self.fullX, self.X), axis=0)
-                self.fully = np.concatenate((self.fully, self.y), axis=0)
-
-            # Clean Up; remove the first element 
-            self.fullX = self.fullX[1:]
-            self.fully = self.fully[1:]
+        # anchors Shape ---> (A, 2048), samples Shape ---> (#Positive + #Negative, 2048)
+        self.anchors = torch.as_tensor(np.stack([np.asarray(anchor, dtype=np.float32).reshape(-1) for anchor in anchors]))
+        self.samples = torch.cat((torch.as_tensor(p_vector, dtype=torch.float32), torch.as_tensor(n_vector, dtype=torch.float32)), dim=0)
+
+        # sample_index Shape ---> (2M, ), labels Shape ---> (2M, 1)
+        self.sample_index = torch.as_tensor(np.concatenate((balanced_indices(p_vector.shape[0], self.num_pairs, u.derive_seed(u.SEED, 0)),
+                                                            p_vector.shape[0] + balanced_indices(n_vector.shape[0], self.num_pairs, u.derive_seed(u.SEED, 1)))))
+        self.labels = torch.cat((torch.ones(self.num_pairs, 1), torch.zeros(self.num_pairs, 1)), dim=0)
 
 
     def __len__(self):
-        return self.fullX.shape[0]
+        return self.anchors.shape[0] * self.labels.shape[0]
 
 
     def __getitem__(self, idx):
-        return torch.FloatTensor(self.fullX[idx]), torch.FloatTensor(self.fully[idx])
+        anchor_idx, pair_idx = divmod(idx, self.labels.shape[0])
+        return torch.stack((self.anchors[anchor_idx], self.samples[self.sample_index[pair_idx]])), self.labels[pair_idx]
+
+
+    # Batched path used by TensorLoader (and DataLoader with collate_fn=batch_collate); returns (B, 2, 2048) and (B, 1) tensors
+    def __getitems__(self, indices):
+        indices = torch.as_tensor(indices, device=self.labels.device)
+        anchor_idx, pair_idx = indices // self.labels.shape[0], indices % self.labels.shape[0]
+        return torch.stack((self.anchors[anchor_idx], self.samples[self.sample_index[pair_idx]]), dim=1), self.labels[pair_idx]
+
+
+    # Move the stored tensors to a device (Batches are then gathered directly on that device)
+    def to(self, device):
+        self.anchors = self.anchors.to(device)
+        self.samples = self.samples.to(device)
+        self.sample_index = self.sample_index.to(device)
+        self.labels = self.labels.to(device)
+        return self
 
 # ******************************************************************************************************************** #
 
+# collate_fn for Datasets whose __getitems__ already returns a full batch
+def batch_collate(batch):
+    return batch
+
+# ******************************************************************************************************************** #
+
+"""
+    - Tensor-native replacement for the DataLoader over a Dataset with a batched __getitems__ (eg: SiameseDS)
+    - The dataset tensors are moved to the device once; every epoch is one index permutation sliced into batches,
+      so there is no per sample Python, no collation and no host ---> device copy per batch
+"""
+class TensorLoader(object):
+    def __init__(self, dataset=None, batch_size=None, shuffle=False, generator=None, device=None):
+        """
+            dataset    : Dataset with __len__, __getitems__ and to(device)
+            batch_size : Batch Size
+            shuffle    : Flag that controls whether the indices are permuted every epoch
+            generator  : torch.Generator (CPU) used for the permutations
+            device     : Device on which the dataset is kept and the batches are produced
+        """
+        self.dataset = dataset.to(device)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = generator
+        self.device = device
+
+    def __len__(self):
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.shuffle:
+            indices = torch.randperm(len(self.dataset), generator=self.generator).to(self.device)
+        else:
+            indices = torch.arange(len(self.dataset), device=self.device)
+        for i in range(0, indices.shape[0], self.batch_size):
+            yield self.dataset.__getitems__(indices[i:i + self.batch_size])
+
+# ******************************************************************************************************************** #
@@ -0,0 +1,235 @@
+"""
+    Headless Batch Inspection of Image Folders and Video Files
+"""
+
+import os
+import sys
+import cv2
+import csv
+import queue
+import torch
+import threading
+from time import time
+
+import utils as u
+import Models
+
+# ******************************************************************************************************************** #
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+COLUMNS = ["source", "frame", "timestamp", "score", "x1", "y1", "x2", "y2", "verdict"]
+
+# ******************************************************************************************************************** #
+
+"""
+    - Decodes the frames of all the sources (image directories, image files and video files) on a background thread
+    - Items are (source, frame index, timestamp, frame); timestamp is the position in the video in seconds (None for images)
+    - The queue is bounded, so decoding runs at most maxsize frames ahead of inference
+"""
+class FrameSource(object):
+    def __init__(self, sources=None, maxsize=256):
+        """
+            sources : List of paths to image directories, image files or video files
+            maxsize : Number of decoded frames held in the queue
+        """
+        self.sources = sources
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self.__reader__, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def __reader__(self):
+        try:
+            for source in self.sources:
+                if os.path.isdir(source):
+                    for i, name in enumerate(sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))):
+                        self.queue.put((os.path.join(source, name), i, None, cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR)))
+                elif source.lower().endswith(IMAGE_EXTENSIONS):
+                    self.queue.put((source, 0, None, cv2.imread(source, cv2.IMREAD_COLOR)))
+                else:
+                    cap = cv2.VideoCapture(source)
+                    i = 0
+                    while cap.isOpened():
+                        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                        ret, frame = cap.read()
+                        if not ret:
+                            break
+                        self.queue.put((source, i, timestamp, frame))
+                        i += 1
+                    cap.release()
+        finally:
+            self.queue.put(None)
+
+    def batches(self, batch_size=None):
+        """
+            Yields lists of at most batch_size items until all the sources are exhausted
+        """
+        batch = []
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if item[3] is None:
+                continue
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+# ******************************************************************************************************************** #
+
+"""
+    - Streams the per frame results to a .csv file or, if the filename ends with .parquet, to a Parquet file (pyarrow)
+    - Rows are written batch by batch; nothing is accumulated in memory
+"""
+class ResultWriter(object):
+    def __init__(self, path=None):
+        self.path = path
+        self.parquet = path.lower().endswith(".parquet")
+        if self.parquet:
+            import pyarrow
+            import pyarrow.parquet
+
+            self.schema = pyarrow.schema([("source", pyarrow.string()), ("frame", pyarrow.int64()), ("timestamp", pyarrow.float64()),
+                                          ("score", pyarrow.float64()), ("x1", pyarrow.int64()), ("y1", pyarrow.int64()),
+                                          ("x2", pyarrow.int64()), ("y2", pyarrow.int64()), ("verdict", pyarrow.string())])
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.file = open(path, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        if self.parquet:
+            import pyarrow
+
+            self.writer.write_table(pyarrow.Table.from_pylist([dict(zip(COLUMNS, row)) for row in rows], schema=self.schema))
+        else:
+            self.writer.writerows(rows)
+
+    def close(self):
+        if self.parquet:
+            self.writer.close()
+        else:
+            self.file.close()
+
+# ******************************************************************************************************************** #
+
+# Decision of the system for a similarity score
+def verdict(y_pred):
+    if y_pred >= u.upper_bound_confidence:
+        return "Match"
+    elif u.lower_bound_confidence <= y_pred <= u.upper_bound_confidence:
+        return "Possible Match"
+    return "Defective"
+
+# ******************************************************************************************************************** #
+
+def inspect(sources=None, part_name=None, output=None, batch_size=64, boxes=True, ensemble=False):
+    """
+        sources    : List of paths to image directories, image files or video files
+        part_name  : Name of the part under inspection
+        output     : Path of the results file (.csv or .parquet)
+        batch_size : Number of frames processed together
+        boxes      : Flag that controls whether the RoI Extractor is run on the frames
+        ensemble   : Flag that controls whether the mean of the cross validation folds (Train.py --folds) is used
+    """
+    base_path = os.path.join(u.DATASET_PATH, part_name)
+
+    # Embeddings of all the anchors (Positive images) are computed once
+    if ensemble:
+        scorer = Models.build_fold_ensemble(part_name=part_name, fea_extractor=Models.fea_extractor, embed=u.embed_layer_size, aggregate=u.anchor_aggregate)
+        if scorer is None:
+            u.myprint("No cross validation folds found for [{}]".format(part_name), "red")
+            return
+    else:
+        # Load the model
+        model, _, _, _ = Models.build_siamese_model(embed=u.embed_layer_size)
+        model.load_state_dict(torch.load(os.path.join(os.path.join(base_path, "Checkpoints"), "State.pt"), map_location=u.DEVICE)["model_state_dict"])
+        model.eval()
+        model.to(u.DEVICE)
+
+        scorer = Models.build_anchor_scorer(part_name=part_name, model=model, fea_extractor=Models.fea_extractor, aggregate=u.anchor_aggregate)
+
+    source = FrameSource(sources).start()
+    writer = ResultWriter(output)
+
+    u.breaker()
+    u.myprint("Inspecting [{}] ...".format(part_name), "cyan")
+    u.breaker()
+
+    num_frames, start_time = 0, time()
+    try:
+        for batch in source.batches(batch_size):
+            # Apply CLAHE (2, 2) Preprocessing (As in RTApp)
+            frames = [u.clahe_equ(item[3]) for item in batch]
+
+            with torch.no_grad():
+                if boxes:
+                    coordinates = u.get_box_coordinates_batch(Models.roi_extractor, u.ROI_TRANSFORM, frames)
+                else:
+                    coordinates = [(None, None, None, None)] * len(frames)
+
+                X = torch.stack([u.FEA_TRANSFORM(u.preprocess(frame, change_color_space=False)) for frame in frames])
+                y_pred = scorer(u.normalize(Models.fea_extractor(X.to(u.DEVICE)))).cpu().numpy()
+
+            writer.write([(item[0], item[1], item[2], float(score), *box, verdict(score))
+                          for item, score, box in zip(batch, y_pred, coordinates)])
+
+            num_frames += len(batch)
+            print("\rFrames : {} | Throughput : {:.1f} Frames/sec".format(num_frames, num_frames / (time() - start_time)), end="")
+    finally:
+        writer.close()
+
+    print("")
+    u.breaker()
+    u.myprint("Frames : {} | Time Taken : {:.2f} seconds | Throughput : {:.1f} Frames/sec | Results : {}".format(
+              num_frames, time() - start_time, num_frames / max(time() - start_time, 1e-9), output), "green")
+    u.breaker()
+
+# ******************************************************************************************************************** #
+
+def main():
+    args_1 = "--part"
+    args_2 = "--out"
+    args_3 = "--batch-size"
+    args_4 = "--no-box"
+    args_5 = "--ensemble"
+
+    # CLI Argument Handling
+    argv = sys.argv[1:]
+    part_name, output, batch_size, boxes, ensemble = None, None, 64, True, False
+    if args_1 in argv:
+        part_name = argv[argv.index(args_1) + 1]
+        argv = argv[:argv.index(args_1)] + argv[argv.index(args_1) + 2:]
+    if args_2 in argv:
+        output = argv[argv.index(args_2) + 1]
+        argv = argv[:argv.index(args_2)] + argv[argv.index(args_2) + 2:]
+    if args_3 in argv:
+        batch_size = int(argv[argv.index(args_3) + 1])
+        argv = argv[:argv.index(args_3)] + argv[argv.index(args_3) + 2:]
+    if args_4 in argv:
+        boxes = False
+        argv.remove(args_4)
+    if args_5 in argv:
+        ensemble = True
+        argv.remove(args_5)
+
+    if part_name is None or len(argv) == 0:
+        u.myprint("Usage : python Inspect.py --part Part_Name [--out Results.csv] [--batch-size 64] [--no-box] [--ensemble] Sources ...", "red")
+        return 1
+    if output is None:
+        output = os.path.join(os.path.join(u.DATASET_PATH, part_name), "Inspection.csv")
+
+    inspect(sources=argv, part_name=part_name, output=output, batch_size=batch_size, boxes=boxes, ensemble=ensemble)
+
+# ******************************************************************************************************************** #
+
+if __name__ == "__main__":
+    sys.exit(main() or 0)
+
+# ******************************************************************************************************************** #
@@ -0,0 +1,110 @@
+"""
+    Background Jobs (Dataset Generation and Training off the tkinter main thread)
+"""
+
+import queue
+import threading
+import traceback
+
+# ******************************************************************************************************************** #
+
+# Raised inside a job (by Job.check) once cancellation has been requested
+class JobCancelled(Exception):
+    pass
+
+# ******************************************************************************************************************** #
+
+"""
+    - Runs target(job) on a worker thread
+    - The worker publishes progress dictionaries through job.report(); the GUI drains them with job.poll() from after()
+    - Cancellation is cooperative; long running loops call job.check() which raises JobCancelled
+"""
+class Job(object):
+    def __init__(self, target=None):
+        """
+            target : Callable that receives the job as its only argument
+        """
+        self.target = target
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.status = "Pending"
+        self.error = None
+
+    def start(self):
+        self.status = "Running"
+        self.thread = threading.Thread(target=self.__run__, daemon=True)
+        self.thread.start()
+        return self
+
+    def __run__(self):
+        try:
+            self.target(self)
+            self.status = "Done"
+        except JobCancelled:
+            self.status = "Cancelled"
+        except Exception as e:
+            traceback.print_exc()
+            self.error = e
+            self.status = "Failed"
+        self.report(status=self.status)
+
+    def report(self, **kwargs):
+        """
+            Publish a progress message (stage, samples, total, rate, epoch, train_loss, valid_loss, status)
+        """
+        self.messages.put(kwargs)
+
+    def poll(self):
+        """
+            Return all the messages published since the last call
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+# ******************************************************************************************************************** #
+
+"""
+    - Stand-in for a Job inside a worker process (Cross Validation folds)
+    - report() and cancellation go through a multiprocessing.Manager queue and event shared with the parent, which
+      forwards the messages to the real Job and sets the event when that Job is cancelled
+"""
+class ProcessJob(object):
+    def __init__(self, messages=None, cancel_event=None, **tags):
+        """
+            messages     : Manager().Queue() the progress messages are put on
+            cancel_event : Manager().Event() set by the parent to request cancellation
+            tags         : Added to every message (eg: fold=k)
+        """
+        self.messages = messages
+        self.cancel_event = cancel_event
+        self.tags = tags
+
+    def report(self, **kwargs):
+        self.messages.put(dict(kwargs, **self.tags))
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+# ******************************************************************************************************************** #
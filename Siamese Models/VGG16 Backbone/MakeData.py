@@ -7,12 +7,13 @@ import re
 import cv2
 import torch
 import imgaug
+import hashlib
 import numpy as np
-import random as r
+from time import time
 from imgaug import augmenters
 from torch.utils.data import DataLoader as DL
 
-from DatasetTemplates import FEDS
+from DatasetTemplates import AugmentDS
 import utils as u
 
 # ******************************************************************************************************************** #
@@ -47,7 +48,180 @@ def get_augments(augment_seed=None):
 
 # ******************************************************************************************************************** #
 
-def make_data(part_name=None, cls="Positive", num_samples=None, batch_size=48, fea_extractor=None, roi_extractor=None):
+"""
+    - Streaming writer for the Feature Vector Dataset
+    - Normalized feature batches are written straight into a preallocated, memory-mapped .npy file
+    - Peak memory is bounded by one batch regardless of the number of samples
+    - Data is written to a temporary file which replaces the final file only once it is complete
+"""
+class FeatureWriter(object):
+    def __init__(self, path=None, num_samples=None):
+        """
+            path        : Path of the .npy file
+            num_samples : Total number of feature vectors that will be written
+        """
+        self.path = path
+        self.tmp_path = path[:-len(".npy")] + ".tmp.npy"
+        self.array = np.lib.format.open_memmap(self.tmp_path, mode="w+", dtype=np.float32, shape=(num_samples, u.FEATURE_VECTOR_LENGTH))
+        self.index = 0
+
+    def write(self, features):
+        """
+            features : (B, 2048) torch.Tensor of (unnormalized) features
+        """
+        features = u.normalize(features).detach().cpu().numpy()
+        self.array[self.index:self.index + features.shape[0]] = features
+        self.index += features.shape[0]
+
+    def close(self):
+        self.array.flush()
+        del self.array
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        del self.array
+        os.remove(self.tmp_path)
+
+# ******************************************************************************************************************** #
+
+"""
+    - Per part, per class cache of the (unnormalized) features of augmented samples
+    - One .npy file per (image hash, augmentation seed, backbone id, batch size); row i holds the features of sample i
+    - Rows are only ever stored in whole batches, so the cache can be extended from the batch at which it ends
+"""
+class FeatureCache(object):
+    def __init__(self, path=None, backbone_id=None, batch_size=None):
+        """
+            path        : Directory holding the cache files
+            backbone_id : Identifier of the feature extractor
+            batch_size  : Batch Size used by feature extracting dataloader
+        """
+        self.path = path
+        self.backbone_id = backbone_id
+        self.batch_size = batch_size
+        self.used = set()
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def filename(self, image_hash, augment_seed):
+        self.used.add("{}_{}_{}_{}.npy".format(image_hash, augment_seed, self.backbone_id, self.batch_size))
+        return os.path.join(self.path, "{}_{}_{}_{}.npy".format(image_hash, augment_seed, self.backbone_id, self.batch_size))
+
+    def load(self, image_hash, augment_seed):
+        """
+            Returns the cached features as a read-only memory-mapped array ((0, 2048) if nothing is cached)
+        """
+        filename = self.filename(image_hash, augment_seed)
+        if not os.path.exists(filename):
+            return np.zeros((0, u.FEATURE_VECTOR_LENGTH), dtype=np.float32)
+        return np.load(filename, mmap_mode="r")
+
+    def open(self, image_hash, augment_seed, num_samples, cached):
+        """
+            Returns a writable memory-mapped array of num_samples rows with the cached rows already copied in
+        """
+        filename = self.filename(image_hash, augment_seed)
+        array = np.lib.format.open_memmap(filename[:-len(".npy")] + ".tmp.npy", mode="w+", dtype=np.float32, shape=(num_samples, u.FEATURE_VECTOR_LENGTH))
+        for i in range(0, cached.shape[0], self.batch_size):
+            array[i:i + self.batch_size] = cached[i:i + self.batch_size]
+        return array
+
+    def commit(self, image_hash, augment_seed):
+        """
+            Replace the cache file with the array returned by open(); the caller must flush and release that array first,
+            since a file that is still memory-mapped cannot be replaced on Windows
+        """
+        filename = self.filename(image_hash, augment_seed)
+        os.replace(filename[:-len(".npy")] + ".tmp.npy", filename)
+
+    def prune(self):
+        """
+            Remove the cache files that were not used since this object was created (Deleted/Replaced images)
+        """
+        for name in os.listdir(self.path):
+            if name not in self.used:
+                os.remove(os.path.join(self.path, name))
+
+# ******************************************************************************************************************** #
+
+# Hash of the image content; identifies an image in the Feature Cache independently of its filename
+def image_hash(image):
+    return hashlib.sha1(np.ascontiguousarray(image).tobytes() + repr(image.shape).encode()).hexdigest()[:16]
+
+# ******************************************************************************************************************** #
+
+# Augment all the images of a class in one set of dataloader workers and stream the features of the augmented samples
+# to the writer, image by image
+def extract_features(images=None, augments=None, augment_seeds=None, num_samples=None, writer=None, batch_size=48, num_workers=u.NUM_WORKERS, fea_extractor=None, progress=None, cache=None):
+    """
+        images        : Images to be augmented
+        augments      : imgaug augmentation pipeline of every image
+        augment_seeds : Base seed of the augmentation pipeline of every image (Per batch seeds are derived from it)
+        num_samples   : Number of augmented samples to generate per image
+        writer        : FeatureWriter to which the features are appended
+        batch_size    : Batch Size used by feature extracting dataloader
+        num_workers   : Number of augmentation worker processes (0 augments in the calling process)
+        fea_extractor : Feature Extraction Model
+        progress      : Callable that receives the number of samples written so far (Optional)
+        cache         : FeatureCache from which features are reused and to which new features are added (Optional)
+    """
+    keys = [image_hash(image) for image in images]
+
+    # Only whole batches are generated so that the cache can be extended later
+    num_batches = (num_samples + batch_size - 1) // batch_size
+
+    # First batch still to be generated for every image (num_batches if the cache holds all of its samples)
+    start_batches = []
+    for key, augment_seed in zip(keys, augment_seeds):
+        num_cached = cache.load(key, augment_seed).shape[0] if cache is not None else 0
+        start_batches.append(num_batches if num_cached >= num_samples else num_cached // batch_size)
+
+    # One dataloader (and one set of workers) for the batches of all the images
+    batches = [(k, b) for k in range(len(images)) for b in range(start_batches[k], num_batches)]
+    feature_data = None
+    if len(batches) > 0:
+        feature_data_setup = AugmentDS(images=images, augments=augments, augment_seeds=augment_seeds, num_samples=num_batches * batch_size,
+                                       batch_size=batch_size, transform=u.FEA_TRANSFORM, batches=batches)
+        feature_data = iter(DL(feature_data_setup, batch_size=None, shuffle=False, num_workers=num_workers, pin_memory=(u.DEVICE.type == "cuda")))
+
+    for k, (key, augment_seed) in enumerate(zip(keys, augment_seeds)):
+        cached = cache.load(key, augment_seed) if cache is not None else np.zeros((0, u.FEATURE_VECTOR_LENGTH), dtype=np.float32)
+
+        # Reuse the cached features
+        num_cached = min(cached.shape[0], num_samples)
+        for i in range(0, num_cached, batch_size):
+            writer.write(torch.from_numpy(np.array(cached[i:min(i + batch_size, num_cached)])))
+            if progress is not None:
+                progress(writer.index)
+        if start_batches[k] == num_batches:
+            del cached
+            continue
+
+        if cache is not None:
+            cache_array = cache.open(key, augment_seed, num_batches * batch_size, cached)
+        del cached
+
+        # Workers augment the next batches (of this and the following images) while the current batch goes through the feature extractor
+        for i in range(start_batches[k], num_batches):
+            X = next(feature_data).to(u.DEVICE, non_blocking=True)
+            with torch.no_grad():
+                output = fea_extractor(X)
+
+            if cache is not None:
+                cache_array[i * batch_size:(i + 1) * batch_size] = output.detach().cpu().numpy()
+            writer.write(output[:num_samples - i * batch_size])
+
+            if progress is not None:
+                progress(writer.index)
+
+        if cache is not None:
+            cache_array.flush()
+            del cache_array
+            cache.commit(key, augment_seed)
+
+# ******************************************************************************************************************** #
+
+def make_data(part_name=None, cls="Positive", num_samples=None, batch_size=48, fea_extractor=None, roi_extractor=None, job=None, num_workers=u.NUM_WORKERS, use_cache=True):
     """
         part_name     : Part name
         cls           : Class of the image (Either Negative or Positive)
@@ -55,125 +229,105 @@ def make_data(part_name=None, cls="Positive", num_samples=None, batch_size=48, f
         batch_size    : Batch Size used by feature extracting dataloader
         fea_extractor : Feature Extraction Model
         roi_extractor : RoI Extraction Model
+        job           : Jobs.Job used to report progress and handle cancellation (Optional)
+        num_workers   : Number of augmentation worker processes
+        use_cache     : Flag that controls whether features of previously seen images are reused (Feature Cache)
     """
 
     base_path = os.path.join(u.DATASET_PATH, part_name)
     cls_path = os.path.join(base_path, cls)
     if not os.path.exists(cls_path):
         os.makedirs(cls_path)
-    f_names = os.listdir(cls_path)
+    f_names = sorted(os.listdir(cls_path))
+
+    start_time = time()
 
-    r.seed(u.SEED)
+    # Report progress and stop if the job was cancelled
+    def report(done):
+        if job is not None:
+            job.report(stage=cls, samples=done, total=num_samples_per_image * len(f_names), rate=done / (time() - start_time))
+            job.check()
 
     """ 
         len(f_names) == 0 occurs during first run of the program when there are no images in the Negative directory.
         Extract ROI from the image, corrupt the ROI, put back the ROI into the image, This is the negative image used during the first run.
     """
-    if len(f_names) == 0 and re.match(r"Negative", cls, re.IGNORECASE):
-
+    first_run = len(f_names) == 0 and re.match(r"Negative", cls, re.IGNORECASE)
+    if first_run:
         # Point to the Positive Directory
-        f_names = os.listdir(os.path.join(base_path, "Positive"))
+        f_names = sorted(os.listdir(os.path.join(base_path, "Positive")))
 
-        # Calculate the number of samples needed for each image in the directory
-        num_samples_per_image = int(num_samples/len(f_names))
+    # Calculate the number of samples needed for each image in the directory
+    num_samples_per_image = int(num_samples/len(f_names))
 
-        # Preallocate memory to hold features for each image in the directory
-        mini_features = torch.zeros(num_samples_per_image, u.FEATURE_VECTOR_LENGTH).to(u.DEVICE)
-        features = torch.zeros(1, u.FEATURE_VECTOR_LENGTH).to(u.DEVICE)
-        for name in f_names:
+    # Normalized Feature Vectors are streamed into a memory-mapped numpy array
+    writer = FeatureWriter(os.path.join(base_path, "{}_Features.npy".format(cls)), num_samples_per_image * len(f_names))
 
-            # Get the augmentation pipeline
-            augment_seed = r.randint(0, 99)
-            dataset_augment, roi_augment = get_augments(augment_seed)
+    # Features of images that were already augmented and extracted during a previous run are read from disk
+    cache = None
+    if use_cache:
+        cache = FeatureCache(os.path.join(os.path.join(base_path, "Cache"), cls),
+                             backbone_id=getattr(fea_extractor, "backbone_id", type(fea_extractor).__name__), batch_size=batch_size)
+    try:
+        images, augments, augment_seeds = [], [], []
+        for name in f_names:
 
             # Read the image
-            image = u.preprocess(cv2.imread(os.path.join(os.path.join(base_path, "Positive"), name), cv2.IMREAD_COLOR))
-
-            # Obtain bounding box coordinates of the object
-            x1, y1, x2, y2 = u.get_box_coordinates_make_data(roi_extractor, u.ROI_TRANSFORM, image)
-
-            # # Assertion in case x1 is not a numeric value
-            # assert(x1 is not None)
-
-            # In case detector cannot detect any object, consider the full image
-            if x1 is None:
-                x1, y1 = 0, 0
-                x2, y2 = u.SIZE, u.SIZE
-
-            # In case bounding box detected is smaller than imgaug threshold
-            if abs(x1 - x2) < 32:
-                x2 = x1 + 32
-            if abs(y1 - y2) < 32:
-                y2 = y1 + 32
-
-            # Extract ROI
-            crp_img = image[y1:y2, x1:x2]
-
-            # Augment the ROI using the roi_augment pipeline
-            crp_img = roi_augment(images=np.expand_dims(crp_img, axis=0))
-
-            # Put back the RoI into the image
-            image[y1:y2, x1:x2] = crp_img.squeeze()
-
-            # Augment the entire dataset using the dataset_augment pipeline
-            images = np.array(dataset_augment(images=[image for _ in range(num_samples_per_image)]))
-
-            # Setup the feature extraction dataloader
-            feature_data_setup = FEDS(X=images, transform=u.FEA_TRANSFORM)
-            feature_data = DL(feature_data_setup, batch_size=batch_size, shuffle=False)
-
-            # Extract Features
-            for i, X in enumerate(feature_data):
-                X = X.to(u.DEVICE)
-                with torch.no_grad():
-                    output = fea_extractor(X)
-                mini_features[i * batch_size: (i * batch_size) + output.shape[0], :] = output
-            
-            features = torch.cat((features, mini_features), dim=0)
-
-        # Save the normalized Feature Vectors as numpy arrays
-        np.save(os.path.join(base_path, "{}_Features.npy".format(cls)), u.normalize(features[1:]).detach().cpu().numpy())
-        
-        # Clean up CUDA device
-        del output, features, fea_extractor, roi_extractor
-        torch.cuda.empty_cache()
-    else:
-        # Calculate the number of samples needed for each image in the directory
-        num_samples_per_image = int(num_samples/len(f_names))
-
-        # Preallocate memory to hold features for each image in the directory
-        mini_features = torch.zeros(num_samples_per_image, u.FEATURE_VECTOR_LENGTH).to(u.DEVICE)
-        features = torch.zeros(1, u.FEATURE_VECTOR_LENGTH).to(u.DEVICE)
-        for name in f_names:
+            if first_run:
+                image = u.preprocess(cv2.imread(os.path.join(os.path.join(base_path, "Positive"), name), cv2.IMREAD_COLOR))
+            else:
+                image = u.preprocess(cv2.imread(os.path.join(cls_path, name), cv2.IMREAD_COLOR))
 
-             # Get the augmentation pipeline
-            augment_seed = r.randint(0, 99)
-            dataset_augment, _ = get_augments(augment_seed)
+            # Get the augmentation pipeline; the seed depends only on the image content (stable when images are added)
+            augment_seed = int(image_hash(image), 16) % 100
+            dataset_augment, roi_augment = get_augments(augment_seed)
 
-            # Read the image
-            image = u.preprocess(cv2.imread(os.path.join(cls_path, name), cv2.IMREAD_COLOR))
-
-            # Augment the entire dataset using the dataset_augment pipeline
-            images = np.array(dataset_augment(images=[image for _ in range(num_samples_per_image)]))
-
-            # Setup the feature extraction dataloader
-            feature_data_setup = FEDS(X=images, transform=u.FEA_TRANSFORM)
-            feature_data = DL(feature_data_setup, batch_size=batch_size, shuffle=False)
-
-            # Extract Features
-            for i, X in enumerate(feature_data):
-                X = X.to(u.DEVICE)
-                with torch.no_grad():
-                    output = fea_extractor(X)
-                mini_features[i * batch_size: (i * batch_size) + output.shape[0], :] = output
-            
-            features = torch.cat((features, mini_features), dim=0)
-        
-        # Save the normalized Feature Vectors as numpy arrays
-        np.save(os.path.join(base_path, "{}_Features.npy".format(cls)), u.normalize(features[1:]).detach().cpu().numpy())
-
-        # Clean up CUDA device
-        del output, features, mini_features, fea_extractor
-        torch.cuda.empty_cache()
+            if first_run:
+                # Obtain bounding box coordinates of the object
+                x1, y1, x2, y2 = u.get_box_coordinates_make_data(roi_extractor, u.ROI_TRANSFORM, image)
+
+                # # Assertion in case x1 is not a numeric value
+                # assert(x1 is not None)
+
+                # In case detector cannot detect any object, consider the full image
+                if x1 is None:
+                    x1, y1 = 0, 0
+                    x2, y2 = u.SIZE, u.SIZE
+
+                # In case bounding box detected is smaller than imgaug threshold
+                if abs(x1 - x2) < 32:
+                    x2 = x1 + 32
+                if abs(y1 - y2) < 32:
+                    y2 = y1 + 32
+
+                # Extract ROI
+                crp_img = image[y1:y2, x1:x2]
+
+                # Augment the ROI using the roi_augment pipeline
+                crp_img = roi_augment(images=np.expand_dims(crp_img, axis=0))
+
+                # Put back the RoI into the image
+                image[y1:y2, x1:x2] = crp_img.squeeze()
+
+            images.append(image)
+            augments.append(dataset_augment)
+            augment_seeds.append(augment_seed)
+
+        # Augment the images using their dataset_augment pipelines (in one set of dataloader workers) and Extract Features
+        extract_features(images=images, augments=augments, augment_seeds=augment_seeds, num_samples=num_samples_per_image,
+                         writer=writer, batch_size=batch_size, num_workers=num_workers, fea_extractor=fea_extractor,
+                         progress=report, cache=cache)
+    except BaseException:
+        writer.discard()
+        raise
+
+    # Save the normalized Feature Vectors; drop cached features of images that no longer exist
+    writer.close()
+    if cache is not None:
+        cache.prune()
+
+    # Clean up CUDA device
+    del fea_extractor, roi_extractor
+    torch.cuda.empty_cache()
 
 # ******************************************************************************************************************** #
@@ -2,7 +2,11 @@
     Models Used
 """
 
+import os
+import cv2
+import copy
 import torch
+import threading
 from torchvision import models
 from torch import nn, optim
 import utils as u
@@ -11,9 +15,11 @@ import utils as u
 
 # Region-of-Interest Extractor (Object Detector)
 class RoIExtractor(nn.Module):
-    def __init__(self):
+    architecture = "fasterrcnn_mobilenet_v3_large_320_fpn"
+
+    def __init__(self, pretrained=True):
         super(RoIExtractor, self).__init__()
-        self.model = models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(pretrained=True, progress=True)
+        self.model = models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(pretrained=pretrained, progress=True, pretrained_backbone=pretrained)
 
     def forward(self, x):
         return self.model(x)
@@ -22,16 +28,51 @@ class RoIExtractor(nn.Module):
 
 # VGG16 Model; Slice out the final 2 blocks and Average Pool the 512x7x7 features down to 512x2x2 and then Flatten
 class FeatureExtractor(nn.Module):
-    def __init__(self):
+    architecture = "vgg16_bn-avgpool2x2"
+
+    def __init__(self, pretrained=True):
         super(FeatureExtractor, self).__init__()
         
-        self.model = models.vgg16_bn(pretrained=True, progress=True)
+        self.model = models.vgg16_bn(pretrained=pretrained, progress=True)
         self.model = nn.Sequential(*[*self.model.children()][:-2])
         self.model.add_module("Adaptive Avg Pool", nn.AdaptiveAvgPool2d(output_size=(2, 2)))
         self.model.add_module("Flatten", nn.Flatten())
 
+        self.set_engine()
+
+    # Opt-in Inference Engine (bf16 autocast, channels_last memory format, torch.inference_mode, torch.compile)
+    def set_engine(self, precision="fp32", channels_last=False, compile=False):
+        """
+            precision     : "fp32" or "bf16" (autocast)
+            channels_last : Flag that controls whether the model and inputs use the NHWC memory format
+            compile       : Flag that controls whether the model is compiled with torch.compile
+        """
+        self.precision = precision
+        self.channels_last = channels_last
+        self.engine = (precision != "fp32") or channels_last or compile
+
+        self.model.to(memory_format=torch.channels_last if channels_last else torch.contiguous_format)
+
+        # Kept out of the module tree so that the state_dict is unchanged (the compiled model shares its weights)
+        object.__setattr__(self, "runner", torch.compile(self.model) if compile else self.model)
+        return self
+
+    # Identifies the features produced by this model (Part of the Feature Cache key)
+    @property
+    def backbone_id(self):
+        return self.architecture if self.precision == "fp32" else self.architecture + "-" + self.precision
+
     def forward(self, x):
-        return self.model(x)
+        if not self.engine:
+            return self.model(x)
+
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode(), torch.autocast(device_type=x.device.type, dtype=torch.bfloat16, enabled=(self.precision == "bf16")):
+            features = self.runner(x)
+
+        # Copy back to fp32 outside inference mode so that callers can still modify the features in-place (u.normalize)
+        return features.to(dtype=torch.float32, copy=True)
 
 # ******************************************************************************************************************** #
 
@@ -74,13 +115,196 @@ class SiameseNetwork(nn.Module):
 
 # ******************************************************************************************************************** #
 
-roi_extractor = RoIExtractor()
-roi_extractor.to(u.DEVICE)
-roi_extractor.eval()
+"""
+    - Realtime scorer of a trained Siamese Network against all the anchors of a part
+    - Anchor embeddings are computed once; every frame is embedded once and compared against all the anchors in a
+      single batched abs-diff + classifier pass
+    - The per anchor similarities are aggregated with max (closest anchor) or mean
+"""
+class AnchorScorer(object):
+    def __init__(self, model=None, anchors=None, aggregate="max"):
+        """
+            model     : Trained Siamese Network (in eval mode)
+            anchors   : (A, 2048) normalized features of the anchor images
+            aggregate : "max" or "mean"; how the per anchor similarities are combined
+        """
+        self.model = model
+        self.aggregate = aggregate
+        self.embeddings = torch.zeros(0, model.embedder.FC.out_features, device=u.DEVICE)
+        if anchors is not None:
+            self.add_anchors(anchors)
+
+    def add_anchors(self, anchors):
+        """
+            anchors : (A, 2048) normalized features of the anchor images to be appended
+        """
+        with torch.no_grad():
+            embeddings = self.model.embedder(torch.as_tensor(anchors, dtype=torch.float32, device=u.DEVICE).view(-1, self.model.embedder.FC.in_features))
+        self.embeddings = torch.cat((self.embeddings, embeddings), dim=0)
+
+    def __call__(self, features):
+        """
+            features : (N, 2048) normalized features; returns (N, ) similarity probabilities
+        """
+        with torch.no_grad():
+            embeddings = self.model.embedder(features)
+            N, A, E = embeddings.shape[0], self.embeddings.shape[0], self.embeddings.shape[1]
+
+            # (N, 1, E) - (1, A, E) ---> (N * A, E) pairs ---> (N, A) similarities
+            diff = torch.abs(embeddings.unsqueeze(dim=1) - self.embeddings.unsqueeze(dim=0)).view(N * A, E)
+            y_pred = torch.sigmoid(self.model.classifier(diff)).view(N, A)
+        if self.aggregate == "mean":
+            return y_pred.mean(dim=1)
+        return y_pred.amax(dim=1)
+
+# ******************************************************************************************************************** #
+
+"""
+    - Realtime scorer of the Siamese Networks of several parts against the same frame features
+    - The heads (same architecture) are stacked with torch.func.stack_module_state and run with vmap, so every frame
+      costs one feature extraction and one batched pass over all parts and all their anchors
+    - Anchors are padded to the largest anchor count; padded anchors are masked out of the aggregation
+    - __call__ returns the similarity of the best matching part; its index is kept in self.best
+    - With combine="mean" the heads are the cross validation folds of one part (build_fold_ensemble) and __call__
+      returns their mean similarity
+"""
+class MultiPartScorer(object):
+    def __init__(self, part_names=None, models=None, anchors=None, aggregate="max", combine="best"):
+        """
+            part_names : Names of the parts
+            models     : Trained Siamese Networks (in eval mode), one per part
+            anchors    : List of (A_p, E) anchor embeddings (AnchorScorer.embeddings), one per part
+            aggregate  : "max" or "mean"; how the per anchor similarities are combined
+            combine    : "best" (best matching part) or "mean" (ensemble); how the per part similarities are combined
+        """
+        from torch.func import stack_module_state, functional_call, vmap
+
+        self.part_names = part_names
+        self.aggregate = aggregate
+        self.combine = combine
+        self.best = None
+
+        # (P, A, E) padded anchor embeddings and (P, A) mask of the valid anchors
+        P, A, E = len(anchors), max(anchor.shape[0] for anchor in anchors), anchors[0].shape[1]
+        self.anchors = torch.zeros(P, A, E, device=u.DEVICE)
+        self.mask = torch.zeros(P, A, dtype=torch.bool, device=u.DEVICE)
+        for i, anchor in enumerate(anchors):
+            self.anchors[i, :anchor.shape[0]] = anchor
+            self.mask[i, :anchor.shape[0]] = True
+
+        params, buffers = stack_module_state(models)
+        self.embedder_state = ({k[len("embedder."):]: v for k, v in params.items() if k.startswith("embedder.")},
+                               {k[len("embedder."):]: v for k, v in buffers.items() if k.startswith("embedder.")})
+        self.classifier_state = ({k[len("classifier."):]: v for k, v in params.items() if k.startswith("classifier.")},
+                                 {k[len("classifier."):]: v for k, v in buffers.items() if k.startswith("classifier.")})
+
+        # Stateless copy of one head; the stacked parameters are passed in at call time
+        base = copy.deepcopy(models[0]).to("meta")
+
+        def head(embedder_state, classifier_state, features, anchors):
+            embeddings = functional_call(base.embedder, embedder_state, (features, ))
+            N, A, E = embeddings.shape[0], anchors.shape[0], anchors.shape[1]
+            diff = torch.abs(embeddings.unsqueeze(dim=1) - anchors.unsqueeze(dim=0)).view(N * A, E)
+            return functional_call(base.classifier, classifier_state, (diff, )).view(N, A)
+
+        self.heads = vmap(head, in_dims=(0, 0, None, 0))
+
+    def __call__(self, features):
+        """
+            features : (N, 2048) normalized features; returns (N, ) similarity probabilities of the best matching part
+        """
+        with torch.no_grad():
+            # (P, N, A) similarities of every frame against every anchor of every part
+            y_pred = torch.sigmoid(self.heads(self.embedder_state, self.classifier_state, features, self.anchors))
+            mask = self.mask.unsqueeze(dim=1)
+            if self.aggregate == "mean":
+                y_pred = (y_pred * mask).sum(dim=2) / mask.sum(dim=2)
+            else:
+                y_pred = y_pred.masked_fill(~mask, -1).amax(dim=2)
+
+            if self.combine == "mean":
+                return y_pred.mean(dim=0)
+            y_pred, self.best = y_pred.max(dim=0)
+        return y_pred
+
+# ******************************************************************************************************************** #
+
+"""
+    - Process-wide registry of the pretrained backbones; nothing is built when this module is imported
+    - A backbone is built on first use and cached per (architecture, device); the Feature Extractor is also keyed on its
+      engine settings (precision, channels_last, compile), so callers that ask for different settings get different
+      instances. set_engine() on a registry instance changes it for every caller that shares it
+    - The pretrained weights are saved once to u.WEIGHTS_PATH and then loaded memory-mapped (torch >= 2.1), so later
+      processes neither re-download nor re-deserialize them
+    - Models.roi_extractor and Models.fea_extractor resolve through the registry (Module level __getattr__)
+"""
+BACKBONES = {
+    RoIExtractor.architecture     : RoIExtractor,
+    FeatureExtractor.architecture : FeatureExtractor,
+}
+
+registry = dict()
+registry_lock = threading.Lock()
 
-fea_extractor = FeatureExtractor()
-fea_extractor.to(u.DEVICE)
-fea_extractor.eval()
+
+# Load a saved state_dict into the model; the parameters are backed by the memory-mapped file where supported
+def load_weights(model=None, path=None):
+    try:
+        model.load_state_dict(torch.load(path, map_location="cpu", mmap=True, weights_only=True), assign=True)
+    except TypeError:
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+    return model
+
+
+# Build a backbone from the local weights file (Created from the torchvision pretrained weights on first use)
+def build_backbone(architecture=None, device=None, precision=None, channels_last=False, compile=False):
+    path = os.path.join(u.WEIGHTS_PATH, "{}.pt".format(architecture))
+    if os.path.exists(path):
+        model = load_weights(BACKBONES[architecture](pretrained=False), path)
+    else:
+        model = BACKBONES[architecture](pretrained=True)
+        if not os.path.exists(u.WEIGHTS_PATH):
+            os.makedirs(u.WEIGHTS_PATH)
+        torch.save(model.state_dict(), path[:-len(".pt")] + ".tmp.pt")
+        os.replace(path[:-len(".pt")] + ".tmp.pt", path)
+
+    if isinstance(model, FeatureExtractor):
+        model.set_engine(precision=precision, channels_last=channels_last, compile=compile)
+    model.to(device)
+    model.eval()
+    return model
+
+
+# Get a backbone from the registry; built on first use
+def get_model(architecture=None, device=None, precision=None, channels_last=None, compile=None):
+    """
+        architecture  : Key of BACKBONES
+        device        : Device on which the model runs (Default: u.DEVICE)
+        precision     : Precision of the Feature Extractor (Default: u.precision)
+        channels_last : Memory format of the Feature Extractor (Default: u.channels_last)
+        compile       : Flag that controls whether the Feature Extractor uses torch.compile (Default: u.compile_model)
+    """
+    device = u.DEVICE if device is None else device
+    precision = u.precision if precision is None else precision
+    channels_last = u.channels_last if channels_last is None else channels_last
+    compile = u.compile_model if compile is None else compile
+
+    # Only the Feature Extractor depends on the engine settings; other backbones are shared across them
+    key = (architecture, str(device))
+    if architecture == FeatureExtractor.architecture:
+        key += (precision, channels_last, compile)
+    with registry_lock:
+        if key not in registry:
+            registry[key] = build_backbone(architecture, device, precision, channels_last, compile)
+        return registry[key]
+
+
+def __getattr__(name):
+    if name == "roi_extractor":
+        return get_model(RoIExtractor.architecture)
+    if name == "fea_extractor":
+        return get_model(FeatureExtractor.architecture)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 # ******************************************************************************************************************** #
 
@@ -99,3 +323,82 @@ def build_siamese_model(embed=None):
     return model, batch_size, lr, wd
 
 # ******************************************************************************************************************** #
+
+# Setup the Anchor Scorer of a part; every image in the Positive directory (Snapshot_N.png, Extra_N.png) is an anchor
+def build_anchor_scorer(part_name=None, model=None, fea_extractor=None, aggregate="max", batch_size=48):
+    """
+        part_name     : Part name
+        model         : Trained Siamese Network (in eval mode)
+        fea_extractor : Feature Extraction Model
+        aggregate     : "max" or "mean"; how the per anchor similarities are combined
+        batch_size    : Number of anchor images passed through the feature extractor at once
+    """
+    path = os.path.join(os.path.join(u.DATASET_PATH, part_name), "Positive")
+    names = sorted([name for name in os.listdir(path) if name[-3:] == "png"])
+
+    scorer = AnchorScorer(model=model, aggregate=aggregate)
+    for i in range(0, len(names), batch_size):
+        images = [u.preprocess(cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR)) for name in names[i:i + batch_size]]
+        with torch.no_grad():
+            features = u.normalize(fea_extractor(torch.stack([u.FEA_TRANSFORM(image) for image in images]).to(u.DEVICE)))
+        scorer.add_anchors(features)
+    return scorer
+
+# ******************************************************************************************************************** #
+
+# Setup the Multi-Part Scorer over every part under u.DATASET_PATH that has a trained model (Checkpoints/State.pt)
+def build_multi_part_scorer(fea_extractor=None, embed=None, aggregate="max"):
+    """
+        fea_extractor : Feature Extraction Model
+        embed         : Size of the Embeddings of the trained models
+        aggregate     : "max" or "mean"; how the per anchor similarities are combined
+    """
+    part_names, models, anchors = [], [], []
+    for part_name in sorted(os.listdir(u.DATASET_PATH)):
+        path = os.path.join(os.path.join(os.path.join(u.DATASET_PATH, part_name), "Checkpoints"), "State.pt")
+        if not os.path.exists(path):
+            continue
+
+        model, _, _, _ = build_siamese_model(embed=embed)
+        model.load_state_dict(torch.load(path, map_location=u.DEVICE)["model_state_dict"])
+        model.eval()
+        model.to(u.DEVICE)
+
+        part_names.append(part_name)
+        models.append(model)
+        anchors.append(build_anchor_scorer(part_name=part_name, model=model, fea_extractor=fea_extractor).embeddings)
+
+    if len(models) == 0:
+        return None
+    return MultiPartScorer(part_names=part_names, models=models, anchors=anchors, aggregate=aggregate)
+
+# ******************************************************************************************************************** #
+
+# Setup the ensemble of the cross validation folds of a part (Checkpoints/Fold_k/State.pt, written by Train.cross_validate)
+def build_fold_ensemble(part_name=None, fea_extractor=None, embed=None, aggregate="max"):
+    """
+        part_name     : Part name
+        fea_extractor : Feature Extraction Model
+        embed         : Size of the Embeddings of the trained models
+        aggregate     : "max" or "mean"; how the per anchor similarities are combined
+    """
+    path = os.path.join(os.path.join(u.DATASET_PATH, part_name), "Checkpoints")
+    fold_names, models, anchors = [], [], []
+    for fold_name in sorted(name for name in os.listdir(path) if name.startswith("Fold_")):
+        if not os.path.exists(os.path.join(os.path.join(path, fold_name), "State.pt")):
+            continue
+
+        model, _, _, _ = build_siamese_model(embed=embed)
+        model.load_state_dict(torch.load(os.path.join(os.path.join(path, fold_name), "State.pt"), map_location=u.DEVICE)["model_state_dict"])
+        model.eval()
+        model.to(u.DEVICE)
+
+        fold_names.append(fold_name)
+        models.append(model)
+        anchors.append(build_anchor_scorer(part_name=part_name, model=model, fea_extractor=fea_extractor).embeddings)
+
+    if len(models) == 0:
+        return None
+    return MultiPartScorer(part_names=fold_names, models=models, anchors=anchors, aggregate=aggregate, combine="mean")
+
+# ******************************************************************************************************************** #
@@ -3,18 +3,19 @@
 """
 
 import os
-import platform
 import cv2
 import torch
 import numpy as np
 
 import utils as u
 import Models
+from Capture import FrameReader
+from Tracking import BoxTracker
 
 # ******************************************************************************************************************** #
 
 # Inference Helper
-def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=None, fea_extractor=None, roi_extractor=None):
+def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=None, fea_extractor=None, roi_extractor=None, tracker=None, scorer=None):
     """
         frame         : Current frame being processed
         anchor        : Anchor Image
@@ -23,6 +24,8 @@ def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=
         pt1           : Start Point of the Reference Bounding Box
         pt2           : End Point of the Reference Bounding Box
         fea_extractor : Feature Extraction Model
+        tracker       : Tracking.BoxTracker used to obtain the bounding box (Detector runs on every frame if None)
+        scorer        : Models.AnchorScorer comparing the frame against all anchors of the part (Optional)
     """
     disp_frame = frame.copy()
 
@@ -30,18 +33,22 @@ def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=
     if anchor is not None:
         disp_frame = u.alpha_blend(anchor, disp_frame, 0.15)
 
-    # Resize + Center Crop (256x256 ---> 224x224)
-    frame = u.preprocess(frame, change_color_space=False)
-
     ########## Dynamic Bounding Box during Inference ##########
     # Obtain the bounding box coordinates
-    x1, y1, x2, y2 = u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, disp_frame)
+    if tracker is not None:
+        x1, y1, x2, y2 = tracker(disp_frame)
+    else:
+        x1, y1, x2, y2 = u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, disp_frame)
     ############################################################ 
 
     # Perform Inference on current frame
     with torch.no_grad():
-        features = u.normalize(fea_extractor(u.FEA_TRANSFORM(frame).to(u.DEVICE).unsqueeze(dim=0)))
-        y_pred = torch.sigmoid(model(features))[0][0].item()
+        # Resize + Center Crop (256x256 ---> 224x224) + ToTensor + Normalize in one fused stage
+        features = u.normalize(fea_extractor(u.FRAME_TRANSFORM(frame).to(u.DEVICE)))
+        if scorer is not None:
+            y_pred = scorer(features)[0].item()
+        else:
+            y_pred = torch.sigmoid(model(features))[0][0].item()
 
     # Prediction > Upper Bound                 -----> Match
     # Lower Bound <= Prediction <= Upper Bound -----> Possible Match
@@ -121,6 +128,15 @@ def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=
 
 # ******************************************************************************************************************** #
 
+# Display the age of the frame (in ms) on which the decision was made
+def show_latency(disp_frame=None, frame_age=None):
+    cv2.putText(img=disp_frame, text="Latency, {:.1f} ms".format(frame_age * 1000), org=(25, 110),
+                fontScale=0.6, fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                color=u.CLI_ORANGE, thickness=1)
+    return disp_frame
+
+# ******************************************************************************************************************** #
+
 # Realtime Inference
 def realtime(device_id=None, part_name=None, model=None, save=False, show_prob=False):
     """
@@ -142,14 +158,11 @@ def realtime(device_id=None, part_name=None, model=None, save=False, show_prob=F
     model.eval()
     model.to(u.DEVICE)
 
-    # Initialize the capture object
-    if platform.system() != "Windows":
-        cap = cv2.VideoCapture(device_id)
-    else:
-        cap = cv2.VideoCapture(device_id, cv2.CAP_DSHOW)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, u.CAM_HEIGHT)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, u.CAM_WIDTH)
-    cap.set(cv2.CAP_PROP_FPS, u.FPS)
+    # Embeddings of all the anchors (Positive images) are computed once
+    scorer = Models.build_anchor_scorer(part_name=part_name, model=model, fea_extractor=Models.fea_extractor, aggregate=u.anchor_aggregate)
+
+    # Initialize the capture object; frames are read on a background thread and only the newest one is kept
+    cap = FrameReader(device_id, width=u.CAM_WIDTH, height=u.CAM_HEIGHT, fps=u.FPS, drop=True).start()
 
     # Save a video file if flag is set
     if save:
@@ -165,10 +178,15 @@ def realtime(device_id=None, part_name=None, model=None, save=False, show_prob=F
     countp, countn = len(os.listdir(os.path.join(base_path, "Positive"))), len(os.listdir(os.path.join(base_path, "Negative"))) + 1
     if countn == 0:
         countn = 1
+
+    # Bounding box source; the detector runs every u.detect_every frames and the box is tracked in between
+    tracker = BoxTracker(roi_extractor=Models.roi_extractor, detect_every=u.detect_every)
     
     # Read data from capture object
     while cap.isOpened():
-        _, frame = cap.read()
+        ret, frame = cap.read()
+        if not ret:
+            break
 
         # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
         frame = u.clahe_equ(frame)
@@ -176,7 +194,11 @@ def realtime(device_id=None, part_name=None, model=None, save=False, show_prob=F
         # Perform Inference
         disp_frame = __help__(frame=frame, model=model, 
                               fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor,
-                              show_prob=show_prob, pt1=(data[0], data[1]), pt2=(data[2], data[3]))
+                              show_prob=show_prob, pt1=(data[0], data[1]), pt2=(data[2], data[3]), tracker=tracker, scorer=scorer)
+
+        # Latency is the age of the frame at decision time
+        if show_prob:
+            show_latency(disp_frame, cap.frame_age())
         
         # ********************************************************************* #
 
@@ -184,6 +206,7 @@ def realtime(device_id=None, part_name=None, model=None, save=False, show_prob=F
         if cv2.waitKey(u.DELAY) == ord("p"):
             print("")
             cv2.imwrite(os.path.join(os.path.join(base_path, "Positive"), "Extra_{}.png".format(countp)), frame)
+            scorer.add_anchors(u.get_single_image_features(Models.fea_extractor, u.FEA_TRANSFORM, u.preprocess(frame)))
             print("Captured Snapshot - {} and save to Positive Directory".format(countp))
             countp += 1
         
@@ -213,6 +236,70 @@ def realtime(device_id=None, part_name=None, model=None, save=False, show_prob=F
 
 # ******************************************************************************************************************** #
 
+# Realtime Inference over all the trained parts; reports the best matching part and its decision
+def realtime_multi(device_id=None, save=False, show_prob=False):
+    """
+        device_id : Device ID of the capture object
+        save      : Flag to control whether to save inference to a video file
+        show_prob : Flag to control whether to display the similarity score
+    """
+    # Stack the models of all the trained parts; embeddings of all their anchors are computed once
+    scorer = Models.build_multi_part_scorer(fea_extractor=Models.fea_extractor, embed=u.embed_layer_size, aggregate=u.anchor_aggregate)
+    if scorer is None:
+        u.myprint("\nNo trained parts found in {}".format(u.DATASET_PATH), "red")
+        return
+    u.myprint("\nParts : {}".format(", ".join(scorer.part_names)), "green")
+
+    # Initialize the capture object; frames are read on a background thread and only the newest one is kept
+    cap = FrameReader(device_id, width=u.CAM_WIDTH, height=u.CAM_HEIGHT, fps=u.FPS, drop=True).start()
+
+    # Save a video file if flag is set
+    if save:
+        filename = os.path.join(u.DATASET_PATH, "Multi-Part.mp4")
+        codec = cv2.VideoWriter_fourcc(*"mp4v")
+        out = cv2.VideoWriter(filename, codec, 30.01, (u.CAM_WIDTH, u.CAM_HEIGHT))
+
+    # Bounding box source; the detector runs every u.detect_every frames and the box is tracked in between
+    tracker = BoxTracker(roi_extractor=Models.roi_extractor, detect_every=u.detect_every)
+
+    # Read data from capture object
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
+        frame = u.clahe_equ(frame)
+
+        # Perform Inference; one feature extraction and one stacked pass over all the parts
+        disp_frame = __help__(frame=frame, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor,
+                              show_prob=show_prob, tracker=tracker, scorer=scorer)
+
+        # Best matching part
+        cv2.putText(img=disp_frame, text=scorer.part_names[scorer.best[0].item()], org=(25, 40),
+                    fontScale=1, fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                    color=u.CLI_ORANGE, thickness=2)
+
+        # Latency is the age of the frame at decision time
+        if show_prob:
+            show_latency(disp_frame, cap.frame_age())
+
+        if save:
+            out.write(disp_frame)
+
+        # Display the frame
+        cv2.imshow("Feed", disp_frame)
+
+        # Press 'q' to Quit
+        if cv2.waitKey(u.DELAY) == ord("q"):
+            break
+
+    # Release capture object and destory all windows
+    cap.release()
+    cv2.destroyAllWindows()
+
+# ******************************************************************************************************************** #
+
 # Inference performed on video file
 def video(filename=None, part_name=None, model=None, save=False, show_prob=True):
     """
@@ -234,8 +321,13 @@ def video(filename=None, part_name=None, model=None, save=False, show_prob=True)
     model.eval()
     model.to(u.DEVICE)
 
-    # Initialize the capture object
-    cap = cv2.VideoCapture(os.path.join(os.path.join(base_path, "Video"), "FILENAME.mp4"))
+    # Embeddings of all the anchors (Positive images) are computed once
+    scorer = Models.build_anchor_scorer(part_name=part_name, model=model, fea_extractor=Models.fea_extractor, aggregate=u.anchor_aggregate)
+
+    # Initialize the capture object; frames are decoded on a background thread, none are dropped
+    if filename is None:
+        filename = os.path.join(os.path.join(base_path, "Video"), "FILENAME.mp4")
+    cap = FrameReader(filename, maxlen=8, drop=False, loop=True).start()
 
     # Save a video file if flag is set
     if save:
@@ -252,6 +344,9 @@ def video(filename=None, part_name=None, model=None, save=False, show_prob=True)
     if countn == 0:
         countn = 1
 
+    # Bounding box source; the detector runs every u.detect_every frames and the box is tracked in between
+    tracker = BoxTracker(roi_extractor=Models.roi_extractor, detect_every=u.detect_every)
+
     # Read data from capture object
     while cap.isOpened():
         ret, frame = cap.read()
@@ -263,7 +358,11 @@ def video(filename=None, part_name=None, model=None, save=False, show_prob=True)
             # Perform Inference
             disp_frame = __help__(frame=frame, model=model, roi_extractor=Models.roi_extractor,
                                   fea_extractor=Models.fea_extractor, show_prob=show_prob, 
-                                  pt1=(data[0], data[1]), pt2=(data[2], data[3]))
+                                  pt1=(data[0], data[1]), pt2=(data[2], data[3]), tracker=tracker, scorer=scorer)
+
+            # Latency is the age of the frame at decision time
+            if show_prob:
+                show_latency(disp_frame, cap.frame_age())
             
             # ********************************************************************* #
 
@@ -271,6 +370,7 @@ def video(filename=None, part_name=None, model=None, save=False, show_prob=True)
             if cv2.waitKey(u.DELAY) == ord("p"):
                 print("")
                 cv2.imwrite(os.path.join(os.path.join(base_path, "Positive"), "Extra_{}.png".format(countp)), frame)
+                scorer.add_anchors(u.get_single_image_features(Models.fea_extractor, u.FEA_TRANSFORM, u.preprocess(frame)))
                 print("Captured Snapshot - {} and save to Positive Directory".format(countp))
                 countp += 1
             
@@ -293,8 +393,6 @@ def video(filename=None, part_name=None, model=None, save=False, show_prob=True)
             # Press 'q' to Quit
             if cv2.waitKey(u.DELAY) == ord("q"):
                 break
-        else:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
     # Release capture object and destory all windows
     cap.release()
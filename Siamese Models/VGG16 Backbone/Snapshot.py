@@ -4,11 +4,11 @@
 
 import os
 import cv2
-import platform
 import shutil
 import numpy as np
 
 import utils as u
+from Capture import FrameReader
 
 # ******************************************************************************************************************** #
 
@@ -24,20 +24,16 @@ def capture_snapshot(device_id=0, part_name=None, roi_extractor=None):
         os.makedirs(path)
         file = open(os.path.join(os.path.join(u.DATASET_PATH, part_name), "Box.txt"), "w")
 
-    # Initialize the capture object
-    if platform.system() != "Windows":
-        cap = cv2.VideoCapture(device_id)
-    else:
-        cap = cv2.VideoCapture(device_id, cv2.CAP_DSHOW)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, u.CAM_HEIGHT)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, u.CAM_WIDTH)
-    cap.set(cv2.CAP_PROP_FPS, u.FPS)
+    # Initialize the capture object; frames are read on a background thread and only the newest one is kept
+    cap = FrameReader(device_id, width=u.CAM_WIDTH, height=u.CAM_HEIGHT, fps=u.FPS, drop=True).start()
     
     count = 1
 
     # Read data from capture object
     while cap.isOpened():
-        _, frame = cap.read()
+        ret, frame = cap.read()
+        if not ret:
+            break
 
         # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
         frame = u.clahe_equ(frame)
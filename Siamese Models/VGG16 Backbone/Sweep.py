@@ -0,0 +1,213 @@
+"""
+    Hyperparameter Sweep of the Siamese Network over the stored features of a part
+"""
+
+import os
+import sys
+import csv
+import math
+import torch
+import random
+import tempfile
+import multiprocessing
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+
+import utils as u
+import Models
+from Metrics import MetricAccumulator, default_metrics
+from DatasetTemplates import SiameseDS, TensorLoader
+from Train import load_features, kfold_splits
+
+# ******************************************************************************************************************** #
+
+# Lists are sampled uniformly, (low, high) tuples log-uniformly
+SEARCH_SPACE = {
+    "embed"      : [256, 512, 1024, 2048],
+    "lr"         : (1e-6, 1e-3),
+    "wd"         : (1e-6, 1e-3),
+    "batch_size" : [64, 128, 256, 512],
+}
+
+COLUMNS = ["rank", "trial", "embed", "lr", "wd", "batch_size", "epochs", "valid_loss", "valid_accuracy", "AUC", "status"]
+
+# ******************************************************************************************************************** #
+
+def sample_trials(num_trials=None, seed=u.SEED):
+    rng = random.Random(seed)
+    trials = []
+    for i in range(num_trials):
+        trial = {"trial": i + 1}
+        for name, space in SEARCH_SPACE.items():
+            if isinstance(space, list):
+                trial[name] = rng.choice(space)
+            else:
+                trial[name] = 10 ** rng.uniform(math.log10(space[0]), math.log10(space[1]))
+        trials.append(trial)
+    return trials
+
+# ******************************************************************************************************************** #
+
+# Training and validation datasets of a worker process; built once by init_worker and shared by all of its trials
+datasets = {}
+
+def init_worker(anchors=None, p_train=None, p_valid=None, n_train=None, n_valid=None):
+    # The trials are already spread over the cores
+    torch.set_num_threads(1)
+    datasets["train"] = SiameseDS(anchors=anchors, p_vector=p_train, n_vector=n_train)
+    datasets["valid"] = SiameseDS(anchors=anchors, p_vector=p_valid, n_vector=n_valid)
+
+
+def run_trial(trial=None, path=None, epochs=None):
+    """
+        trial  : Hyperparameters of the trial (sample_trials)
+        path   : File holding the state of the trial between rungs (created by the first rung)
+        epochs : Number of epochs to train the trial for
+    """
+    torch.manual_seed(u.SEED + trial["trial"])
+    model = Models.SiameseNetwork(embed=trial["embed"])
+    optimizer = model.getOptimizer(lr=trial["lr"], wd=trial["wd"])
+    result = {"epochs": 0, "valid_loss": math.inf}
+    if os.path.exists(path):
+        state = torch.load(path, map_location="cpu")
+        model.load_state_dict(state["model_state_dict"])
+        optimizer.load_state_dict(state["optim_state_dict"])
+        result = state["result"]
+
+    criterion = torch.nn.BCEWithLogitsLoss()
+    generator = torch.Generator().manual_seed(u.SEED + trial["trial"] * 100003 + result["epochs"])
+    loaders = {"train": TensorLoader(datasets["train"], batch_size=trial["batch_size"], shuffle=True, generator=generator, device="cpu"),
+               "valid": TensorLoader(datasets["valid"], batch_size=trial["batch_size"], shuffle=False, device="cpu")}
+    meters = {"train": MetricAccumulator("cpu"), "valid": MetricAccumulator("cpu", default_metrics())}
+
+    for _ in range(epochs):
+        for phase in ["train", "valid"]:
+            if phase == "train":
+                model.train()
+            else:
+                model.eval()
+            meters[phase].reset()
+            for X, y in loaders[phase]:
+                optimizer.zero_grad()
+                with torch.set_grad_enabled(phase == "train"):
+                    output = model(X[:, 0, :], X[:, 1, :])
+                    loss = criterion(output, y)
+                    if phase == "train":
+                        loss.backward()
+                        optimizer.step()
+                meters[phase].update(loss, output, y)
+
+        # A trial is scored by its best epoch (the epoch fit_ would have checkpointed)
+        metrics = meters["valid"].compute()
+        result["epochs"] += 1
+        if metrics["loss"] < result["valid_loss"]:
+            result.update(valid_loss=metrics["loss"], valid_accuracy=metrics["accuracy"], AUC=metrics["AUC"])
+
+    # The states stay on disk so that the parent does not hold every trial in memory
+    torch.save({"model_state_dict": model.state_dict(), "optim_state_dict": optimizer.state_dict(), "result": result}, path)
+    return result
+
+# ******************************************************************************************************************** #
+
+def sweep(part_name=None, num_trials=50, max_epochs=270, rung_epochs=10, eta=3, workers=None, output=None):
+    """
+        part_name   : Part name
+        num_trials  : Number of sampled hyperparameter settings
+        max_epochs  : Maximum number of epochs a trial is trained for
+        rung_epochs : Number of epochs every trial is trained for before the first pruning
+        eta         : Only the best 1/eta trials of a rung continue; the next rung trains them eta times longer
+        workers     : Number of worker processes (Default: Number of CPU cores)
+        output      : Path of the leaderboard (.csv)
+    """
+    workers = workers or os.cpu_count() or 1
+
+    u.breaker()
+    u.myprint("Sweeping [{}] : {} Trials | {} Workers ...".format(part_name, num_trials, workers), "cyan")
+    u.breaker()
+
+    # The features are read (and the anchors extracted) once for the entire sweep
+    p_features, n_features, anchors = load_features(part_name=part_name, fea_extractor=Models.fea_extractor)
+    (p_train_indices, p_valid_indices), (n_train_indices, n_valid_indices) = kfold_splits(p_features, n_features)[0]
+    initargs = (anchors, p_features[p_train_indices], p_features[p_valid_indices], n_features[n_train_indices], n_features[n_valid_indices])
+
+    trials = {trial["trial"]: trial for trial in sample_trials(num_trials)}
+    results = {}
+
+    # Successive Halving; spawn (not fork) since the parent has already run the Feature Extractor
+    start_time, done, budget = time(), 0, rung_epochs
+    with tempfile.TemporaryDirectory() as state_path, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=initargs) as pool:
+        active = list(trials)
+        while True:
+            futures = {i: pool.submit(run_trial, trials[i], os.path.join(state_path, "Trial_{}.pt".format(i)), budget - done) for i in active}
+            for i, future in futures.items():
+                results[i] = future.result()
+
+            active.sort(key=lambda i: results[i]["valid_loss"])
+            u.myprint("Epochs : {} | Trials : {} | Best Valid Loss : {:.5f} (Trial {}) | Time : {:.2f} seconds".format(
+                      budget, len(active), results[active[0]]["valid_loss"], active[0], time() - start_time), "cyan")
+
+            if len(active) == 1 or budget >= max_epochs:
+                break
+
+            keep = max(1, len(active) // eta)
+            for i in active[keep:]:
+                results[i]["status"] = "Pruned"
+                os.remove(os.path.join(state_path, "Trial_{}.pt".format(i)))
+            active, done, budget = active[:keep], budget, min(max_epochs, budget * eta)
+
+    for i in active:
+        results[i]["status"] = "Completed"
+
+    # Leaderboard; trials that ran longer rank first, then by their best validation loss
+    ranking = sorted(trials, key=lambda i: (-results[i]["epochs"], results[i]["valid_loss"]))
+    with open(output, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        for rank, i in enumerate(ranking):
+            row = dict(trials[i], **results[i], rank=rank + 1)
+            writer.writerow([row.get(column, "") for column in COLUMNS])
+
+    best = trials[ranking[0]]
+    u.breaker()
+    u.myprint("Best : Trial {} | Embed : {} | lr : {:.2e} | wd : {:.2e} | Batch Size : {} | Valid Loss : {:.5f}".format(
+              best["trial"], best["embed"], best["lr"], best["wd"], best["batch_size"], results[ranking[0]]["valid_loss"]), "green")
+    u.myprint("Time Taken : {:.2f} minutes | Leaderboard : {}".format((time() - start_time) / 60, output), "green")
+    u.breaker()
+
+# ******************************************************************************************************************** #
+
+def main():
+    args_1 = "--part"
+    args_2 = "--trials"
+    args_3 = "--epochs"
+    args_4 = "--workers"
+    args_5 = "--out"
+
+    # CLI Argument Handling
+    part_name, num_trials, max_epochs, workers, output = None, 50, 270, None, None
+    if args_1 in sys.argv:
+        part_name = sys.argv[sys.argv.index(args_1) + 1]
+    if args_2 in sys.argv:
+        num_trials = int(sys.argv[sys.argv.index(args_2) + 1])
+    if args_3 in sys.argv:
+        max_epochs = int(sys.argv[sys.argv.index(args_3) + 1])
+    if args_4 in sys.argv:
+        workers = int(sys.argv[sys.argv.index(args_4) + 1])
+    if args_5 in sys.argv:
+        output = sys.argv[sys.argv.index(args_5) + 1]
+
+    if part_name is None:
+        u.myprint("Usage : python Sweep.py --part Part_Name [--trials 50] [--epochs 270] [--workers N] [--out Sweep.csv]", "red")
+        return 1
+    if output is None:
+        output = os.path.join(os.path.join(u.DATASET_PATH, part_name), "Sweep.csv")
+
+    sweep(part_name=part_name, num_trials=num_trials, max_epochs=max_epochs, workers=workers, output=output)
+
+# ******************************************************************************************************************** #
+
+if __name__ == "__main__":
+    sys.exit(main() or 0)
+
+# ******************************************************************************************************************** #
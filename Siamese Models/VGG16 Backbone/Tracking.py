@@ -0,0 +1,133 @@
+"""
+    Bounding Box Tracking
+"""
+
+import cv2
+import numpy as np
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+# Intersection over Union of two (x1, y1, x2, y2) boxes; 0 if either box is missing
+def box_iou(box_1=None, box_2=None):
+    if box_1 is None or box_2 is None or box_1[0] is None or box_2[0] is None:
+        return 0.0
+    w = max(0, min(box_1[2], box_2[2]) - max(box_1[0], box_2[0]))
+    h = max(0, min(box_1[3], box_2[3]) - max(box_1[1], box_2[1]))
+    union = (box_1[2] - box_1[0]) * (box_1[3] - box_1[1]) + (box_2[2] - box_2[0]) * (box_2[3] - box_2[1]) - w * h
+    return (w * h) / union if union > 0 else 0.0
+
+# ******************************************************************************************************************** #
+
+"""
+    - Detect-every-K-frames box source for the realtime loop
+    - The RoI Extractor (Faster R-CNN) runs every detect_every frames; in between, ORB keypoints inside the box are
+      tracked with pyramidal Lucas-Kanade optical flow and the box follows their similarity transform
+    - The detector re-runs early when the track drifts (forward-backward error) or loses confidence (too few points)
+    - detect_every=1 runs the detector on every frame (same boxes as calling u.get_box_coordinates directly)
+"""
+class BoxTracker(object):
+    def __init__(self, roi_extractor=None, detect_every=1, nfeatures=100, min_points=8, min_inliers=0.5, max_fb_error=1.0):
+        """
+            roi_extractor : RoI Extraction Model
+            detect_every  : Number of frames between two detector runs
+            nfeatures     : Maximum number of ORB keypoints tracked inside the box
+            min_points    : Minimum number of tracked points; below this the detector is re-run
+            min_inliers   : Minimum fraction of the points of the last detection that must still be tracked
+            max_fb_error  : Maximum forward-backward error (in pixels) of a tracked point
+        """
+        self.roi_extractor = roi_extractor
+        self.detect_every = max(1, detect_every)
+        self.orb = cv2.ORB_create(nfeatures=nfeatures)
+        self.min_points = min_points
+        self.min_inliers = min_inliers
+        self.max_fb_error = max_fb_error
+        self.lk_params = dict(winSize=(21, 21), maxLevel=3, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+
+        # Number of frames seen and number of detector runs
+        self.frames = 0
+        self.detections = 0
+        self.reset()
+
+    def reset(self):
+        """
+            Drop the current track; the next frame runs the detector
+        """
+        self.box = None
+        self.points = None
+        self.num_detected_points = 0
+        self.prev_gray = None
+        self.since_detection = 0
+
+    def __call__(self, frame):
+        """
+            frame : Current (BGR) frame; returns the (x1, y1, x2, y2) box in frame coordinates (None's if no object)
+        """
+        self.frames += 1
+        gray = cv2.cvtColor(src=frame, code=cv2.COLOR_BGR2GRAY)
+
+        if self.box is None or self.since_detection + 1 >= self.detect_every or not self.track(gray):
+            self.detect(frame, gray)
+        else:
+            self.since_detection += 1
+
+        self.prev_gray = gray
+        return self.box if self.box is not None else (None, None, None, None)
+
+    def detect(self, frame, gray):
+        self.detections += 1
+        self.since_detection = 0
+        self.box, self.points = None, None
+
+        x1, y1, x2, y2 = u.get_box_coordinates(self.roi_extractor, u.ROI_TRANSFORM, frame)
+        if x1 is None:
+            return
+        self.box = (x1, y1, x2, y2)
+
+        # Tracking is only set up for longer detection intervals
+        if self.detect_every == 1:
+            return
+
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        mask[max(0, y1):max(0, y2), max(0, x1):max(0, x2)] = 255
+        kps = self.orb.detect(gray, mask)
+        if len(kps) >= self.min_points:
+            self.points = np.array([kp.pt for kp in kps], dtype=np.float32).reshape(-1, 1, 2)
+            self.num_detected_points = len(kps)
+
+    def track(self, gray):
+        """
+            Propagate the box to the current frame; returns False on drift or a low-confidence track
+        """
+        if self.points is None:
+            return False
+
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, points, None, **self.lk_params)
+        fb_error = np.linalg.norm((self.points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        if good.sum() < max(self.min_points, self.min_inliers * self.num_detected_points):
+            return False
+
+        # Rotation is ignored; the box only moves and scales
+        transform, inliers = cv2.estimateAffinePartial2D(self.points[good], points[good], method=cv2.RANSAC, ransacReprojThreshold=3.0)
+        if transform is None or inliers.sum() < self.min_points:
+            return False
+        scale = np.sqrt(np.linalg.det(transform[:, :2]))
+
+        x1, y1, x2, y2 = self.box
+        cx, cy = transform @ np.array([(x1 + x2) / 2, (y1 + y2) / 2, 1.0])
+        hw, hh = scale * (x2 - x1) / 2, scale * (y2 - y1) / 2
+
+        # Box has (mostly) left the frame
+        h, w = gray.shape
+        if not (0 <= cx < w and 0 <= cy < h):
+            return False
+
+        self.box = (int(max(0, cx - hw)), int(max(0, cy - hh)), int(min(w, cx + hw)), int(min(h, cy + hh)))
+        self.points = points[good][inliers.ravel() == 1].reshape(-1, 1, 2)
+        return True
+
+# ******************************************************************************************************************** #
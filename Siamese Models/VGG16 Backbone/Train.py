@@ -4,22 +4,33 @@
 
 import os
 import cv2
+import queue
+import shutil
 import torch
+import multiprocessing
 import numpy as np
+import matplotlib
+
+# Plots are only saved to disk; the Agg backend is safe to use off the main thread (GUI training runs as a Job)
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
 from time import time
 from sklearn.model_selection import KFold
-from torch.utils.data import DataLoader as DL
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 import utils as u
-from DatasetTemplates import SiameseDS
+import Models
+from Metrics import MetricAccumulator, default_metrics, summary
+from Checkpoints import CheckpointWriter, atomic_write
+from Jobs import ProcessJob, JobCancelled
+from DatasetTemplates import SiameseDS, TensorLoader
 
 # ******************************************************************************************************************** #
 
 def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping_patience=None,
          trainloader=None, validloader=None, criterion=None, device=None,
-         save_to_file=False, path=None, verbose=False):
+         save_to_file=False, path=None, verbose=False, job=None, metadata=None):
 
     """
         model                   : Pytorch Siamese Model
@@ -34,16 +45,10 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
         save_to_file            : Flag that controls if verbose output should be save to a file
         path                    : Patch at which to save the model checkpoint
         verbose                 : Flag that controls the display of information during training
+        job                     : Jobs.Job used to report progress and handle cancellation (Optional)
+        metadata                : Dictionary stored with every checkpoint (Optional)
     """
 
-    def getAccuracy(y_pred=None, y_true=None):
-        y_pred, y_true = torch.sigmoid(y_pred).detach(), y_true.detach()
-
-        y_pred[y_pred > 0.5] = 1
-        y_pred[y_pred <= 0.5] = 0
-
-        return torch.count_nonzero(y_pred == y_true).item() / len(y_true)
-    
     u.breaker()
     u.myprint("Training ...", "cyan")
     u.breaker()
@@ -56,12 +61,16 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
     bestLoss = {"train": np.inf, "valid": np.inf}
     bestAccs = {"train": 0.0, "valid": 0.0}
     Losses = []
-    Accuracies = [] 
+    Accuracies = []
+    meters = {"train": MetricAccumulator(device), "valid": MetricAccumulator(device, default_metrics())}
 
     # Open .txt file to store verbose if required
     if save_to_file:
         file = open(os.path.join(path, "Metrics.txt"), "w+")
 
+    # Checkpoints are written on a background thread
+    writer = CheckpointWriter(path, num_best=u.NUM_CHECKPOINTS, metadata=metadata)
+
     # Training and Validation Loop
     start_time = time()
     for e in range(epochs):
@@ -69,6 +78,7 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
 
         epochLoss = {"train": 0.0, "valid": 0.0}
         epochAccs = {"train": 0.0, "valid": 0.0}
+        epochMetrics = {"train": {}, "valid": {}}
 
         for phase in ["train", "valid"]:
             # Setup model to work in training and validation mode
@@ -77,8 +87,7 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
             else:
                 model.eval()
 
-            lossPerPass = []
-            accsPerPass = []
+            meters[phase].reset()
 
             # Iterate through the all the data in the dataloader
             for X, y in DLS[phase]:
@@ -106,12 +115,11 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
                     if phase == "train":
                         loss.backward()
                         optimizer.step()
-                lossPerPass.append(loss.item())
-                accsPerPass.append(getAccuracy(output, y))
+                meters[phase].update(loss, output, y)
             
             # Track the per epoch training/validation loss and accuracy
-            epochLoss[phase] = np.mean(np.array(lossPerPass))
-            epochAccs[phase] = np.mean(np.array(accsPerPass))
+            epochMetrics[phase] = meters[phase].compute()
+            epochLoss[phase], epochAccs[phase] = epochMetrics[phase]["loss"], epochMetrics[phase]["accuracy"]
         
         # Store the Loss and Accuracy History
         Losses.append(epochLoss)
@@ -122,9 +130,7 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
             if epochLoss["valid"] < bestLoss["valid"]:
                 bestLoss = epochLoss
                 bestLossEpoch = e + 1
-                torch.save({"model_state_dict": model.state_dict(),
-                            "optim_state_dict": optimizer.state_dict()},
-                           os.path.join(path, "State.pt"))
+                writer.save(model, optimizer, epoch=e + 1, valid_loss=epochLoss["valid"])
                 early_stopping_step = 0
             else:
                 early_stopping_step += 1
@@ -138,9 +144,7 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
         if epochLoss["valid"] < bestLoss["valid"]:
             bestLoss = epochLoss
             bestLossEpoch = e + 1
-            torch.save({"model_state_dict": model.state_dict(),
-                        "optim_state_dict": optimizer.state_dict()},
-                        os.path.join(path, "State.pt"))
+            writer.save(model, optimizer, epoch=e + 1, valid_loss=epochLoss["valid"])
 
         # Keep track of the epoch validation accuracy
         if epochAccs["valid"] > bestAccs["valid"]:
@@ -150,22 +154,37 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
         # Verbose Output
         if verbose:
             u.myprint("Epoch: {} | Train Loss: {:.5f} | Valid Loss: {:.5f} | Train Accs : {:.5f} | \
-Valid Accs : {:.5f} | Time: {:.2f} seconds".format(e + 1,
+Valid Accs : {:.5f} | Time: {:.2f} seconds{}".format(e + 1,
                                                    epochLoss["train"], epochLoss["valid"],
                                                    epochAccs["train"], epochAccs["valid"],
-                                                   time() - e_st), "cyan")
+                                                   time() - e_st,
+                                                   summary(epochMetrics["valid"])), "cyan")
 
         if save_to_file:
             text = "Epoch: {} | Train Loss: {:.5f} | Valid Loss: {:.5f} | Train Accs : {:.5f} | \
-Valid Accs : {:.5f} | Time: {:.2f} seconds\n".format(e + 1,
+Valid Accs : {:.5f} | Time: {:.2f} seconds{}\n".format(e + 1,
                                                      epochLoss["train"], epochLoss["valid"],
                                                      epochAccs["train"], epochAccs["valid"],
-                                                     time() - e_st)
+                                                     time() - e_st,
+                                                     summary(epochMetrics["valid"]))
             file.write(text)
 
         if scheduler:
             scheduler.step(epochLoss["valid"])
 
+        # Report progress and stop if the job was cancelled
+        if job is not None:
+            job.report(stage="Training", epoch=e + 1, epochs=epochs,
+                       train_loss=epochLoss["train"], valid_loss=epochLoss["valid"])
+            if job.cancelled():
+                writer.close()
+                if save_to_file:
+                    file.close()
+                job.check()
+
+    # Wait for the last checkpoint to be on disk
+    writer.close()
+
     u.breaker()
     u.myprint("-----> Best Validation Loss at Epoch {}".format(bestLossEpoch), "cyan")
     u.breaker()
@@ -189,61 +208,180 @@ Valid Accs : {:.5f} | Time: {:.2f} seconds\n".format(e + 1,
 
 # ******************************************************************************************************************** #
 
-def trainer(part_name=None, model=None, epochs=None, lr=None, wd=None, batch_size=None, early_stopping=None, fea_extractor=None):
-    """
-        part_name      : Part name
-        model          : Siamese Network
-        epochs         : Number of training epochs
-        lr             : Learning Rate
-        wd             : Weight Decay
-        batch_size     : Batch Size used during training
-        early_stopping : Number of epochs without improvement after which to stop training
-        fea_extractor  : Feature Extraction Model
-    """
+# Features of a part (as saved in MakeData.py) and the features of its anchors (every image in the Positive directory)
+def load_features(part_name=None, fea_extractor=None):
     base_path = os.path.join(u.DATASET_PATH, part_name)
-    
-    # Read the features (as saved in MakeData.py)
     p_features, n_features = np.load(os.path.join(base_path, "Positive_Features.npy")), np.load(os.path.join(base_path, "Negative_Features.npy"))
-    p_shape, n_shape = p_features.shape[0], n_features.shape[0]
-    
-    # Setup KFold Split
-    if p_shape > n_shape:
-        kf = KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(n_features)
-    else:
-        kf = KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(p_features)
-    for tr_idx, va_idx in kf:
-        train_indices, valid_indices = tr_idx, va_idx
-        break
 
-    # Consider all the images in the positive directory to be an anchor image (Generate Siamese Data for each image)
     names = [name for name in os.listdir(os.path.join(os.path.join(base_path, "Positive"))) if name[-3:] == "png"]
     anchors = []
     for name in names:
         anchors.append(u.get_single_image_features(fea_extractor, u.FEA_TRANSFORM, u.preprocess(cv2.imread(os.path.join(os.path.join(base_path, "Positive"), name), cv2.IMREAD_COLOR))))
+    return p_features, n_features, anchors
 
-    # Split the feature vectors into Training and Validation Sets
-    p_train, p_valid = p_features[train_indices], p_features[valid_indices]
-    n_train, n_valid = n_features[train_indices], n_features[valid_indices]
 
-    # Setup the training and validation dataloaders
-    tr_data_setup = SiameseDS(anchors=anchors, p_vector=p_train, n_vector=n_train)
-    va_data_setup = SiameseDS(anchors=anchors, p_vector=p_valid, n_vector=n_valid)
-    tr_data = DL(tr_data_setup, batch_size=batch_size, shuffle=True, pin_memory=True, generator=torch.manual_seed(u.SEED), )
-    va_data = DL(va_data_setup, batch_size=batch_size, shuffle=False, pin_memory=True)
+# ((p_train_indices, p_valid_indices), (n_train_indices, n_valid_indices)) of every fold; each class is split on its own
+# so that all the samples of the larger class are kept
+def kfold_splits(p_features=None, n_features=None, n_splits=5):
+    return list(zip(KFold(n_splits=n_splits, shuffle=True, random_state=u.SEED).split(p_features),
+                    KFold(n_splits=n_splits, shuffle=True, random_state=u.SEED).split(n_features)))
+
+# ******************************************************************************************************************** #
+
+# Train one fold in a worker process (CPU); returns what fit_ returns
+def fit_fold(anchors=None, p_train=None, p_valid=None, n_train=None, n_valid=None, embed=None, epochs=None, lr=None, wd=None,
+             batch_size=None, early_stopping=None, path=None, metadata=None, job=None):
+    model, _, _, _ = Models.build_siamese_model(embed=embed)
+    tr_data = TensorLoader(SiameseDS(anchors=anchors, p_vector=p_train, n_vector=n_train), batch_size=batch_size, shuffle=True, generator=torch.manual_seed(u.SEED), device="cpu")
+    va_data = TensorLoader(SiameseDS(anchors=anchors, p_vector=p_valid, n_vector=n_valid), batch_size=batch_size, shuffle=False, device="cpu")
 
-    # Setup the optimizer
-    optimizer = model.getOptimizer(lr=lr, wd=wd)
+    return fit_(model=model, optimizer=model.getOptimizer(lr=lr, wd=wd), scheduler=None, epochs=epochs,
+                early_stopping_patience=early_stopping, trainloader=tr_data, validloader=va_data,
+                device=torch.device("cpu"), criterion=torch.nn.BCEWithLogitsLoss(),
+                save_to_file=True, path=path, verbose=False, metadata=metadata, job=job)
+
+
+def cross_validate(p_features=None, n_features=None, anchors=None, embed=None, epochs=None, lr=None, wd=None, batch_size=None,
+                   early_stopping=None, folds=5, path=None, metadata=None, job=None):
+    """
+        p_features, n_features : Features of the part (load_features)
+        anchors                : Features of the anchors (load_features)
+        folds                  : Number of folds; every fold is trained, all of them at the same time in a process pool
+        path                   : Checkpoint directory; fold k is saved in Fold_k/ and the best fold is copied to State.pt
+        metadata               : Dictionary stored with every checkpoint
+
+        Returns the Loss and Accuracy history of the best fold
+    """
+    u.breaker()
+    u.myprint("Cross Validation [{} Folds] ...".format(folds), "cyan")
+
+    # The heads are small; every fold gets an equal share of the cores. spawn (not fork) since the parent has already
+    # run the Feature Extractor
+    threads = max(1, (os.cpu_count() or 1) // folds)
+
+    # Folds of an earlier run with more folds would otherwise join the ensemble (Models.build_fold_ensemble)
+    for name in os.listdir(path):
+        if name.startswith("Fold_") and int(name[len("Fold_"):]) > folds:
+            shutil.rmtree(os.path.join(path, name))
+
+    results = [None] * folds
+    fold_epochs = [0] * folds
+    context = multiprocessing.get_context("spawn")
+
+    # Folds report every epoch and check for cancellation through a Manager queue/event (ProcessJob)
+    with context.Manager() as manager, \
+         ProcessPoolExecutor(max_workers=folds, mp_context=context, initializer=torch.set_num_threads, initargs=(threads, )) as pool:
+        messages, cancel_event = manager.Queue(), manager.Event()
+        futures = {}
+        for k, ((p_train_indices, p_valid_indices), (n_train_indices, n_valid_indices)) in enumerate(kfold_splits(p_features, n_features, n_splits=folds)):
+            fold_path = os.path.join(path, "Fold_{}".format(k + 1))
+            if not os.path.exists(fold_path):
+                os.makedirs(fold_path)
+            futures[pool.submit(fit_fold, anchors, p_features[p_train_indices], p_features[p_valid_indices], n_features[n_train_indices],
+                                n_features[n_valid_indices], embed, epochs, lr, wd, batch_size, early_stopping, fold_path, dict(metadata, fold=k + 1),
+                                ProcessJob(messages, cancel_event, fold=k))] = k
+
+        pending, progress = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except JobCancelled:
+                    pass
+                except BaseException:
+                    # The other folds stop at their next epoch instead of training to completion
+                    cancel_event.set()
+                    raise
+
+            while True:
+                try:
+                    message = messages.get_nowait()
+                except queue.Empty:
+                    break
+                if message.get("stage") == "Training":
+                    fold_epochs[message["fold"]] = message["epoch"]
+
+            if job is not None:
+                if progress != (sum(fold_epochs), len(futures) - len(pending)):
+                    progress = (sum(fold_epochs), len(futures) - len(pending))
+                    job.report(stage="Cross Validation", folds=progress[1], total=folds, epoch=progress[0], epochs=folds * epochs)
+                if job.cancelled():
+                    cancel_event.set()
+
+    if job is not None:
+        job.check()
+
+    # Validation Loss and Accuracy of every fold at its best (checkpointed) epoch
+    losses = np.array([L[bestLossEpoch - 1]["valid"] for L, _, bestLossEpoch, _ in results])
+    accs = np.array([A[bestLossEpoch - 1]["valid"] for _, A, bestLossEpoch, _ in results])
+
+    lines = ["Fold {} | Best Epoch : {} | Valid Loss : {:.5f} | Valid Accs : {:.5f}".format(k + 1, results[k][2], losses[k], accs[k]) for k in range(folds)]
+    lines.append("Valid Loss : {:.5f} +/- {:.5f} (Variance : {:.2e}) | Valid Accs : {:.5f} +/- {:.5f} (Variance : {:.2e})".format(
+                 losses.mean(), losses.std(ddof=1), losses.var(ddof=1), accs.mean(), accs.std(ddof=1), accs.var(ddof=1)))
+
+    u.breaker()
+    for line in lines:
+        u.myprint(line, "cyan")
+    with open(os.path.join(path, "CrossValidation.txt"), "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+    # The best fold is the model used by the application
+    best = int(losses.argmin())
+    with open(os.path.join(os.path.join(path, "Fold_{}".format(best + 1)), "State.pt"), "rb") as file:
+        atomic_write(os.path.join(path, "State.pt"), file.read())
+
+    return results[best][0], results[best][1]
+
+# ******************************************************************************************************************** #
+
+def trainer(part_name=None, model=None, epochs=None, lr=None, wd=None, batch_size=None, early_stopping=None, fea_extractor=None, job=None, folds=1):
+    """
+        part_name      : Part name
+        model          : Siamese Network
+        epochs         : Number of training epochs
+        lr             : Learning Rate
+        wd             : Weight Decay
+        batch_size     : Batch Size used during training
+        early_stopping : Number of epochs without improvement after which to stop training
+        fea_extractor  : Feature Extraction Model
+        job            : Jobs.Job used to report progress and handle cancellation (Optional)
+        folds          : Number of cross validation folds; 1 trains on the first of 5 folds only
+    """
+    p_features, n_features, anchors = load_features(part_name=part_name, fea_extractor=fea_extractor)
 
     # Setup the checkpoint directory
     checkpoint_path = os.path.join(os.path.join(u.DATASET_PATH, part_name), "Checkpoints")
     if not os.path.exists(checkpoint_path):
         os.makedirs(checkpoint_path)
-    
-    # Fit the model
-    L, A, _, _ = fit_(model=model, optimizer=optimizer, scheduler=None, epochs=epochs,
-                      early_stopping_patience=early_stopping, trainloader=tr_data, validloader=va_data, 
-                      device=u.DEVICE, criterion=torch.nn.BCEWithLogitsLoss(),
-                      save_to_file=True, path=checkpoint_path, verbose=True)
+
+    metadata = {"backbone": fea_extractor.backbone_id, "embed": model.embedder.FC.out_features}
+
+    if folds > 1:
+        L, A = cross_validate(p_features=p_features, n_features=n_features, anchors=anchors, embed=model.embedder.FC.out_features,
+                              epochs=epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=early_stopping, folds=folds,
+                              path=checkpoint_path, metadata=metadata, job=job)
+        model.load_state_dict(torch.load(os.path.join(checkpoint_path, "State.pt"), map_location="cpu")["model_state_dict"])
+    else:
+        # Split the feature vectors into Training and Validation Sets (First Fold)
+        (p_train_indices, p_valid_indices), (n_train_indices, n_valid_indices) = kfold_splits(p_features, n_features)[0]
+        p_train, p_valid = p_features[p_train_indices], p_features[p_valid_indices]
+        n_train, n_valid = n_features[n_train_indices], n_features[n_valid_indices]
+
+        # Setup the training and validation dataloaders
+        tr_data_setup = SiameseDS(anchors=anchors, p_vector=p_train, n_vector=n_train)
+        va_data_setup = SiameseDS(anchors=anchors, p_vector=p_valid, n_vector=n_valid)
+        tr_data = TensorLoader(tr_data_setup, batch_size=batch_size, shuffle=True, generator=torch.manual_seed(u.SEED), device=u.DEVICE)
+        va_data = TensorLoader(va_data_setup, batch_size=batch_size, shuffle=False, device=u.DEVICE)
+
+        # Setup the optimizer
+        optimizer = model.getOptimizer(lr=lr, wd=wd)
+
+        # Fit the model
+        L, A, _, _ = fit_(model=model, optimizer=optimizer, scheduler=None, epochs=epochs,
+                          early_stopping_patience=early_stopping, trainloader=tr_data, validloader=va_data, 
+                          device=u.DEVICE, criterion=torch.nn.BCEWithLogitsLoss(),
+                          save_to_file=True, path=checkpoint_path, verbose=True, job=job, metadata=metadata)
 
     TL, VL, TA, VA = [], [], [], []
 
@@ -10,7 +10,7 @@ import Models
 from Snapshot import capture_snapshot
 from MakeData import make_data
 from Train import trainer
-from RTApp import realtime
+from RTApp import realtime, realtime_multi
 
 # ******************************************************************************************************************** #
 
@@ -22,6 +22,12 @@ def app():
     args_5 = "--lower"
     args_6 = "--upper"
     args_7 = "--early"
+    args_8 = "--precision"
+    args_9 = "--channels-last"
+    args_10 = "--compile"
+    args_11 = "--detect-every"
+    args_12 = "--aggregate"
+    args_13 = "--folds"
 
     # CLI Argument Handling
     if args_1 in sys.argv:
@@ -38,10 +44,22 @@ def app():
         u.upper_bound_confidence = float(sys.argv[sys.argv.index(args_6) + 1])
     if args_7 in sys.argv:
         u.early_stopping_step = int(sys.argv[sys.argv.index(args_7) + 1])
+    if args_8 in sys.argv:
+        u.precision = sys.argv[sys.argv.index(args_8) + 1]
+    if args_9 in sys.argv:
+        u.channels_last = True
+    if args_10 in sys.argv:
+        u.compile_model = True
+    if args_11 in sys.argv:
+        u.detect_every = int(sys.argv[sys.argv.index(args_11) + 1])
+    if args_12 in sys.argv:
+        u.anchor_aggregate = sys.argv[sys.argv.index(args_12) + 1]
+    if args_13 in sys.argv:
+        u.num_folds = int(sys.argv[sys.argv.index(args_13) + 1])
     
     while True:
         u.breaker()
-        ch = input("1. Add Object\n2. Retrain\n3. Application\n4. Exit\n\nEnter Choice : ")
+        ch = input("1. Add Object\n2. Retrain\n3. Application\n4. Multi-Part Application\n5. Exit\n\nEnter Choice : ")
 
         if ch == "1":
             """
@@ -63,7 +81,7 @@ def app():
             u.myprint("\nTime Taken [{}] : {:.2f} minutes".format(2*u.num_samples, (time()-start_time)/60), "green")
 
             model, batch_size, lr, wd = Models.build_siamese_model(embed=u.embed_layer_size)
-            trainer(part_name=part_name, model=model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor)
+            trainer(part_name=part_name, model=model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor, folds=u.num_folds)
             realtime(device_id=u.device_id, part_name=part_name, model=model, save=False, fea_extractor=Models.fea_extractor)
         
         elif ch == "2":
@@ -83,7 +101,7 @@ def app():
             u.myprint("\nTime Taken [{}] : {:.2f} minutes".format(2*u.num_samples, (time()-start_time)/60), "green")
 
             model, batch_size, lr, wd = Models.build_siamese_model(embed=u.embed_layer_size)
-            trainer(part_name=part_name, model=model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor)
+            trainer(part_name=part_name, model=model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor, folds=u.num_folds)
         
         elif ch == "3":
             """
@@ -96,6 +114,14 @@ def app():
             realtime(device_id=u.device_id, part_name=part_name, model=model, save=False)
 
         elif ch == "4":
+            """
+                Multi-Part Application
+                    - Perform Realtime Inference against all the trained parts
+            """
+            u.breaker()
+            realtime_multi(device_id=u.device_id, save=False)
+
+        elif ch == "5":
             break
             
         else:
@@ -8,7 +8,6 @@ import cv2
 import shutil
 import ctypes
 import torch
-import platform
 import tkinter as tk
 from tkinter import messagebox
 from PIL import Image, ImageTk
@@ -18,6 +17,9 @@ import Models
 import utils as u
 from MakeData import make_data 
 from Train import trainer
+from Capture import FrameReader
+from Tracking import BoxTracker
+from Jobs import Job
 
 # Initialize Siamese Network Hyperparameters
 _, batch_size, lr, wd = Models.build_siamese_model()
@@ -28,7 +30,7 @@ screen_resolution = (ctypes.windll.user32.GetSystemMetrics(0), ctypes.windll.use
 # ******************************************************************************************************************** #
 
 # Inference Helper
-def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=None, fea_extractor=None, roi_extractor=None):
+def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=None, fea_extractor=None, roi_extractor=None, tracker=None, scorer=None):
     """
         frame         : Current frame being processed
         anchor        : Anchor Image
@@ -37,6 +39,8 @@ def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=
         pt1           : Start Point of the Reference Bounding Box
         pt2           : End Point of the Reference Bounding Box
         fea_extractor : Feature Extraction Model
+        tracker       : Tracking.BoxTracker used to obtain the bounding box (Detector runs on every frame if None)
+        scorer        : Models.AnchorScorer comparing the frame against all anchors of the part (Optional)
     """
     disp_frame = frame.copy()
 
@@ -44,18 +48,22 @@ def __help__(frame=None, anchor=None, model=None, show_prob=True, pt1=None, pt2=
     if anchor is not None:
         disp_frame = u.alpha_blend(anchor, disp_frame, 0.15)
 
-    # Resize + Center Crop (256x256 ---> 224x224)
-    frame = u.preprocess(frame, change_color_space=False)
-
     ########## Dynamic Bounding Box during Inference ##########
     # Obtain the bounding box coordinates
-    x1, y1, x2, y2 = u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, disp_frame)
+    if tracker is not None:
+        x1, y1, x2, y2 = tracker(disp_frame)
+    else:
+        x1, y1, x2, y2 = u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, disp_frame)
     ############################################################ 
 
     # Perform Inference on current frame
     with torch.no_grad():
-        features = u.normalize(fea_extractor(u.FEA_TRANSFORM(frame).to(u.DEVICE).unsqueeze(dim=0)))
-        y_pred = torch.sigmoid(model(features))[0][0].item()
+        # Resize + Center Crop (256x256 ---> 224x224) + ToTensor + Normalize in one fused stage
+        features = u.normalize(fea_extractor(u.FRAME_TRANSFORM(frame).to(u.DEVICE)))
+        if scorer is not None:
+            y_pred = scorer(features)[0].item()
+        else:
+            y_pred = torch.sigmoid(model(features))[0][0].item()
 
     # Prediction > Upper Bound                 -----> Match
     # Lower Bound <= Prediction <= Upper Bound -----> Possible Match
@@ -152,33 +160,28 @@ class Video(object):
     
     def start(self):
         """
-            Initialize the capture object
+            Initialize the capture object; frames are read on a background thread and only the newest one is kept
         """
-        if platform.system() != 'Windows':
-            self.cap = cv2.VideoCapture(self.id)
-        else:
-            self.cap = cv2.VideoCapture(self.id, cv2.CAP_DSHOW)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        self.cap = FrameReader(self.id, width=self.width, height=self.height, fps=self.fps, drop=True).start()
     
     def get_frame(self):
         """
             Read a frame from the capture object
         """
         if self.cap.isOpened():
-            ret, frame = self.cap.read()
+            ret, frame = self.cap.read(timeout=u.READ_TIMEOUT)
             if ret:
                 return ret, cv2.cvtColor(src=frame, code=cv2.COLOR_BGR2RGB)
             else:
                 return ret, None
+        return False, None
 
     def stop(self):
         """
             Stop the capture object
         """
-        if self.cap.isOpened():
-            self.cap.release()
+        if self.cap is not None:
+            self.cap.stop()
 
 # tkinter Video Display
 class VideoFrame(tk.Frame):
@@ -200,6 +203,9 @@ class VideoFrame(tk.Frame):
             self.model.eval()
             self.model.to(u.DEVICE)
 
+            # Embeddings of all the anchors (Positive images) are computed once
+            self.scorer = Models.build_anchor_scorer(part_name=self.part_name, model=self.model, fea_extractor=Models.fea_extractor, aggregate=u.anchor_aggregate)
+
             # Get the Reference Bounding Box Coordinates
             file = open(os.path.join(os.path.join(u.DATASET_PATH, self.part_name), "Box.txt"), "r")
             self.data = file.read().split(",")
@@ -209,6 +215,9 @@ class VideoFrame(tk.Frame):
         self.canvas = tk.Canvas(self, width=u.CAM_WIDTH, height=u.CAM_HEIGHT, background="black")
         self.canvas.pack()
 
+        # Bounding box source; the detector runs every u.detect_every frames and the box is tracked in between
+        self.tracker = BoxTracker(roi_extractor=Models.roi_extractor, detect_every=u.detect_every)
+
         # Delay after which frame will be updated (in ms)
         self.delay = 15
         self.id = None
@@ -218,6 +227,7 @@ class VideoFrame(tk.Frame):
             Start Updating the canvas
         """
         self.V.start()
+        self.tracker.reset()
         self.update()
     
     def update(self):
@@ -229,13 +239,18 @@ class VideoFrame(tk.Frame):
         # Read the current frame from the capture object
         ret, frame = self.V.get_frame()
 
+        # The camera stalled (read timed out); try again on the next tick instead of stopping the feed
+        if not ret and self.V.cap.isOpened():
+            self.id = self.after(self.delay, self.update)
+            return
+
         if not self.isResult:
-            # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
-            frame = u.clahe_equ(frame)
             if ret:
+                # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
+                frame = u.clahe_equ(frame)
 
                 # Obtain the bounding box coordinates
-                x1, y1, x2, y2 = u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, frame)
+                x1, y1, x2, y2 = self.tracker(frame)
 
                 # Draw the bounding box on the frame
                 frame = u.process(frame, x1, y1, x2, y2)
@@ -254,7 +269,7 @@ class VideoFrame(tk.Frame):
                 # Process frame for inference output
                 frame = __help__(frame=frame, model=self.model, anchor=None, 
                                  pt1=(self.data[0], self.data[1]), pt2=(self.data[2], self.data[3]),
-                                 show_prob=False, fea_extractor=Models.fea_extractor)
+                                 show_prob=False, fea_extractor=Models.fea_extractor, tracker=self.tracker, scorer=self.scorer)
 
                 # Convert image from np.ndarray format into tkinter canvas compatible format
                 self.image = ImageTk.PhotoImage(Image.fromarray(frame))
@@ -394,6 +409,23 @@ class ButtonFrame(tk.Frame):
                                     background="red", activebackground="#FCAEAE", foreground="black",
                                     relief="raised", command=self.do_quit)
         self.quitButton.grid(row=3, column=2)
+
+        # Button : Cancel (Dataset Generation/Training)
+        self.cancelButton = tk.Button(self, text="Cancel",
+                                      width=self.widget_width, height=self.widget_height, 
+                                      background="#FF8C00", activebackground="#FFC680", foreground="black",
+                                      relief="raised", state="disabled", command=self.do_cancel)
+        self.cancelButton.grid(row=3, column=1)
+
+        # Label Widget : Progress of the background job
+        self.progressLabel = tk.Label(self, text="", 
+                                      background="#2C40D1", foreground="white", 
+                                      width=3*self.widget_width, height=2)
+        self.progressLabel.grid(row=4, column=0, columnspan=3)
+
+        # Background Job (Dataset Generation + Training); polled every job_delay ms
+        self.job = None
+        self.job_delay = 200
     
     # Callback handling Adding of new Objects
     def do_add(self):
@@ -420,38 +452,24 @@ class ButtonFrame(tk.Frame):
         # Read the current frame from the capture object
         ret, frame = self.VideoWidget.V.get_frame()
 
-        # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
-        frame = u.clahe_equ(frame)
-
         # Save the frame and update counter
         if ret:
+            # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
+            frame = u.clahe_equ(frame)
             cv2.imwrite(os.path.join(self.path, "Snapshot_1.png"), cv2.cvtColor(src=frame, code=cv2.COLOR_BGR2RGB))
             x1, y1, x2, y2 = u.get_box_coordinates(Models.roi_extractor, u.ROI_TRANSFORM, frame)
             file.write(repr(x1) + "," + repr(y1) + "," +repr(x2) + "," + repr(y2))
         
         # Close the file
         file.close()
-        
-        # Release the capture object; Minimize the Application
-        self.VideoWidget.stop()
-        self.master.iconify()
 
-        # Generate the Feature Vector Dataset
-        u.breaker()
-        u.myprint("Generating Feature Vector Data ...", "green")
-        start_time = time()
-        make_data(part_name=self.part_name, cls="Positive", num_samples=u.num_samples, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor)
-        make_data(part_name=self.part_name, cls="Negative", num_samples=u.num_samples, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor)
-        u.myprint("\nTime Taken [{}] : {:.2f} minutes".format(2*u.num_samples, (time()-start_time)/60), "green")
-
-        # Initialize Siamese Network
-        model, _, _, _ = Models.build_siamese_model(embed=u.embed_layer_size)
-
-        # Train the Model
-        trainer(part_name=self.part_name, model=model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor)
+        # Generate the Feature Vector Dataset and Train the Model in the background; the live feed keeps running
+        self.start_job(on_done=self.done_add)
 
-        # Maximize the application window
-        self.master.state("zoomed")
+    # Called once the background job started by do_add has completed
+    def done_add(self, model):
+        # Release the capture object
+        self.VideoWidget.stop()
 
         # Destory the current application window
         self.master.destroy()
@@ -467,33 +485,94 @@ class ButtonFrame(tk.Frame):
             self.path = os.path.join(os.path.join(u.DATASET_PATH, self.part_name), "Positive")
 
         if self.part_name:
-            u.breaker()
+            # Generate the Feature Vector Dataset and Train the Model in the background; the live feed keeps running
+            self.start_job(on_done=self.done_train)
+        else:
+            messagebox.showerror(title="Value Error", message="Enter a valid input")
+            return
+
+    # Called once the background job started by do_train has completed
+    def done_train(self, model):
+        # In Result Mode, reload the retrained weights into the model used by the live feed
+        if self.VideoWidget.isResult:
+            self.VideoWidget.model.load_state_dict(torch.load(self.VideoWidget.model_path, map_location=u.DEVICE)["model_state_dict"])
+            self.VideoWidget.model.eval()
 
-            # Release the capture object; Minimize the Application
-            self.VideoWidget.stop()
-            self.master.iconify()
+            # Anchor embeddings are recomputed with the new weights (and pick up the anchors regenerated by the job)
+            self.VideoWidget.scorer = Models.build_anchor_scorer(part_name=self.VideoWidget.part_name, model=self.VideoWidget.model,
+                                                                 fea_extractor=Models.fea_extractor, aggregate=u.anchor_aggregate)
+        u.breaker()
 
+    # Start Dataset Generation + Training as a background job
+    def start_job(self, on_done=None):
+        """
+            on_done : Callback (on the tkinter main thread) that receives the trained model if the job completes
+        """
+        part_name = self.part_name
+
+        def target(job):
             # Generate the Feature Vector Dataset
+            u.breaker()
             u.myprint("Generating Feature Vector Data ...", "green")
             start_time = time()
-            make_data(part_name=self.part_name, cls="Positive", num_samples=u.num_samples, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor)
-            make_data(part_name=self.part_name, cls="Negative", num_samples=u.num_samples, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor)
+            make_data(part_name=part_name, cls="Positive", num_samples=u.num_samples, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor, job=job)
+            make_data(part_name=part_name, cls="Negative", num_samples=u.num_samples, fea_extractor=Models.fea_extractor, roi_extractor=Models.roi_extractor, job=job)
             u.myprint("\nTime Taken [{}] : {:.2f} minutes".format(2*u.num_samples, (time()-start_time)/60), "green")
 
             # Initialize Siamese Network
-            model, _, _, _ = Models.build_siamese_model(embed=u.embed_layer_size)
+            job.model, _, _, _ = Models.build_siamese_model(embed=u.embed_layer_size)
 
             # Train the Model
-            trainer(part_name=self.part_name, model=model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor)
+            trainer(part_name=part_name, model=job.model, epochs=u.epochs, lr=lr, wd=wd, batch_size=batch_size, early_stopping=u.early_stopping_step, fea_extractor=Models.fea_extractor, job=job, folds=u.num_folds)
 
-            # Start the capture object; Maximize the Application
-            self.VideoWidget.start()
-            self.master.state("zoomed")
+        self.on_done = on_done
+        self.set_busy(True)
+        self.job = Job(target=target).start()
+        self.after(self.job_delay, self.poll_job)
 
-            u.breaker()
-        else:
-            messagebox.showerror(title="Value Error", message="Enter a valid input")
+    # Poll the progress channel of the background job
+    def poll_job(self):
+        alive = self.job.is_alive()
+        for message in self.job.poll():
+            self.show_progress(message)
+
+        if alive:
+            self.after(self.job_delay, self.poll_job)
             return
+
+        self.set_busy(False)
+        if self.job.status == "Done":
+            self.on_done(self.job.model)
+        elif self.job.status == "Failed":
+            messagebox.showerror(title="Training Error", message=repr(self.job.error))
+        self.job = None
+
+    # Display a progress message published by the background job
+    def show_progress(self, message):
+        if "status" in message:
+            text = "Job {}".format(message["status"])
+        elif message["stage"] == "Training":
+            text = "Epoch {}/{} | Train Loss: {:.5f} | Valid Loss: {:.5f}".format(message["epoch"], message["epochs"],
+                                                                                 message["train_loss"], message["valid_loss"])
+        elif message["stage"] == "Cross Validation":
+            text = "Cross Validation : {}/{} Folds | {}/{} Epochs".format(message["folds"], message["total"], message["epoch"], message["epochs"])
+        else:
+            text = "{} : {}/{} Samples | {:.1f} Samples/sec".format(message["stage"], message["samples"],
+                                                                  message["total"], message["rate"])
+        self.progressLabel.configure(text=text)
+
+    # Enable/Disable the buttons that should not be used while a job is running
+    def set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for button in [self.addButton, self.trainButton, self.rtAppButton, self.resetButton]:
+            button.configure(state=state)
+        self.cancelButton.configure(state="normal" if busy else "disabled")
+
+    # Callback handling cancellation of the background job
+    def do_cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.progressLabel.configure(text="Cancelling ...")
     
     # Callback handling the Inference
     def do_rtapp(self):
@@ -520,11 +599,10 @@ class ButtonFrame(tk.Frame):
         # Read the current frame from the capture object
         ret, frame = self.VideoWidget.V.get_frame()
 
-        # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
-        frame = u.clahe_equ(frame)
-
         # Save the frame
         if ret:
+            # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
+            frame = u.clahe_equ(frame)
             cv2.imwrite(os.path.join(os.path.join(os.path.join(u.DATASET_PATH, self.part_name), "Positive"), "Extra_{}.png".format(self.countp)), cv2.cvtColor(src=frame, code=cv2.COLOR_BGR2RGB))
             self.countp += 1
 
@@ -534,11 +612,10 @@ class ButtonFrame(tk.Frame):
         # Read the current frame from the capture object
         ret, frame = self.VideoWidget.V.get_frame()
 
-        # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
-        frame = u.clahe_equ(frame)
-
         # Save the frame
         if ret:
+            # Apply CLAHE (2, 2) Preprocessing. May not be required once lighting issue is fixed
+            frame = u.clahe_equ(frame)
             cv2.imwrite(os.path.join(os.path.join(os.path.join(u.DATASET_PATH, self.part_name), "Negative"), "Extra_{}.png".format(self.countn)), cv2.cvtColor(src=frame, code=cv2.COLOR_BGR2RGB))
             self.countn += 1
     
@@ -558,6 +635,10 @@ class ButtonFrame(tk.Frame):
     
     # Callback handling quit
     def do_quit(self):
+        # Cancel the background job if one is running
+        if self.job is not None:
+            self.job.cancel()
+
         # Release the capture object
         self.VideoWidget.V.stop()
 
@@ -606,6 +687,12 @@ def app():
     args_5 = "--lower"
     args_6 = "--upper"
     args_7 = "--early"
+    args_8 = "--precision"
+    args_9 = "--channels-last"
+    args_10 = "--compile"
+    args_11 = "--detect-every"
+    args_12 = "--aggregate"
+    args_13 = "--folds"
 
     # CLI Argument Handling
     if args_1 in sys.argv:
@@ -622,6 +709,18 @@ def app():
         u.upper_bound_confidence = float(sys.argv[sys.argv.index(args_6) + 1])
     if args_7 in sys.argv:
         u.early_stopping_step = int(sys.argv[sys.argv.index(args_7) + 1])
+    if args_8 in sys.argv:
+        u.precision = sys.argv[sys.argv.index(args_8) + 1]
+    if args_9 in sys.argv:
+        u.channels_last = True
+    if args_10 in sys.argv:
+        u.compile_model = True
+    if args_11 in sys.argv:
+        u.detect_every = int(sys.argv[sys.argv.index(args_11) + 1])
+    if args_12 in sys.argv:
+        u.anchor_aggregate = sys.argv[sys.argv.index(args_12) + 1]
+    if args_13 in sys.argv:
+        u.num_folds = int(sys.argv[sys.argv.index(args_13) + 1])
 
     # Root Window Setup
     root = tk.Tk()
@@ -3,6 +3,11 @@
 """
 
 import sys
+import multiprocessing
+from time import time
+
+# Cold-start time of the application (Imports; backbones are only loaded on first use)
+start_time = time()
 import cli
 import gui
 
@@ -13,6 +18,7 @@ import utils as u
 def main():
     u.breaker()
     u.myprint("\t   --- Application Start ---", color="green")
+    u.myprint("\t   Startup Time : {:.2f} seconds".format(time() - start_time), color="green")
 
     args = "--nogui"
     with_gui = True
@@ -31,6 +37,8 @@ def main():
 # ******************************************************************************************************************** #
 
 if __name__ == "__main__":
+    # Required by the augmentation dataloader workers in a frozen (pyinstaller) executable
+    multiprocessing.freeze_support()
     sys.exit(main() or 0)
 
 # ******************************************************************************************************************** #
@@ -4,6 +4,8 @@
 
 import os
 import cv2
+import threading
+import numpy as np
 import torch
 from torchvision import transforms, ops
 from termcolor import colored
@@ -15,9 +17,15 @@ if not os.path.exists(DATASET_PATH):
     os.makedirs(DATASET_PATH)
 # DATASET_PATH = os.path.join(os.path.dirname(__file__), "Datasets")
 
+# Local copies of the pretrained backbone weights (Created on first use, see Models.get_model)
+WEIGHTS_PATH = os.path.join(os.getcwd(), "Weights")
+
 # Capture object Attributes
 CAM_WIDTH, CAM_HEIGHT, FPS, DELAY = 640, 360, 30, 5
 
+# Maximum time (in seconds) the GUI waits for a frame before giving the tkinter main loop back (Stalled camera)
+READ_TIMEOUT = 0.5
+
 # DL Model Constants
 IMAGENET_MEAN = [0.485, 0.456, 0.406]
 IMAGENET_STD = [0.229, 0.224, 0.225]
@@ -27,8 +35,10 @@ DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 SIZE = 224
 SEED = 0
+NUM_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
 RELIEF = 25
 FEATURE_VECTOR_LENGTH = 2048
+NUM_CHECKPOINTS = 3
 
 # CLI and GUI Color Schemes
 GUI_ORANGE = (255, 165, 0)
@@ -47,6 +57,12 @@ lower_bound_confidence = 0.95
 upper_bound_confidence = 0.99
 device_id = 0
 early_stopping_step = 50
+precision = "fp32"
+channels_last = False
+compile_model = False
+detect_every = 1
+anchor_aggregate = "max"
+num_folds = 1
 # ******************************************************************************************************************** #
 
 # LineBreaker
@@ -59,12 +75,18 @@ def myprint(text, color, on_color=None):
     print(colored(text, color=color, on_color=on_color))
 
 
-# CLAHE Preprocessing (Cliplimit: 2.0, TileGridSize: (2, 2))
+# One CLAHE object per thread (cv2.CLAHE objects are not shared between the GUI, capture and job threads)
+clahe_local = threading.local()
+
+
+# CLAHE Preprocessing (Cliplimit: 2.0, TileGridSize: (2, 2)); applied in-place
 def clahe_equ(image):
-    clahe = cv2.createCLAHE(clipLimit=2, tileGridSize=(2, 2))
-    for i in range(3):
-        image[:, :, i] = clahe.apply(image[:, :, i])
-    return image
+    if not hasattr(clahe_local, "clahe"):
+        clahe_local.clahe = cv2.createCLAHE(clipLimit=2, tileGridSize=(2, 2))
+    channels = cv2.split(image)
+    for channel in channels:
+        clahe_local.clahe.apply(channel, channel)
+    return cv2.merge(channels, image)
 
 
 # Center Crop (Resize to 256x256, then center crop the 224x224 region)
@@ -78,11 +100,61 @@ def preprocess(image, change_color_space=True):
 
 # ******************************************************************************************************************** #
 
-# Normalize the vector to a min-max of [0, 1]
+"""
+    - Fused per frame preprocessing for the Feature Extractor; same output as FEA_TRANSFORM(preprocess(frame, False))
+    - Resize (256x256) + Center Crop (224x224) is a view; the uint8 ---> float copy goes straight into a preallocated
+      (1, 3, 224, 224) tensor, which is then normalized with one multiply-add (x * (1 / 255std) - mean/std)
+    - The returned tensor is reused by the next call
+"""
+class FrameTransform(object):
+    def __init__(self, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.out = torch.empty(1, 3, SIZE, SIZE, dtype=torch.float32)
+        self.scale = (1 / (255 * torch.tensor(std, dtype=torch.float32))).view(1, 3, 1, 1)
+        self.shift = (-torch.tensor(mean, dtype=torch.float32) / torch.tensor(std, dtype=torch.float32)).view(1, 3, 1, 1)
+
+    def __call__(self, frame):
+        """
+            frame : (H, W, 3) uint8 frame (Not resized); returns the (1, 3, 224, 224) normalized tensor
+        """
+        image = preprocess(frame, change_color_space=False)
+        self.out.copy_(torch.from_numpy(image).permute(2, 0, 1).unsqueeze(dim=0))
+        return torch.addcmul(self.shift, self.out, self.scale, out=self.out)
+
+
+# Used by the realtime inference loop (Single consumer)
+FRAME_TRANSFORM = FrameTransform()
+
+# ******************************************************************************************************************** #
+
+# Derive a deterministic child seed from a base seed and an index (eg: augmentation seed + batch index)
+def derive_seed(seed, index):
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+# ******************************************************************************************************************** #
+
+# Normalize the vectors to a min-max of [0, 1] (Batched over all rows)
 def normalize(x):
-    for i in range(x.shape[0]):
-        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
-    return x
+    """
+        x : (N, ...) torch.Tensor or np.ndarray; each of the N rows is normalized in-place
+    """
+    if isinstance(x, np.ndarray):
+        dims = tuple(range(1, x.ndim))
+        mins = x.min(axis=dims, keepdims=True)
+        ranges = x.max(axis=dims, keepdims=True) - mins
+
+        # Constant rows are mapped to 0 instead of NaN
+        ranges[ranges == 0] = 1
+        x -= mins
+        x /= ranges
+        return x
+
+    dims = tuple(range(1, x.dim()))
+    mins = torch.amin(x, dim=dims, keepdim=True)
+    ranges = torch.amax(x, dim=dims, keepdim=True) - mins
+
+    # Constant rows are mapped to 0 instead of NaN
+    ranges[ranges == 0] = 1
+    return x.sub_(mins).div_(ranges)
 
 # ******************************************************************************************************************** #
 
@@ -114,6 +186,34 @@ def get_box_coordinates(model, transform, image):
 
 # ******************************************************************************************************************** #
 
+# Function to return the bounding box coordinates of a BATCH of images (One detector call)
+# Returns a list of coordinates relative to the original image sizes
+def get_box_coordinates_batch(model, transform, images):
+    """
+        model     : Pretrained Deep Learning Detector Model (Pytorch)
+        transform : Transform expected to be performed on the input
+        images    : List of Image Files
+    """
+    with torch.no_grad():
+        outputs = model([transform(preprocess(image.copy(), change_color_space=False)).to(DEVICE) for image in images])
+
+    coordinates = []
+    for image, output in zip(images, outputs):
+        h, w, _ = image.shape
+        cnts, scrs = output["boxes"], output["scores"]
+        if len(cnts) == 0:
+            coordinates.append((None, None, None, None))
+            continue
+        cnts = ops.clip_boxes_to_image(cnts, (SIZE, SIZE))
+        best_index = ops.nms(cnts, scrs, 0.1)[0]
+        coordinates.append((int(cnts[best_index][0] * (w / SIZE)),
+                            int(cnts[best_index][1] * (h / SIZE)),
+                            int(cnts[best_index][2] * (w / SIZE)),
+                            int(cnts[best_index][3] * (h / SIZE))))
+    return coordinates
+
+# ******************************************************************************************************************** #
+
 # Function to return the bounding box coordinates of a SINGLE image
 # Returns the coordinates relative to the resized image (224 x 224)
 # This is used in MakeData during the first run of the App to create the negative image
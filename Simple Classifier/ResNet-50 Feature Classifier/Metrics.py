@@ -0,0 +1,131 @@
+"""
+    Training Metrics
+"""
+
+import torch
+
+import utils as u
+
+# ******************************************************************************************************************** #
+
+"""
+    - Precision and Recall of the positive class with the sigmoid output thresholded at threshold
+    - Keeps the True Positive, False Positive and False Negative counts on the device
+"""
+class ThresholdMetric(object):
+    def __init__(self, threshold=None):
+        """
+            threshold : Probability above which a sample is predicted as positive
+        """
+        self.threshold = threshold
+
+    def reset(self, device=None):
+        self.counts = torch.zeros(3, device=device)
+
+    def update(self, y_prob=None, y_true=None):
+        y_pred = y_prob > self.threshold
+        self.counts += torch.stack([(y_pred & y_true).sum(), (y_pred & ~y_true).sum(), (~y_pred & y_true).sum()])
+
+    def compute(self, counts=None):
+        tp, fp, fn = counts
+        return {"Precision@{}".format(self.threshold) : tp / max(tp + fp, 1),
+                "Recall@{}".format(self.threshold)    : tp / max(tp + fn, 1)}
+
+
+"""
+    - Area under the ROC Curve from per class histograms of the sigmoid output
+    - bins sets the resolution; samples falling in the same bin count as ties
+"""
+class AUC(object):
+    def __init__(self, bins=200):
+        """
+            bins : Number of probability bins
+        """
+        self.bins = bins
+
+    def reset(self, device=None):
+        # Row 0 : Negative samples, Row 1 : Positive samples
+        self.counts = torch.zeros(2, self.bins, device=device)
+
+    def update(self, y_prob=None, y_true=None):
+        index = (y_prob * self.bins).long().clamp_(0, self.bins - 1) + y_true.long() * self.bins
+        self.counts.view(-1).index_add_(0, index, torch.ones_like(y_prob))
+
+    def compute(self, counts=None):
+        negatives, positives = counts[:self.bins], counts[self.bins:]
+        if sum(negatives) == 0 or sum(positives) == 0:
+            return {"AUC" : 0.0}
+
+        # Each negative is ranked against the positives in higher bins (wins) and in its own bin (ties)
+        area, positives_above = 0.0, sum(positives)
+        for negative, positive in zip(negatives, positives):
+            positives_above -= positive
+            area += negative * (positives_above + 0.5 * positive)
+        return {"AUC" : area / (sum(negatives) * sum(positives))}
+
+# ******************************************************************************************************************** #
+
+"""
+    - Accumulates the epoch loss, accuracy and any extra metrics on the device
+    - update() never synchronizes with the host; compute() copies all the sums back in a single transfer
+    - loss and accuracy are the mean of the per batch values (accuracy with the sigmoid output thresholded at 0.5)
+"""
+class MetricAccumulator(object):
+    def __init__(self, device=None, metrics=None):
+        """
+            device  : Device on which the batches are computed
+            metrics : List of extra metrics (ThresholdMetric, AUC)
+        """
+        self.device = device
+        self.metrics = metrics if metrics is not None else []
+        self.reset()
+
+    def reset(self):
+        # Sum of batch losses, Sum of batch accuracies, Number of batches
+        self.totals = torch.zeros(3, device=self.device)
+        for metric in self.metrics:
+            metric.reset(self.device)
+
+    def update(self, loss=None, output=None, target=None):
+        """
+            loss   : Batch loss
+            output : Logits of the batch (None when only the loss is tracked)
+            target : Labels of the batch
+        """
+        with torch.no_grad():
+            self.totals[0] += loss.detach()
+            self.totals[2] += 1
+            if output is None:
+                return
+
+            y_prob, y_true = torch.sigmoid(output.detach()).view(-1), target.detach().view(-1) > 0.5
+            self.totals[1] += ((y_prob > 0.5) == y_true).float().mean()
+            for metric in self.metrics:
+                metric.update(y_prob, y_true)
+
+    def compute(self):
+        """
+            Returns a dictionary with "loss", "accuracy" and the values of the extra metrics
+        """
+        values = torch.cat([self.totals] + [metric.counts.view(-1) for metric in self.metrics]).tolist()
+        num_batches = max(values[2], 1)
+
+        results = {"loss" : values[0] / num_batches, "accuracy" : values[1] / num_batches}
+        offset = 3
+        for metric in self.metrics:
+            results.update(metric.compute(values[offset:offset + metric.counts.numel()]))
+            offset += metric.counts.numel()
+        return results
+
+# ******************************************************************************************************************** #
+
+# Extra metrics reported on the validation set
+def default_metrics():
+    return [ThresholdMetric(u.lower_bound_confidence), ThresholdMetric(u.upper_bound_confidence), AUC()]
+
+
+# " | Name : Value" for every extra metric in results
+def summary(results=None):
+    return "".join(" | {} : {:.5f}".format(name, value) for name, value in results.items() if name not in ["loss", "accuracy"])
+
+# ******************************************************************************************************************** #
@@ -25,8 +25,36 @@ class FeatureExtractor(nn.Module):
         self.model = nn.Sequential(*[*self.model.children()][:-1])
         self.model.add_module("Flatten", nn.Flatten())
 
+        self.set_engine()
+
+    # Opt-in Inference Engine (bf16 autocast, channels_last memory format, torch.inference_mode, torch.compile)
+    def set_engine(self, precision="fp32", channels_last=False, compile=False):
+        """
+            precision     : "fp32" or "bf16" (autocast)
+            channels_last : Flag that controls whether the model and inputs use the NHWC memory format
+            compile       : Flag that controls whether the model is compiled with torch.compile
+        """
+        self.precision = precision
+        self.channels_last = channels_last
+        self.engine = (precision != "fp32") or channels_last or compile
+
+        self.model.to(memory_format=torch.channels_last if channels_last else torch.contiguous_format)
+
+        # Kept out of the module tree so that the state_dict is unchanged (the compiled model shares its weights)
+        object.__setattr__(self, "runner", torch.compile(self.model) if compile else self.model)
+        return self
+
     def forward(self, x):
-        return self.model(x)
+        if not self.engine:
+            return self.model(x)
+
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode(), torch.autocast(device_type=x.device.type, dtype=torch.bfloat16, enabled=(self.precision == "bf16")):
+            features = self.runner(x)
+
+        # Copy back to fp32 outside inference mode so that callers can still modify the features in-place (u.normalize)
+        return features.to(dtype=torch.float32, copy=True)
 
 # ******************************************************************************************************************** #
 
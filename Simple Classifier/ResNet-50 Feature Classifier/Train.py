@@ -8,6 +8,7 @@ from sklearn.model_selection import KFold
 from torch.utils.data import DataLoader as DL
 
 from DatasetTemplates import DS
+from Metrics import MetricAccumulator, default_metrics, summary
 import utils as u
 
 # ******************************************************************************************************************** #
@@ -32,14 +33,6 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
     """
 
 
-    def getAccuracy(y_pred=None, y_true=None):
-        y_pred, y_true = torch.sigmoid(y_pred).detach(), y_true.detach()
-
-        y_pred[y_pred > 0.5] = 1
-        y_pred[y_pred <= 0.5] = 0
-
-        return torch.count_nonzero(y_pred == y_true).item() / len(y_true)
-    
     u.breaker()
     u.myprint("Training ...", "cyan")
     u.breaker()
@@ -52,7 +45,8 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
     bestLoss = {"train": np.inf, "valid": np.inf}
     bestAccs = {"train": 0.0, "valid": 0.0}
     Losses = []
-    Accuracies = [] 
+    Accuracies = []
+    meters = {"train": MetricAccumulator(device), "valid": MetricAccumulator(device, default_metrics())}
 
     # Open .txt file to store verbose if required
     if save_to_file:
@@ -65,6 +59,7 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
 
         epochLoss = {"train": 0.0, "valid": 0.0}
         epochAccs = {"train": 0.0, "valid": 0.0}
+        epochMetrics = {"train": {}, "valid": {}}
 
         for phase in ["train", "valid"]:
             # Setup model to work in training and validation mode
@@ -73,8 +68,7 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
             else:
                 model.eval()
 
-            lossPerPass = []
-            accsPerPass = []
+            meters[phase].reset()
 
             # Iterate through the all the data in the dataloader
             for X, y in DLS[phase]:
@@ -102,12 +96,11 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
                     if phase == "train":
                         loss.backward()
                         optimizer.step()
-                lossPerPass.append(loss.item())
-                accsPerPass.append(getAccuracy(output, y))
+                meters[phase].update(loss, output, y)
             
             # Track the per epoch training/validation loss and accuracy
-            epochLoss[phase] = np.mean(np.array(lossPerPass))
-            epochAccs[phase] = np.mean(np.array(accsPerPass))
+            epochMetrics[phase] = meters[phase].compute()
+            epochLoss[phase], epochAccs[phase] = epochMetrics[phase]["loss"], epochMetrics[phase]["accuracy"]
         
         # Store the Loss and Accuracy History
         Losses.append(epochLoss)
@@ -146,17 +139,19 @@ def fit_(model=None, optimizer=None, scheduler=None, epochs=None, early_stopping
         # Verbose Output
         if verbose:
             u.myprint("Epoch: {} | Train Loss: {:.5f} | Valid Loss: {:.5f} | Train Accs : {:.5f} | \
-Valid Accs : {:.5f} | Time: {:.2f} seconds".format(e + 1,
+Valid Accs : {:.5f} | Time: {:.2f} seconds{}".format(e + 1,
                                                    epochLoss["train"], epochLoss["valid"],
                                                    epochAccs["train"], epochAccs["valid"],
-                                                   time() - e_st), "cyan")
+                                                   time() - e_st,
+                                                   summary(epochMetrics["valid"])), "cyan")
 
         if save_to_file:
             text = "Epoch: {} | Train Loss: {:.5f} | Valid Loss: {:.5f} | Train Accs : {:.5f} | \
-Valid Accs : {:.5f} | Time: {:.2f} seconds\n".format(e + 1,
+Valid Accs : {:.5f} | Time: {:.2f} seconds{}\n".format(e + 1,
                                                      epochLoss["train"], epochLoss["valid"],
                                                      epochAccs["train"], epochAccs["valid"],
-                                                     time() - e_st)
+                                                     time() - e_st,
+                                                     summary(epochMetrics["valid"]))
             file.write(text)
 
         if scheduler:
@@ -562,6 +562,9 @@ def app():
     args_5 = "--lower"
     args_6 = "--upper"
     args_7 = "--early"
+    args_8 = "--precision"
+    args_9 = "--channels-last"
+    args_10 = "--compile"
 
     # CLI Argument Handling
     if args_1 in sys.argv:
@@ -578,6 +581,15 @@ def app():
         u.upper_bound_confidence = float(sys.argv[sys.argv.index(args_6) + 1])
     if args_7 in sys.argv:
         u.early_stopping_step = int(sys.argv[sys.argv.index(args_7) + 1]) 
+    if args_8 in sys.argv:
+        u.precision = sys.argv[sys.argv.index(args_8) + 1]
+    if args_9 in sys.argv:
+        u.channels_last = True
+    if args_10 in sys.argv:
+        u.compile_model = True
+
+    # Setup the Feature Extractor Inference Engine
+    Models.fea_extractor.set_engine(precision=u.precision, channels_last=u.channels_last, compile=u.compile_model)
 
     # Root Window Setup
     root = tk.Tk()
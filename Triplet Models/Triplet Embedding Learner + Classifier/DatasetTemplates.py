@@ -5,6 +5,7 @@
 import numpy as np
 import torch
 from torch.utils.data import Dataset
+import utils as u
 
 # ******************************************************************************************************************** #
 
@@ -22,32 +23,56 @@ class FEDS(Dataset):
 
 # ******************************************************************************************************************** #
 
+# Class-balanced sample indices; every sample of the class is used floor(size / num_samples) times and the remainder
+# is drawn at random (without replacement), so a smaller class is oversampled instead of the larger one being truncated.
+# Unlike plain sampling with replacement, every sample is guaranteed to appear and no sample appears more than once
+# above the others. Each class should pass its own seed so that the remainders are drawn from independent streams
+def balanced_indices(num_samples=None, size=None, seed=u.SEED):
+    """
+        num_samples : Number of samples in the class
+        size        : Number of indices to generate (>= num_samples)
+        seed        : Seed of the random remainder
+    """
+    remainder = np.random.RandomState(seed).choice(num_samples, size % num_samples, replace=False)
+    return np.concatenate((np.tile(np.arange(num_samples), size // num_samples), remainder))
+
+# ******************************************************************************************************************** #
+
 # Dataset Template used to generate data that can be passed to the Triplet Embedder Learner
+# (Anchor, Positive, Negative) triplets; M = max(#Positive, #Negative) and the smaller class is oversampled
 class TripletDS(Dataset):
     def __init__(self, anchor, p_vector, n_vector):
             self.anchor = anchor
             self.p_vector = p_vector
             self.n_vector = n_vector
+
+            self.num_triplets = max(p_vector.shape[0], n_vector.shape[0])
+            self.p_index = balanced_indices(p_vector.shape[0], self.num_triplets, u.derive_seed(u.SEED, 0))
+            self.n_index = balanced_indices(n_vector.shape[0], self.num_triplets, u.derive_seed(u.SEED, 1))
             
     def __len__(self):
-        # return self.p_vector.shape[0]
-        return self.n_vector.shape[0]
+        return self.num_triplets
     
     def __getitem__(self, idx):
-        return self.anchor, self.p_vector[idx], self.n_vector[idx]
+        return self.anchor, self.p_vector[self.p_index[idx]], self.n_vector[self.n_index[idx]]
 
 # ******************************************************************************************************************** #
 
 # Dataset Template used to generate data that can be passed to the Classifier
+# M Positive and M Negative samples; M = max(#Positive, #Negative) and the smaller class is oversampled
 class DS(Dataset):
         def __init__(self, p_vector=None, n_vector=None):
+            num_samples = max(p_vector.shape[0], n_vector.shape[0])
+
             self.X = np.concatenate((p_vector, n_vector), axis=0)
-            self.y = np.concatenate((np.ones((p_vector.shape[0], 1)), np.zeros((n_vector.shape[0], 1))), axis=0)
+            self.index = np.concatenate((balanced_indices(p_vector.shape[0], num_samples, u.derive_seed(u.SEED, 0)),
+                                         p_vector.shape[0] + balanced_indices(n_vector.shape[0], num_samples, u.derive_seed(u.SEED, 1))))
+            self.y = np.concatenate((np.ones((num_samples, 1)), np.zeros((num_samples, 1))), axis=0)
 
         def __len__(self):
-            return self.X.shape[0]
+            return self.y.shape[0]
 
         def __getitem__(self, idx):
-            return torch.FloatTensor(self.X[idx]), torch.FloatTensor(self.y[idx])
+            return torch.FloatTensor(self.X[self.index[idx]]), torch.FloatTensor(self.y[idx])
 
 # ******************************************************************************************************************** #
@@ -4,6 +4,7 @@
 
 import os
 import torch
+import threading
 from torchvision import models
 from torch import nn, optim
 import utils as u
@@ -12,9 +13,11 @@ import utils as u
 
 # Region-of-Interest Extractor (Object Detector)
 class RoIExtractor(nn.Module):
-    def __init__(self):
+    architecture = "fasterrcnn_mobilenet_v3_large_320_fpn"
+
+    def __init__(self, pretrained=True):
         nn.Module.__init__(self)
-        self.model = models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(pretrained=True, progress=True)
+        self.model = models.detection.fasterrcnn_mobilenet_v3_large_320_fpn(pretrained=pretrained, progress=True, pretrained_backbone=pretrained)
 
     def forward(self, x):
         return self.model(x)
@@ -23,10 +26,12 @@ class RoIExtractor(nn.Module):
 
 # VGG16 Model; Slice out the final 2 blocks and Average Pool the 512x7x7 features down to 512x2x2 and then Flatten
 class FeatureExtractor(nn.Module):
-    def __init__(self):
+    architecture = "vgg16_bn-avgpool7x7-avgpool2x2"
+
+    def __init__(self, pretrained=True):
         nn.Module.__init__(self)
         
-        self.model = models.vgg16_bn(pretrained=True, progress=True)
+        self.model = models.vgg16_bn(pretrained=pretrained, progress=True)
         self.model = nn.Sequential(*[*self.model.children()][:2])
         self.model.add_module("Adaptive Avg Pool", nn.AdaptiveAvgPool2d(output_size=(2, 2)))
         self.model.add_module("Flatten", nn.Flatten())
@@ -95,13 +100,68 @@ class Network(nn.Module):
 
 # ******************************************************************************************************************** #
 
-roi_extractor = RoIExtractor()
-roi_extractor.to(u.DEVICE)
-roi_extractor.eval()
+"""
+    - Process-wide registry of the pretrained backbones; nothing is built when this module is imported
+    - A backbone is built on first use and cached per (architecture, device)
+    - The pretrained weights are saved once to u.WEIGHTS_PATH and then loaded memory-mapped (torch >= 2.1)
+    - Models.roi_extractor and Models.fea_extractor resolve through the registry (Module level __getattr__)
+"""
+BACKBONES = {
+    RoIExtractor.architecture     : RoIExtractor,
+    FeatureExtractor.architecture : FeatureExtractor,
+}
+
+registry = dict()
+registry_lock = threading.Lock()
 
-fea_extractor = FeatureExtractor()
-fea_extractor.to(u.DEVICE)
-fea_extractor.eval()
+
+# Load a saved state_dict into the model; the parameters are backed by the memory-mapped file where supported
+def load_weights(model=None, path=None):
+    try:
+        model.load_state_dict(torch.load(path, map_location="cpu", mmap=True, weights_only=True), assign=True)
+    except TypeError:
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+    return model
+
+
+# Build a backbone from the local weights file (Created from the torchvision pretrained weights on first use)
+def build_backbone(architecture=None, device=None):
+    path = os.path.join(u.WEIGHTS_PATH, "{}.pt".format(architecture))
+    if os.path.exists(path):
+        model = load_weights(BACKBONES[architecture](pretrained=False), path)
+    else:
+        model = BACKBONES[architecture](pretrained=True)
+        if not os.path.exists(u.WEIGHTS_PATH):
+            os.makedirs(u.WEIGHTS_PATH)
+        torch.save(model.state_dict(), path[:-len(".pt")] + ".tmp.pt")
+        os.replace(path[:-len(".pt")] + ".tmp.pt", path)
+
+    model.to(device)
+    model.eval()
+    return model
+
+
+# Get a backbone from the registry; built on first use
+def get_model(architecture=None, device=None):
+    """
+        architecture : Key of BACKBONES
+        device       : Device on which the model runs (Default: u.DEVICE)
+    """
+    device = u.DEVICE if device is None else device
+
+    key = (architecture, str(device))
+    with registry_lock:
+        if key not in registry:
+            registry[key] = build_backbone(architecture, device)
+        return registry[key]
+
+
+def __getattr__(name):
+    if name == "roi_extractor":
+        return get_model(RoIExtractor.architecture)
+    if name == "fea_extractor":
+        return get_model(FeatureExtractor.architecture)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 # ******************************************************************************************************************** #
 
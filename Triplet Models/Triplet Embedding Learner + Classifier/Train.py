@@ -9,6 +9,7 @@ from sklearn.model_selection import KFold
 from torch.utils.data import DataLoader as DL
 
 import utils as u
+from Metrics import MetricAccumulator, default_metrics, summary
 from DatasetTemplates import TripletDS, DS
 
 # ******************************************************************************************************************** #
@@ -43,6 +44,7 @@ def fit_embedder(model=None, optimizer=None, scheduler=None, epochs=None, early_
     DLS = {"train": trainloader, "valid": validloader}
     bestLoss = {"train": np.inf, "valid": np.inf}
     Losses = []
+    meters = {"train": MetricAccumulator(device), "valid": MetricAccumulator(device)}
 
     # Open .txt file to store verbose if required
     if save_to_file:
@@ -62,7 +64,7 @@ def fit_embedder(model=None, optimizer=None, scheduler=None, epochs=None, early_
             else:
                 model.eval()
             
-            lossPerPass = []
+            meters[phase].reset()
 
             # Iterate through the all the data in the dataloader
             for A, P, N in DLS[phase]:
@@ -85,10 +87,10 @@ def fit_embedder(model=None, optimizer=None, scheduler=None, epochs=None, early_
                     if phase == "train":
                         loss.backward()
                         optimizer.step()
-                lossPerPass.append(loss.item())
+                meters[phase].update(loss)
             
             # Track the per epoch training/validation loss
-            epochLoss[phase] = np.mean(np.array(lossPerPass))
+            epochLoss[phase] = meters[phase].compute()["loss"]
         
         # Store the Loss and History
         Losses.append(epochLoss)
@@ -150,14 +152,6 @@ def fit_classifier(model=None, optimizer=None, scheduler=None, epochs=None, earl
                    trainloader=None, validloader=None, criterion=None, device=None,
                    save_to_file=False, path=None, verbose=False):
 
-    def getAccuracy(y_pred=None, y_true=None):
-        y_pred, y_true = torch.sigmoid(y_pred).detach(), y_true.detach()
-
-        y_pred[y_pred > 0.5] = 1
-        y_pred[y_pred <= 0.5] = 0
-
-        return torch.count_nonzero(y_pred == y_true).item() / len(y_true)
-    
     u.breaker()
     u.myprint("Training Classifier ...", "cyan")
     u.breaker()
@@ -170,6 +164,7 @@ def fit_classifier(model=None, optimizer=None, scheduler=None, epochs=None, earl
 
     Losses = []
     Accuracies = []
+    meters = {"train": MetricAccumulator(device), "valid": MetricAccumulator(device, default_metrics())}
 
     if save_to_file:
         file = open(os.path.join(path, "Classifier Metrics.txt"), "w+")
@@ -180,6 +175,7 @@ def fit_classifier(model=None, optimizer=None, scheduler=None, epochs=None, earl
 
         epochLoss = {"train": 0.0, "valid": 0.0}
         epochAccs = {"train": 0.0, "valid": 0.0}
+        epochMetrics = {"train": {}, "valid": {}}
 
         for phase in ["train", "valid"]:
             if phase == "train":
@@ -187,8 +183,7 @@ def fit_classifier(model=None, optimizer=None, scheduler=None, epochs=None, earl
             else:
                 model.eval()
 
-            lossPerPass = []
-            accsPerPass = []
+            meters[phase].reset()
 
             for X, y in DLS[phase]:
                 X = X.to(device)
@@ -204,10 +199,9 @@ def fit_classifier(model=None, optimizer=None, scheduler=None, epochs=None, earl
                     if phase == "train":
                         loss.backward()
                         optimizer.step()
-                lossPerPass.append(loss.item())
-                accsPerPass.append(getAccuracy(output, y))
-            epochLoss[phase] = np.mean(np.array(lossPerPass))
-            epochAccs[phase] = np.mean(np.array(accsPerPass))
+                meters[phase].update(loss, output, y)
+            epochMetrics[phase] = meters[phase].compute()
+            epochLoss[phase], epochAccs[phase] = epochMetrics[phase]["loss"], epochMetrics[phase]["accuracy"]
         Losses.append(epochLoss)
         Accuracies.append(epochAccs)
 
@@ -240,17 +234,19 @@ def fit_classifier(model=None, optimizer=None, scheduler=None, epochs=None, earl
 
         if verbose:
             u.myprint("Epoch: {} | Train Loss: {:.5f} | Valid Loss: {:.5f} | Train Accs : {:.5f} | \
-Valid Accs : {:.5f} | Time: {:.2f} seconds".format(e + 1,
+Valid Accs : {:.5f} | Time: {:.2f} seconds{}".format(e + 1,
                                                    epochLoss["train"], epochLoss["valid"],
                                                    epochAccs["train"], epochAccs["valid"],
-                                                   time() - e_st), "cyan")
+                                                   time() - e_st,
+                                                   summary(epochMetrics["valid"])), "cyan")
 
         if save_to_file:
             text = "Epoch: {} | Train Loss: {:.5f} | Valid Loss: {:.5f} | Train Accs : {:.5f} | \
-Valid Accs : {:.5f} | Time: {:.2f} seconds\n".format(e + 1,
+Valid Accs : {:.5f} | Time: {:.2f} seconds{}\n".format(e + 1,
                                                      epochLoss["train"], epochLoss["valid"],
                                                      epochAccs["train"], epochAccs["valid"],
-                                                     time() - e_st)
+                                                     time() - e_st,
+                                                     summary(epochMetrics["valid"]))
             file.write(text)
 
         if scheduler:
@@ -300,13 +296,11 @@ def train_embedder(part_name=None, model=None, epochs=None, lr=None, wd=None, ba
     # Read the features (as saved in MakeData.py)
     p_features, n_features = np.load(os.path.join(base_path, "Positive_Features.npy")), np.load(os.path.join(base_path, "Negative_Features.npy"))
 
-    # Split the feature vectors into Training and Validation Sets
-    kf = KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(p_features)
-    for tr_idx, va_idx in kf:
-        train_indices, valid_indices = tr_idx, va_idx
-        break
-    p_train, p_valid = p_features[train_indices], p_features[valid_indices]
-    n_train, n_valid = n_features[train_indices], n_features[valid_indices]
+    # Split the feature vectors into Training and Validation Sets; each class is split on its own
+    p_train_indices, p_valid_indices = next(KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(p_features))
+    n_train_indices, n_valid_indices = next(KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(n_features))
+    p_train, p_valid = p_features[p_train_indices], p_features[p_valid_indices]
+    n_train, n_valid = n_features[n_train_indices], n_features[n_valid_indices]
 
     # Setup the training and validation dataloaders
     tr_data_setup = TripletDS(anchor=anchor, p_vector=p_train, n_vector=n_train)
@@ -367,13 +361,11 @@ def train_classifier(part_name=None, model=None, epochs=None, lr=None, wd=None,
     # Read the features (as saved in MakeData.py)
     p_features, n_features = np.load(os.path.join(base_path, "Positive_Features.npy")), np.load(os.path.join(base_path, "Negative_Features.npy"))
 
-    # Split the feature vectors into Training and Validation Sets
-    kf = KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(p_features)
-    for tr_idx, va_idx in kf:
-        train_indices, valid_indices = tr_idx, va_idx
-        break
-    p_train, p_valid = p_features[train_indices], p_features[valid_indices]
-    n_train, n_valid = n_features[train_indices], n_features[valid_indices]
+    # Split the feature vectors into Training and Validation Sets; each class is split on its own
+    p_train_indices, p_valid_indices = next(KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(p_features))
+    n_train_indices, n_valid_indices = next(KFold(n_splits=5, shuffle=True, random_state=u.SEED).split(n_features))
+    p_train, p_valid = p_features[p_train_indices], p_features[p_valid_indices]
+    n_train, n_valid = n_features[n_train_indices], n_features[n_valid_indices]
 
     # Setup the training and validation dataloaders
     tr_data_setup = DS(p_vector=p_train, n_vector=n_train)
@@ -1,5 +1,6 @@
 import os
 import cv2
+import numpy as np
 import torch
 from torchvision import transforms, ops
 from termcolor import colored
@@ -11,6 +12,9 @@ if not os.path.exists(DATASET_PATH):
     os.makedirs(DATASET_PATH)
 # DATASET_PATH = os.path.join(os.path.dirname(__file__), "Datasets")
 
+# Local copies of the pretrained backbone weights (Created on first use, see Models.get_model)
+WEIGHTS_PATH = os.path.join(os.getcwd(), "Weights")
+
 # Capture object Attributes
 CAM_WIDTH, CAM_HEIGHT, FPS, DELAY = 640, 360, 30, 5
 
@@ -74,11 +78,35 @@ def preprocess(image, change_color_space=True):
 
 # ******************************************************************************************************************** #
 
-# Normalize the vector to a min-max of [0, 1]
+# Normalize the vectors to a min-max of [0, 1] (Batched over all rows)
 def normalize(x):
-    for i in range(x.shape[0]):
-        x[i] = (x[i] - torch.min(x[i])) / (torch.max(x[i]) - torch.min(x[i]))
-    return x
+    """
+        x : (N, ...) torch.Tensor or np.ndarray; each of the N rows is normalized in-place
+    """
+    if isinstance(x, np.ndarray):
+        dims = tuple(range(1, x.ndim))
+        mins = x.min(axis=dims, keepdims=True)
+        ranges = x.max(axis=dims, keepdims=True) - mins
+
+        # Constant rows are mapped to 0 instead of NaN
+        ranges[ranges == 0] = 1
+        x -= mins
+        x /= ranges
+        return x
+
+    dims = tuple(range(1, x.dim()))
+    mins = torch.amin(x, dim=dims, keepdim=True)
+    ranges = torch.amax(x, dim=dims, keepdim=True) - mins
+
+    # Constant rows are mapped to 0 instead of NaN
+    ranges[ranges == 0] = 1
+    return x.sub_(mins).div_(ranges)
+
+# ******************************************************************************************************************** #
+
+# Derive a deterministic child seed from a base seed and an index (eg: one seed per class)
+def derive_seed(seed, index):
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
 
 # ******************************************************************************************************************** #
 